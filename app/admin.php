@@ -88,7 +88,7 @@ if ($action === 'remove_ip') {
 
 // ── Data ──────────────────────────────────────────────────────────────────
 
-$active_tab = in_array($_GET['tab'] ?? 'reports', ['reports', 'ip', 'merge_issues', 'users'])
+$active_tab = in_array($_GET['tab'] ?? 'reports', ['reports', 'ip', 'merge_issues', 'build', 'users'])
     ? ($_GET['tab'] ?? 'reports') : 'reports';
 
 // Show reports from the last 30 days so admins can see recent history
@@ -115,6 +115,27 @@ foreach ($meta_rows as $row) {
     $rebuild_meta[$row['key']] = $row['value'];
 }
 
+// Per-stage build stats of the current data and of earlier rebuilds
+// (rebuild_history is filled by entrypoint.sh; absent before the first rebuild)
+$build_stages  = json_decode($rebuild_meta['stages'] ?? '', true) ?: [];
+$build_history = [];
+try {
+    $build_history = $pdo->query("SELECT * FROM rebuild_history ORDER BY last_rebuild DESC LIMIT 30")->fetchAll();
+} catch (PDOException $e) {
+    // No rebuild recorded yet
+}
+$history_stages = [];
+foreach ($build_history as $i => $row) {
+    $build_history[$i]['stages'] = json_decode($row['stages'] ?? '', true) ?: [];
+    foreach (array_keys($build_history[$i]['stages']) as $name) {
+        $history_stages[$name] = true;
+    }
+}
+
+function fmt_seconds(float $s): string {
+    return $s >= 60 ? sprintf('%d:%04.1f', intdiv((int)$s, 60), fmod($s, 60)) : sprintf('%.1f s', $s);
+}
+
 // Merge issues from the CSV file in the data directory
 $merge_issues       = [];
 $merge_issues_file  = __DIR__ . '/data/merge_issues.csv';
@@ -511,6 +532,9 @@ function is_active(string $ts): bool {
     <a class="tab <?= $active_tab === 'merge_issues' ? 'active' : '' ?>" href="admin.php?tab=merge_issues">
         Merge Issues<?php if (count($merge_issues) > 0): ?> <span class="count-badge"><?= count($merge_issues) ?></span><?php endif; ?>
     </a>
+    <a class="tab <?= $active_tab === 'build' ? 'active' : '' ?>" href="admin.php?tab=build">
+        Build Stats
+    </a>
     <a class="tab <?= $active_tab === 'users' ? 'active' : '' ?>" href="admin-users.php">
         Users
     </a>
@@ -659,6 +683,75 @@ function is_active(string $ts): bool {
         </p>
     <?php endif; ?>
 
+<?php elseif ($active_tab === 'build'): ?>
+
+    <div class="section-heading">Build Stages</div>
+
+    <?php if (empty($build_stages)): ?>
+        <div class="empty-state">The current road data was built without stage stats.</div>
+    <?php else: ?>
+        <div class="merge-table-wrap">
+            <table class="merge-table">
+                <thead>
+                    <tr>
+                        <th>Stage</th><th>Wall</th><th>CPU</th><th>Peak RSS</th><th>Traced peak</th><th>Work</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    <?php foreach ($build_stages as $name => $st): ?>
+                        <tr>
+                            <td><?= h($name) ?></td>
+                            <td><?= h(fmt_seconds((float)($st['wall_s'] ?? 0))) ?></td>
+                            <td><?= h(fmt_seconds((float)($st['cpu_s'] ?? 0))) ?></td>
+                            <td><?= h(number_format((float)($st['peak_rss_mb'] ?? 0))) ?> MB</td>
+                            <td><?= isset($st['traced_peak_mb']) ? h(number_format((float)$st['traced_peak_mb'])) . ' MB' : '—' ?></td>
+                            <td>
+                                <?= h(implode(', ', array_map(
+                                    fn($k, $n) => number_format((float)$n) . ' ' . str_replace('_', ' ', $k),
+                                    array_keys($st['counts'] ?? []), $st['counts'] ?? []
+                                ))) ?>
+                            </td>
+                        </tr>
+                    <?php endforeach; ?>
+                </tbody>
+            </table>
+        </div>
+        <p class="merge-issues-note">
+            Wall and CPU times are exclusive: a stage does not include the stages that ran inside it.
+            With parallel workers, merge/segment/simplify times are summed across workers.
+        </p>
+    <?php endif; ?>
+
+    <?php if (!empty($build_history)): ?>
+        <div class="section-heading" style="margin-top:1.5rem">
+            Recent Rebuilds
+            <span class="count-badge"><?= count($build_history) ?></span>
+        </div>
+        <div class="merge-table-wrap">
+            <table class="merge-table">
+                <thead>
+                    <tr>
+                        <th>Rebuild</th><th>Roads</th>
+                        <?php foreach (array_keys($history_stages) as $name): ?>
+                            <th><?= h($name) ?></th>
+                        <?php endforeach; ?>
+                    </tr>
+                </thead>
+                <tbody>
+                    <?php foreach ($build_history as $row): ?>
+                        <tr>
+                            <td><?= h(date('M j, Y g:i A', strtotime($row['last_rebuild']))) ?></td>
+                            <td><?= h(number_format((int)$row['road_count'])) ?></td>
+                            <?php foreach (array_keys($history_stages) as $name): ?>
+                                <td><?= isset($row['stages'][$name]) ? h(fmt_seconds((float)$row['stages'][$name]['wall_s'])) : '—' ?></td>
+                            <?php endforeach; ?>
+                        </tr>
+                    <?php endforeach; ?>
+                </tbody>
+            </table>
+        </div>
+    <?php endif; ?>
+
 <?php elseif ($active_tab === 'ip'): ?>
 
     <div class="section-heading">IP Access Lists</div>
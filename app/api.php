@@ -15,12 +15,35 @@ require_once __DIR__ . '/db.php';
 require_once __DIR__ . '/auth/auth.php';
 
 $dataDir = __DIR__ . '/data';
-$cacheFile = $dataDir . '/roads_optimized.json';
+$cacheFile = dataFile('roads_optimized.json');
 
 if (!file_exists($dataDir)) {
     @mkdir($dataDir, 0755, true);
 }
 
+/**
+ * Entry for a logical road data file in data/data-manifest.json (written by
+ * rebuild_roads.py; the files themselves have content-hashed names), or null
+ */
+function dataManifestEntry($name) {
+    static $files = null;
+    if ($files === null) {
+        $manifestFile = __DIR__ . '/data/data-manifest.json';
+        $manifest = is_file($manifestFile) ? json_decode(file_get_contents($manifestFile), true) : null;
+        $files = $manifest['files'] ?? [];
+    }
+    return $files[$name] ?? null;
+}
+
+/**
+ * Path of a logical road data file: its hashed name from the manifest, or the
+ * plain name for data built before hashed names
+ */
+function dataFile($name) {
+    $entry = dataManifestEntry($name);
+    return __DIR__ . '/data/' . ($entry ? basename($entry['path']) : $name);
+}
+
 /**
  * Convert a database row to the report object format the frontend expects
  */
@@ -148,6 +171,124 @@ function classifyRoadType($tags) {
     return 'other';
 }
 
+/**
+ * Unpack a roads.sqlite geometry blob (little-endian float64 lat/lon pairs)
+ */
+function unpackGeometry($blob) {
+    if ($blob === null || $blob === '') return [];
+    return array_chunk(array_values(unpack('e*', $blob)), 2);
+}
+
+/**
+ * Distance in metres from a point to a polyline (local equirectangular
+ * projection — plenty for the few hundred metres these queries cover)
+ */
+function distanceToPolylineMeters($lat, $lon, $points) {
+    $mPerDegLat = 111320.0;
+    $mPerDegLon = 111320.0 * cos(deg2rad($lat));
+    $best = INF;
+    $prev = null;
+    foreach ($points as $p) {
+        $x = ($p[1] - $lon) * $mPerDegLon;
+        $y = ($p[0] - $lat) * $mPerDegLat;
+        if ($prev === null) {
+            $best = min($best, hypot($x, $y));
+        } else {
+            [$px, $py] = $prev;
+            $dx = $x - $px;
+            $dy = $y - $py;
+            $len2 = $dx * $dx + $dy * $dy;
+            $t = $len2 > 0 ? max(0, min(1, -($px * $dx + $py * $dy) / $len2)) : 0;
+            $best = min($best, hypot($px + $t * $dx, $py + $t * $dy));
+        }
+        $prev = [$x, $y];
+    }
+    return $best;
+}
+
+/**
+ * Segments whose bounding box overlaps the given box, via the R*Tree
+ */
+function segmentsInBox($roadsDb, $minLat, $minLon, $maxLat, $maxLon, $limit) {
+    $stmt = $roadsDb->prepare('
+        SELECT s.id, s.road_id, r.name AS road_name, s.description, s.geometry
+        FROM segments_rtree t
+        JOIN segments s ON s.rowid = t.id
+        JOIN roads r ON r.id = s.road_id
+        WHERE t.max_lat >= :min_lat AND t.min_lat <= :max_lat
+          AND t.max_lon >= :min_lon AND t.min_lon <= :max_lon
+        LIMIT :limit
+    ');
+    $stmt->bindValue(':min_lat', $minLat);
+    $stmt->bindValue(':max_lat', $maxLat);
+    $stmt->bindValue(':min_lon', $minLon);
+    $stmt->bindValue(':max_lon', $maxLon);
+    $stmt->bindValue(':limit', $limit, PDO::PARAM_INT);
+    $stmt->execute();
+    $segments = [];
+    while ($row = $stmt->fetch()) {
+        $segments[] = [
+            'id' => $row['id'],
+            'road_id' => (int)$row['road_id'],
+            'road_name' => $row['road_name'],
+            'description' => $row['description'],
+            'geometry' => unpackGeometry($row['geometry']),
+        ];
+    }
+    return $segments;
+}
+
+/**
+ * Geometry of a report target from the road catalog: the segments in
+ * $segmentIds joined in order, or the whole road when there are none.
+ * Returns null when no catalog is installed.
+ */
+function catalogGeometry($roadId, $segmentIds) {
+    $roadsDb = getRoadsDb();
+    if ($roadsDb === null) return null;
+
+    if (empty($segmentIds)) {
+        $stmt = $roadsDb->prepare('SELECT geometry FROM roads WHERE id = ?');
+        $stmt->execute([$roadId]);
+        $blob = $stmt->fetchColumn();
+        if ($blob === false) {
+            throw new Exception('Unknown road');
+        }
+        return unpackGeometry($blob);
+    }
+
+    $stmt = $roadsDb->prepare('SELECT geometry FROM segments WHERE id = ? AND road_id = ?');
+    $geometry = [];
+    foreach ($segmentIds as $segmentId) {
+        $stmt->execute([(string)$segmentId, $roadId]);
+        $blob = $stmt->fetchColumn();
+        if ($blob === false) {
+            throw new Exception('Unknown segment: ' . $segmentId);
+        }
+        $geometry = array_merge($geometry, unpackGeometry($blob));
+    }
+    return $geometry;
+}
+
+/**
+ * Find a road (seq 0) or segment "<road>-<seq>" in roads_optimized.idx by
+ * binary search over its fixed-width records (layout in scripts/roadindex.py).
+ * Returns [offset, length] of the road's line in roads_optimized.jsonl, or null.
+ */
+function indexLookup($fh, $count, $roadId, $seq) {
+    $lo = 0;
+    $hi = $count;
+    while ($lo < $hi) {
+        $mid = intdiv($lo + $hi, 2);
+        fseek($fh, 24 + $mid * 24);
+        $rec = unpack('Proad_id/Vseq/Vlength/Poffset', fread($fh, 24));
+        $cmp = [$rec['road_id'], $rec['seq']] <=> [$roadId, $seq];
+        if ($cmp === 0) return [$rec['offset'], $rec['length']];
+        if ($cmp < 0) $lo = $mid + 1; else $hi = $mid;
+    }
+    return null;
+}
+
 $action = $_GET['action'] ?? null;
 $postData = null;
 
@@ -317,7 +458,8 @@ try {
 
         case 'get_metadata':
             $db = getDb();
-            $rows = $db->query("SELECT key, value FROM metadata")->fetchAll(PDO::FETCH_ASSOC);
+            // Build stage stats are for admin.php only
+            $rows = $db->query("SELECT key, value FROM metadata WHERE key != 'stages'")->fetchAll(PDO::FETCH_ASSOC);
             $meta = [];
             foreach ($rows as $row) {
                 $meta[$row['key']] = $row['value'];
@@ -370,6 +512,16 @@ try {
 
             $timestamp = $report['timestamp'] ?? date('c');
 
+            // Take the geometry from the road catalog rather than trusting the
+            // client's copy; older images without roads.sqlite keep the latter.
+            if (isset($report['segmentIds']) && !is_array($report['segmentIds'])) {
+                throw new Exception('Invalid segment IDs');
+            }
+            $geometry = catalogGeometry((int)$report['road_id'], $report['segmentIds'] ?? null);
+            if ($geometry !== null) {
+                $report['geometry'] = $geometry;
+            }
+
             $db = getDb();
             $db->beginTransaction();
 
@@ -519,11 +671,74 @@ try {
             echo json_encode(['success' => true, 'changes' => $changes]);
             break;
 
+        case 'segments_near':
+            // Segments within `radius` metres of a point, nearest first
+            $roadsDb = getRoadsDb();
+            if ($roadsDb === null) {
+                throw new Exception('Road catalog not available. Please wait for the next data rebuild.');
+            }
+            if (!isset($_GET['lat'], $_GET['lon']) || !is_numeric($_GET['lat']) || !is_numeric($_GET['lon'])) {
+                throw new Exception('lat and lon are required');
+            }
+            $lat = (float)$_GET['lat'];
+            $lon = (float)$_GET['lon'];
+            $radius = max(1, min(1000, (float)($_GET['radius'] ?? 50)));
+            $limit = max(1, min(50, (int)($_GET['limit'] ?? 10)));
+
+            $dLat = $radius / 111320.0;
+            $dLon = $radius / (111320.0 * max(0.01, cos(deg2rad($lat))));
+            $segments = [];
+            foreach (segmentsInBox($roadsDb, $lat - $dLat, $lon - $dLon, $lat + $dLat, $lon + $dLon, 5000) as $segment) {
+                $distance = distanceToPolylineMeters($lat, $lon, $segment['geometry']);
+                if ($distance <= $radius) {
+                    $segment['distance_m'] = round($distance, 1);
+                    $segments[] = $segment;
+                }
+            }
+            usort($segments, fn($a, $b) => $a['distance_m'] <=> $b['distance_m']);
+
+            echo json_encode(['success' => true, 'segments' => array_slice($segments, 0, $limit)]);
+            break;
+
+        case 'segments_in_bbox':
+            // bbox=west,south,east,north in degrees
+            $roadsDb = getRoadsDb();
+            if ($roadsDb === null) {
+                throw new Exception('Road catalog not available. Please wait for the next data rebuild.');
+            }
+            $bbox = array_map('trim', explode(',', $_GET['bbox'] ?? ''));
+            if (count($bbox) !== 4 || count(array_filter($bbox, 'is_numeric')) !== 4) {
+                throw new Exception('bbox must be west,south,east,north');
+            }
+            [$west, $south, $east, $north] = array_map('floatval', $bbox);
+            if ($west > $east || $south > $north) {
+                throw new Exception('bbox must be west,south,east,north');
+            }
+            $limit = max(1, min(2000, (int)($_GET['limit'] ?? 500)));
+
+            echo json_encode([
+                'success' => true,
+                'segments' => segmentsInBox($roadsDb, $south, $west, $north, $east, $limit),
+            ]);
+            break;
+
         case 'get_roads':
             if (file_exists($cacheFile) && filesize($cacheFile) > 0) {
-                header("Cache-Control: no-cache, must-revalidate");
-                header("Pragma: no-cache");
-                header("Expires: 0");
+                $entry = dataManifestEntry('roads_optimized.json');
+                if ($entry) {
+                    // Revalidate against the content hash rather than resend
+                    $etag = '"' . $entry['sha256'] . '"';
+                    header("Cache-Control: no-cache");
+                    header("ETag: $etag");
+                    if (trim($_SERVER['HTTP_IF_NONE_MATCH'] ?? '') === $etag) {
+                        http_response_code(304);
+                        break;
+                    }
+                } else {
+                    header("Cache-Control: no-cache, must-revalidate");
+                    header("Pragma: no-cache");
+                    header("Expires: 0");
+                }
 
                 readfile($cacheFile);
             } else {
@@ -531,8 +746,56 @@ try {
             }
             break;
 
+        case 'get_road':
+            // ids=<road id>|<segment id>,... — each road read with one seek
+            // through the roads_optimized.idx byte-offset index
+            $jsonlFile = dataFile('roads_optimized.jsonl');
+            $indexFile = dataFile('roads_optimized.idx');
+            if (!file_exists($jsonlFile) || !file_exists($indexFile)) {
+                throw new Exception('Road data not available. Please wait for the next data rebuild.');
+            }
+            $ids = array_filter(array_map('trim', explode(',', $_GET['ids'] ?? '')), 'strlen');
+            if (!$ids || count($ids) > 200) {
+                throw new Exception('ids must list 1 to 200 road or segment IDs');
+            }
+
+            $idx = fopen($indexFile, 'rb');
+            $header = unpack('a4magic/vversion/vrecord_size/Vcount/Vreserved/Pjsonl_size', fread($idx, 24));
+            if ($header['magic'] !== 'SPRX' || $header['version'] !== 1 || $header['record_size'] !== 24) {
+                fclose($idx);
+                throw new Exception('Unsupported road index');
+            }
+            clearstatcache(true, $jsonlFile);
+            if (filesize($jsonlFile) !== $header['jsonl_size']) {
+                fclose($idx);
+                throw new Exception('Road index does not match road data. Please wait for the next data rebuild.');
+            }
+
+            $jsonl = fopen($jsonlFile, 'rb');
+            $lines = [];
+            $missing = [];
+            foreach ($ids as $id) {
+                if (!preg_match('/^(\d+)(?:-(\d+))?$/', $id, $m)) {
+                    $missing[] = $id;
+                    continue;
+                }
+                $span = indexLookup($idx, $header['count'], (int)$m[1], (int)($m[2] ?? 0));
+                if ($span === null) {
+                    $missing[] = $id;
+                } elseif (!isset($lines[$span[0]])) {
+                    fseek($jsonl, $span[0]);
+                    $lines[$span[0]] = fread($jsonl, $span[1]);
+                }
+            }
+            fclose($jsonl);
+            fclose($idx);
+
+            // The lines are already JSON: splice them in rather than re-encoding
+            echo '{"success":true,"roads":[' . implode(',', $lines) . '],"missing":' . json_encode(array_values($missing)) . '}';
+            break;
+
         case 'get_roads_stream':
-            $jsonlFile = $dataDir . '/roads_optimized.jsonl';
+            $jsonlFile = dataFile('roads_optimized.jsonl');
 
             if (!file_exists($jsonlFile) || filesize($jsonlFile) == 0) {
                 throw new Exception('Road data not available. Please wait for the next data rebuild.');
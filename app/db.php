@@ -16,3 +16,25 @@ function getDb(): PDO
     }
     return $db;
 }
+
+/**
+ * Read-only connection to the road catalog (roads.sqlite, written by
+ * rebuild_roads.py and copied next to reports.db by entrypoint.sh).
+ * Returns null when the image does not ship one.
+ */
+function getRoadsDb(): ?PDO
+{
+    static $db = null;
+    if ($db === null) {
+        $dbPath = __DIR__ . '/data/roads.sqlite';
+        if (!is_file($dbPath)) {
+            return null;
+        }
+        $db = new PDO('sqlite:' . $dbPath, null, null, [
+            PDO::SQLITE_ATTR_OPEN_FLAGS => PDO::SQLITE_OPEN_READONLY,
+        ]);
+        $db->setAttribute(PDO::ATTR_ERRMODE, PDO::ERRMODE_EXCEPTION);
+        $db->setAttribute(PDO::ATTR_DEFAULT_FETCH_MODE, PDO::FETCH_ASSOC);
+    }
+    return $db;
+}
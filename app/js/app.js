@@ -5,6 +5,7 @@
                 return {
                     map: null,
                     allRoads: [],
+                    dataManifest: null, // Promise of data/data-manifest.json (see dataUrl)
                     visibleRoadIds: new Set(),
                     roadLayers: {},
                     reportSegmentLayers: {}, // Overlays for segment-specific reports
@@ -87,7 +88,7 @@
                     showMobileNotifications: false,
                     lastChangeId: 0, // Tracks SSE delta position
                     toasts: [], // Active foreground toast notifications
-                    areaConfig: null, // Loaded from /area-config.json at startup
+                    areaConfig: null, // Inlined in index.html (or /area-config.json) at startup
                     rebuildMeta: null  // Loaded from /api.php?action=get_metadata at startup
                 }
             },
@@ -180,9 +181,13 @@
             async mounted() {
                 this.loading = true; // Show loading immediately
 
-                // Load area-specific configuration before initialising the map
+                // Load area-specific configuration before initialising the map.
+                // build_area.py inlines it into index.html; fetch it otherwise.
                 try {
-                    this.areaConfig = await fetch('/area-config.json').then(r => r.json());
+                    const inlined = document.getElementById('area-config');
+                    this.areaConfig = inlined
+                        ? JSON.parse(inlined.textContent)
+                        : await fetch('/area-config.json').then(r => r.json());
                 } catch (e) {
                     console.error('Failed to load area-config.json:', e);
                     // Fallback defaults so the app still runs
@@ -520,14 +525,41 @@
                     this.loading = true;
                     this.customLoadingMessage = null; // Reset custom message
 
+                    // Draw the small coarse overview first; the full road data then
+                    // replaces it in the background.  Until it has, a clicked road's
+                    // detail is fetched on its own (loadRoadDetail).
+                    let overviewShown = false;
                     try {
-                        // Try streaming JSONL first for progressive loading
+                        await this.loadRoadsOverview();
+                        overviewShown = true;
+                        this.initializationState.roadsLoaded = true;
+                        this.initializationState.initialRenderComplete = true;
+                        this.checkInitializationComplete();
+                    } catch (overviewError) {
+                        console.warn('Road overview unavailable, waiting for full road data:', overviewError);
+                        this.allRoads = [];
+                    }
+
+                    try {
+                        // Try the compact binary file first, then streaming JSONL
+                        const useBinary = typeof RoadBin !== 'undefined';
                         const useStreaming = true; // Set to false to use legacy method
 
-                        if (useStreaming) {
-                            await this.loadRoadsStreaming();
-                        } else {
-                            await this.loadRoadsLegacy();
+                        let loaded = false;
+                        if (useBinary) {
+                            try {
+                                await this.loadRoadsBinary();
+                                loaded = true;
+                            } catch (binaryError) {
+                                console.warn('Binary road data unavailable, using JSONL:', binaryError);
+                            }
+                        }
+                        if (!loaded) {
+                            if (useStreaming) {
+                                await this.loadRoadsStreaming();
+                            } else {
+                                await this.loadRoadsLegacy();
+                            }
                         }
 
                         // Mark roads as loaded
@@ -547,23 +579,148 @@
                                 this.checkInitializationComplete();
                             } catch (fallbackError) {
                                 console.error('Fallback loading also failed:', fallbackError);
-                                alert('Failed to load road data. Please refresh the page.');
+                                if (!overviewShown) {
+                                    alert('Failed to load road data. Please refresh the page.');
+                                }
                                 this.loading = false;
                             }
-                        } else {
+                        } else if (!overviewShown) {
                             alert('Failed to load road data. Please refresh the page.');
                             this.loading = false;
                         }
                     }
                 },
 
+                async dataUrl(name) {
+                    // Road data files have content-hashed names (cached as immutable);
+                    // only data/data-manifest.json is revalidated on each visit.
+                    // Data built before the manifest keeps its plain file names.
+                    if (!this.dataManifest) {
+                        this.dataManifest = fetch('data/data-manifest.json', { cache: 'no-cache' })
+                            .then(response => response.ok ? response.json() : null)
+                            .catch(() => null);
+                    }
+                    const manifest = await this.dataManifest;
+                    const entry = manifest && manifest.files && manifest.files[name];
+                    return `data/${entry ? entry.path : name}`;
+                },
+
+                async loadRoadsOverview() {
+                    const response = await fetch(await this.dataUrl('roads_overview.json'));
+                    if (!response.ok) {
+                        throw new Error(`Road overview request failed (${response.status})`);
+                    }
+                    const data = await response.json();
+
+                    // Coarse geometry and no segments: `overview` marks roads whose
+                    // detail still has to be loaded before they can be reported on
+                    this.allRoads = data.roads.map(road => ({
+                        id: road.id,
+                        name: road.name || 'Unnamed Road',
+                        type: 'way',
+                        geometry: road.geometry,
+                        segments: null,
+                        overview: true
+                    }));
+                    this.showRoads();
+                },
+
+                async loadRoadDetail(road) {
+                    // Full geometry and segments for one overview road, read by id
+                    // through the roads_optimized.jsonl byte-offset index
+                    if (!road.overview) return road;
+                    try {
+                        const response = await fetch(`api.php?action=get_road&ids=${road.id}`);
+                        const data = await response.json();
+                        const element = data.success && data.roads && data.roads[0];
+                        if (!element) return road;
+
+                        const detailed = {
+                            id: element.id,
+                            name: element.tags?.name || 'Unnamed Road',
+                            type: element.type || 'other',
+                            geometry: element.geometry,
+                            segments: element.segments || null
+                        };
+                        const index = this.allRoads.findIndex(r => r.id === road.id);
+                        if (index >= 0 && this.allRoads[index].overview) {
+                            this.allRoads.splice(index, 1, detailed);
+                        }
+                        return detailed;
+                    } catch (error) {
+                        console.warn('Could not load road detail:', error);
+                        return road;
+                    }
+                },
+
+                showRoads() {
+                    // Add the road layers once; later loads only swap the data
+                    const show = () => {
+                        const source = this.map.getSource('roads');
+                        if (!source) {
+                            this.addRoadsLayer();
+                        } else if (!this.areaConfig.roads_overlay) {
+                            source.setData(this.roadsGeoJSON());
+                        }
+                    };
+                    if (this.map.loaded()) {
+                        show();
+                    } else {
+                        this.map.once('load', show);
+                    }
+                },
+
+                roadsGeoJSON() {
+                    // All roads as one FeatureCollection
+                    return {
+                        type: 'FeatureCollection',
+                        features: this.allRoads.map(road => ({
+                            type: 'Feature',
+                            id: road.id,
+                            properties: {
+                                id: road.id,
+                                name: road.name,
+                                type: road.type
+                            },
+                            geometry: {
+                                type: 'LineString',
+                                coordinates: road.geometry.map(coord => [coord[1], coord[0]]) // [lng, lat]
+                            }
+                        }))
+                    };
+                },
+
+                async loadRoadsBinary() {
+                    const controller = new AbortController();
+                    const timeoutId = setTimeout(() => controller.abort(), 30000);
+                    let buffer;
+                    try {
+                        const response = await fetch(await this.dataUrl('roads_optimized.bin'), { signal: controller.signal });
+                        if (!response.ok) {
+                            throw new Error(`Binary road data request failed (${response.status})`);
+                        }
+                        buffer = await response.arrayBuffer();
+                    } finally {
+                        clearTimeout(timeoutId);
+                    }
+
+                    // Typed-array columns; geometries are built on first access
+                    const { roads } = RoadBin.decode(buffer);
+                    this.allRoads = roads;
+                    this.customLoadingMessage = `Adding ${roads.length} roads to map...`;
+                    this.showRoads();
+
+                    setTimeout(() => {
+                        this.customLoadingMessage = null;
+                    }, 1000);
+                },
+
                 async loadRoadsStreaming() {
-                    const timestamp = new Date().getTime();
                     const controller = new AbortController();
                     const timeoutId = setTimeout(() => controller.abort(), 30000);
                     let response;
                     try {
-                        response = await fetch(`data/roads_optimized.jsonl`, { signal: controller.signal });
+                        response = await fetch(await this.dataUrl('roads_optimized.jsonl'), { signal: controller.signal });
                     } finally {
                         clearTimeout(timeoutId);
                     }
@@ -576,6 +733,7 @@
                     const decoder = new TextDecoder();
                     let buffer = '';
                     let roadCount = 0;
+                    const roads = [];
 
                     // Collect all roads in memory first (don't update map progressively)
                     while (true) {
@@ -602,7 +760,7 @@
                                         segments: element.segments || null
                                     };
 
-                                    this.allRoads.push(road);
+                                    roads.push(road);
                                     roadCount++;
 
                                     // Update progress every 100 roads
@@ -618,12 +776,8 @@
 
                     this.customLoadingMessage = `Adding ${roadCount} roads to map...`;
 
-                    // Wait for map to load, then add all roads at once
-                    if (this.map.loaded()) {
-                        this.addRoadsLayer();
-                    } else {
-                        this.map.once('load', () => this.addRoadsLayer());
-                    }
+                    this.allRoads = roads;
+                    this.showRoads();
 
                     // Clear custom message after a short delay
                     setTimeout(() => {
@@ -632,8 +786,8 @@
                 },
 
                 async loadRoadsLegacy() {
-                    const timestamp = new Date().getTime();
-                    const response = await fetch(`api.php?action=get_roads&_=${timestamp}`);
+                    // Revalidated by ETag; no cache-busting parameter needed
+                    const response = await fetch(`api.php?action=get_roads`);
                     const data = await response.json();
 
                     if (!data.elements) {
@@ -648,46 +802,34 @@
                         segments: element.segments || null
                     }));
 
-                    // Wait for map to load, then add all roads as a single GeoJSON source
-                    if (this.map.loaded()) {
-                        this.addRoadsLayer();
-                    } else {
-                        this.map.once('load', () => this.addRoadsLayer());
-                    }
+                    this.showRoads();
                 },
 
                 addRoadsLayer() {
-                    // Convert all roads to a GeoJSON FeatureCollection
-                    const features = this.allRoads.map(road => ({
-                        type: 'Feature',
-                        id: road.id,
-                        properties: {
-                            id: road.id,
-                            name: road.name,
-                            type: road.type
-                        },
-                        geometry: {
-                            type: 'LineString',
-                            coordinates: road.geometry.map(coord => [coord[1], coord[0]]) // [lng, lat]
-                        }
-                    }));
-
-                    const geojson = {
-                        type: 'FeatureCollection',
-                        features: features
-                    };
-
-                    // Add source
-                    this.map.addSource('roads', {
-                        type: 'geojson',
-                        data: geojson
-                    });
+                    // Prefer the road vector tiles built by rebuild_roads.py: MapLibre
+                    // then only decodes the tiles in view instead of one GeoJSON
+                    // source holding every road in the area.
+                    const useOverlay = !!this.areaConfig.roads_overlay;
+                    const roadSourceLayer = useOverlay ? { 'source-layer': 'roads' } : {};
+
+                    if (useOverlay) {
+                        this.map.addSource('roads', {
+                            type: 'vector',
+                            url: 'pmtiles://tiles/roads_overlay.pmtiles'
+                        });
+                    } else {
+                        this.map.addSource('roads', {
+                            type: 'geojson',
+                            data: this.roadsGeoJSON()
+                        });
+                    }
 
                     // Add base road layer
                     this.map.addLayer({
                         id: 'roads-line',
                         type: 'line',
                         source: 'roads',
+                        ...roadSourceLayer,
                         paint: {
                             'line-color': '#94a3b8',
                             'line-width': ['interpolate', ['linear'], ['zoom'], 10, 1.5, 13, 2, 16, 3],
@@ -700,6 +842,7 @@
                         id: 'roads-click',
                         type: 'line',
                         source: 'roads',
+                        ...roadSourceLayer,
                         paint: {
                             'line-color': 'transparent',
                             'line-width': ['interpolate', ['linear'], ['zoom'], 10, 15, 13, 20, 16, 25],
@@ -735,7 +878,7 @@
                             const feature = e.features[0];
                             const road = this.allRoads.find(r => r.id == feature.properties.id);
                             if (road) {
-                                this.handleRoadClick(road, e);
+                                this.loadRoadDetail(road).then(detailed => this.handleRoadClick(detailed, e));
                             }
                         }
                     });
@@ -0,0 +1,116 @@
+/*
+ * roadbin.js — Decoder for data/roads_optimized.bin (written by
+ * scripts/roadbin.py; the layout is documented there).
+ *
+ * The columns are viewed in place over the downloaded ArrayBuffer; the only
+ * per-coordinate work is one pass turning the delta-encoded fixed-point
+ * vertices into two Float64Arrays of degrees.  Road and segment geometries
+ * are ranges of those arrays and are materialised as [[lat, lon], ...]
+ * only when first read, so segments of roads nobody taps are never built.
+ */
+const RoadBin = (() => {
+    const MAGIC = 0x42525053; // "SPRB" read as a little-endian uint32
+    const VERSION = 2;
+    const HEADER_SIZE = 32;
+
+    function polyline(lats, lons, start, count) {
+        const coords = new Array(count);
+        for (let i = 0; i < count; i++) {
+            coords[i] = [lats[start + i], lons[start + i]];
+        }
+        return coords;
+    }
+
+    // Define a cached, read-only `geometry` property over a vertex range
+    function defineGeometry(target, lats, lons, start, count) {
+        let cached = null;
+        Object.defineProperty(target, 'geometry', {
+            enumerable: true,
+            get: () => cached || (cached = polyline(lats, lons, start, count))
+        });
+        return target;
+    }
+
+    function decode(buffer) {
+        const view = new DataView(buffer);
+        if (buffer.byteLength < HEADER_SIZE || view.getUint32(0, true) !== MAGIC) {
+            throw new Error('Not a roads_optimized.bin file');
+        }
+        const version = view.getUint16(4, true);
+        if (version !== VERSION) {
+            throw new Error(`Unsupported roads_optimized.bin version ${version}`);
+        }
+        const precision = view.getUint16(6, true);
+        const nRoads = view.getUint32(8, true);
+        const nSegments = view.getUint32(12, true);
+        const nVertices = view.getUint32(16, true);
+        const nStrings = view.getUint32(20, true);
+
+        // Typed-array views use platform byte order; every browser we
+        // target is little-endian, matching the file.
+        let offset = HEADER_SIZE;
+        const take = (Type, length) => {
+            const column = new Type(buffer, offset, length);
+            offset += length * Type.BYTES_PER_ELEMENT;
+            return column;
+        };
+        const roadId = take(Float64Array, nRoads);
+        const roadName = take(Uint32Array, nRoads);
+        const roadType = take(Uint32Array, nRoads);
+        const roadHighway = take(Uint32Array, nRoads);
+        const roadStart = take(Uint32Array, nRoads);
+        const roadCount = take(Uint32Array, nRoads);
+        const roadSeg = take(Uint32Array, nRoads + 1);
+        const segDesc = take(Uint32Array, nSegments);
+        const segStart = take(Uint32Array, nSegments);
+        const segCount = take(Uint32Array, nSegments);
+        const latDelta = take(Int32Array, nVertices);
+        const lonDelta = take(Int32Array, nVertices);
+        const stringPtr = take(Uint32Array, nStrings + 1);
+        const stringData = new Uint8Array(buffer, offset, stringPtr[nStrings]);
+
+        // Undo the delta encoding (int32 wrap-around, as written) and scale
+        const scale = 10 ** precision;
+        const lats = new Float64Array(nVertices);
+        const lons = new Float64Array(nVertices);
+        let lat = 0;
+        let lon = 0;
+        for (let i = 0; i < nVertices; i++) {
+            lat = (lat + latDelta[i]) | 0;
+            lon = (lon + lonDelta[i]) | 0;
+            lats[i] = lat / scale;
+            lons[i] = lon / scale;
+        }
+
+        const textDecoder = new TextDecoder();
+        const strings = new Array(nStrings);
+        for (let i = 0; i < nStrings; i++) {
+            strings[i] = textDecoder.decode(stringData.subarray(stringPtr[i], stringPtr[i + 1]));
+        }
+
+        const roads = new Array(nRoads);
+        for (let r = 0; r < nRoads; r++) {
+            const id = roadId[r];
+            const segments = [];
+            for (let s = roadSeg[r], n = 1; s < roadSeg[r + 1]; s++, n++) {
+                segments.push(defineGeometry(
+                    { id: `${id}-${n}`, description: strings[segDesc[s]] },
+                    lats, lons, segStart[s], segCount[s]
+                ));
+            }
+            roads[r] = defineGeometry(
+                {
+                    id,
+                    name: strings[roadName[r]] || 'Unnamed Road',
+                    type: strings[roadType[r]],
+                    highway: strings[roadHighway[r]] || null,
+                    segments
+                },
+                lats, lons, roadStart[r], roadCount[r]
+            );
+        }
+        return { roads, lats, lons, precision };
+    }
+
+    return { decode };
+})();
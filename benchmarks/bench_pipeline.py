@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+bench_pipeline.py — Time the road pipeline stage by stage on synthetic data.
+
+Generates a deterministic Overpass response (synthetic_osm.py) and times,
+separately and without any network access:
+
+    merge_connected_ways    every same-name group of the road graph
+    calculate_segments      every merged road (includes its own splitting)
+    _split_long_segments    every merged road as one segment, split at
+                            segments.max_distance_km
+    simplify_geometry       every merged road's full geometry
+    process                 the whole generator, consumed into a list
+    write_outputs           process()'s records into a temporary directory
+
+Each stage is run --repeat times on fresh input and the best time is kept;
+one further traced run records the stage's peak Python/NumPy allocation
+(tracemalloc).  The results, the parameters and the process's peak RSS go
+to a JSON report.  With --baseline, each stage is compared with the same
+stage of an earlier report and the script exits non-zero if any is more
+than --max-slowdown slower.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--ways N] [--group-size N] [--vertices N]
+        [--intersections N] [--workers N] [--repeat N] [--report FILE]
+        [--baseline FILE] [--max-slowdown F]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from overpass_stream import from_json  # noqa: E402
+from rebuild_roads import (_split_long_segments, calculate_segments,  # noqa: E402
+                           merge_connected_ways, process, simplify_geometry, write_outputs)
+from roadgraph import RoadGraph  # noqa: E402
+from synthetic_osm import synthetic_overpass  # noqa: E402
+
+REPORT_VERSION = 1
+
+# Pipeline settings, as in an area config.yaml
+CFG = {
+    "area": {"name": "Benchmark County", "state": "Nowhere"},
+    "segments": {"min_distance_km": 0.4, "max_distance_km": 3.2,
+                 "simplify_tolerance": 0.0001},
+}
+
+# Stages under this many seconds are too noisy for the regression check
+MIN_CHECKED_SECONDS = 0.01
+
+
+class Fixture:
+    """Fresh RoadData for one run, plus the graph and merged roads built from it."""
+
+    def __init__(self, data: dict):
+        self.road_data = from_json(data)
+        self.graph = RoadGraph(self.road_data.ways)
+        self.groups = self.graph.groups()
+        self.merged = None
+
+    def merge(self) -> list:
+        issues, merged = [], []
+        for _name, group in self.groups:
+            merged.extend(merge_connected_ways(self.graph, group, self.road_data.nodes, issues))
+        return merged
+
+    def coords(self) -> list:
+        lines = []
+        for way in self.merged:
+            lats, lons = self.road_data.nodes.coords(way.get("nodes", []))
+            lines.append(list(zip(lats.tolist(), lons.tolist())))
+        return [line for line in lines if len(line) >= 2]
+
+    def close(self):
+        self.road_data.nodes.close()
+
+
+def _stage_merge(data, workers):
+    fx = Fixture(data)
+    return fx, fx.merge
+
+
+def _stage_segments(data, workers):
+    fx = Fixture(data)
+    fx.merged = fx.merge()
+    nodes, graph = fx.road_data.nodes, fx.graph
+    return fx, lambda: [calculate_segments(way, nodes, graph, CFG) for way in fx.merged]
+
+
+def _stage_split(data, workers):
+    fx = Fixture(data)
+    fx.merged = fx.merge()
+    segments = [{"description": "all", "geometry": line} for line in fx.coords()]
+    max_km = CFG["segments"]["max_distance_km"]
+    return fx, lambda: _split_long_segments(segments, max_km)
+
+
+def _stage_simplify(data, workers):
+    fx = Fixture(data)
+    fx.merged = fx.merge()
+    lines = fx.coords()
+    tol = CFG["segments"]["simplify_tolerance"]
+    return fx, lambda: [simplify_geometry(line, tol) for line in lines]
+
+
+def _stage_process(data, workers):
+    road_data = from_json(data)
+    tmp = tempfile.TemporaryDirectory(prefix="bench-process-")
+
+    def run():
+        return list(process(CFG, road_data, Path(tmp.name), [], workers=workers))
+    return tmp, run
+
+
+def _stage_write(data, workers):
+    road_data = from_json(data)
+    tmp = tempfile.TemporaryDirectory(prefix="bench-write-")
+    issues: list = []
+    roads = list(process(CFG, road_data, Path(tmp.name), issues, workers=workers))
+
+    def run():
+        return write_outputs(iter(roads), issues, road_data.osm_timestamp, "synthetic",
+                             Path(tmp.name) / "out", CFG)
+    return tmp, run
+
+
+STAGES = {
+    "merge_connected_ways": _stage_merge,
+    "calculate_segments":   _stage_segments,
+    "_split_long_segments": _stage_split,
+    "simplify_geometry":    _stage_simplify,
+    "process":              _stage_process,
+    "write_outputs":        _stage_write,
+}
+
+
+def _cleanup(resource_):
+    if isinstance(resource_, Fixture):
+        resource_.close()
+    else:
+        resource_.cleanup()
+
+
+def run_stage(setup, data: dict, workers: int, repeat: int, quiet: bool) -> dict:
+    """Best time of ``repeat`` runs and the peak allocation of one traced run."""
+    sink = open(os.devnull, "w") if quiet else sys.stdout
+    best = float("inf")
+    try:
+        with contextlib.redirect_stdout(sink):
+            for _ in range(repeat):
+                held, fn = setup(data, workers)
+                try:
+                    t0 = time.perf_counter()
+                    fn()
+                    best = min(best, time.perf_counter() - t0)
+                finally:
+                    _cleanup(held)
+
+            held, fn = setup(data, workers)
+            try:
+                tracemalloc.start()
+                fn()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+                _cleanup(held)
+    finally:
+        if quiet:
+            sink.close()
+    return {"seconds": round(best, 6), "peak_mb": round(peak / 2**20, 2)}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def check_baseline(report: dict, baseline: dict, max_slowdown: float) -> list:
+    """Stages of ``report`` more than ``max_slowdown`` slower than ``baseline``."""
+    if baseline.get("params") != report["params"]:
+        return [f"baseline was run with different parameters: {baseline.get('params')}"]
+    problems = []
+    for name, result in report["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None or base["seconds"] < MIN_CHECKED_SECONDS:
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        if ratio > 1 + max_slowdown:
+            problems.append(f"{name}: {result['seconds']:.3f}s vs {base['seconds']:.3f}s "
+                            f"baseline ({ratio:.2f}x)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-by-stage road pipeline benchmark")
+    parser.add_argument("--ways", type=int, default=4000,
+                        help="Number of named OSM ways (default: 4000)")
+    parser.add_argument("--group-size", type=int, default=4,
+                        help="Ways per road name, chained end to end (default: 4)")
+    parser.add_argument("--vertices", type=int, default=30,
+                        help="Nodes per way (default: 30)")
+    parser.add_argument("--intersections", type=int, default=4,
+                        help="Differently named roads each road crosses (default: 4)")
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed (default: 1)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for process/write_outputs (default: 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; best is kept")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="Only run these stages (default: all)")
+    parser.add_argument("--report", default="bench_pipeline.json",
+                        help="JSON report to write (default: bench_pipeline.json)")
+    parser.add_argument("--baseline", default=None,
+                        help="Earlier report to compare with; exit 1 on a regression")
+    parser.add_argument("--max-slowdown", type=float, default=0.25,
+                        help="Allowed slowdown against --baseline (default: 0.25 = 25%%)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Show the pipeline's own log output")
+    args = parser.parse_args()
+
+    params = {"ways": args.ways, "group_size": args.group_size, "vertices": args.vertices,
+              "intersections": args.intersections, "seed": args.seed, "workers": args.workers}
+    data = synthetic_overpass(args.ways, args.group_size, args.vertices,
+                              args.intersections, args.seed)
+    n_nodes = sum(1 for e in data["elements"] if e["type"] == "node")
+    n_ways = len(data["elements"]) - n_nodes
+    print(f"{n_ways} ways, {n_nodes} nodes, {n_ways // args.group_size} road names")
+
+    stages = {}
+    for name in args.stages:
+        stages[name] = run_stage(STAGES[name], data, args.workers, args.repeat,
+                                 quiet=not args.verbose)
+        print(f"{name:<22} {stages[name]['seconds'] * 1000:10.1f} ms"
+              f"   peak {stages[name]['peak_mb']:8.1f} MB")
+
+    report = {
+        "version": REPORT_VERSION,
+        "generated": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "input": {"ways": n_ways, "nodes": n_nodes},
+        "stages": stages,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    Path(args.report).write_text(json.dumps(report, indent=2))
+    print(f"Peak RSS {report['peak_rss_mb']} MB; wrote {args.report}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        problems = check_baseline(report, baseline, args.max_slowdown)
+        if problems:
+            for problem in problems:
+                print(f"REGRESSION: {problem}", file=sys.stderr)
+            sys.exit(1)
+        print(f"No stage more than {args.max_slowdown:.0%} slower than {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+bench_simplify.py — Compare per-call and batch geometry simplification.
+
+Builds synthetic roads (random-walk polylines) with intersection-style
+segments, then simplifies every road and segment twice:
+
+    per-call   simplify_geometry() once per road and once per segment
+    batch      simplify_geometries() over all geometries in one call
+
+Both paths must produce identical coordinates; the script exits non-zero
+if they differ.
+
+Usage:
+    python benchmarks/bench_simplify.py [--roads N] [--vertices N] [--repeat N]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from rebuild_roads import simplify_geometries, simplify_geometry  # noqa: E402
+
+
+def synthetic_lines(n_roads: int, vertices: int, seed: int = 1) -> list:
+    """Roads as [(lat, lon), ...] plus 1–4 contiguous segments per road."""
+    rnd = random.Random(seed)
+    lines = []
+    for _ in range(n_roads):
+        lat, lon = 36.0 + rnd.random(), -84.5 + rnd.random()
+        n = rnd.randint(max(3, vertices // 2), vertices * 2)
+        road = []
+        for _ in range(n):
+            lat += rnd.uniform(-0.0004, 0.0006)
+            lon += rnd.uniform(-0.0004, 0.0006)
+            road.append((lat, lon))
+        lines.append(road)
+        cuts = sorted(rnd.sample(range(1, n - 1), min(n - 2, rnd.randint(0, 3))))
+        bounds = [0] + cuts + [n - 1]
+        lines.extend(road[a:b + 1] for a, b in zip(bounds, bounds[1:]))
+    return lines
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-call vs batch simplification benchmark")
+    parser.add_argument("--roads", type=int, default=5000, help="Number of roads (default: 5000)")
+    parser.add_argument("--vertices", type=int, default=60,
+                        help="Typical vertices per road (default: 60)")
+    parser.add_argument("--tolerance", type=float, default=0.0001,
+                        help="Douglas-Peucker tolerance in degrees (default: 0.0001)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path; best is kept")
+    args = parser.parse_args()
+
+    lines = synthetic_lines(args.roads, args.vertices)
+    n_vertices = sum(len(line) for line in lines)
+    print(f"{len(lines)} geometries, {n_vertices} vertices, tolerance {args.tolerance}")
+
+    per_call = [simplify_geometry(line, args.tolerance) for line in lines]
+    batch = simplify_geometries(lines, args.tolerance)
+    if per_call != batch:
+        print("ERROR: batch output differs from per-call output", file=sys.stderr)
+        sys.exit(1)
+
+    t_call = best_of(lambda: [simplify_geometry(line, args.tolerance) for line in lines],
+                     args.repeat)
+    t_batch = best_of(lambda: simplify_geometries(lines, args.tolerance), args.repeat)
+    print(f"per-call  {t_call * 1000:9.1f} ms")
+    print(f"batch     {t_batch * 1000:9.1f} ms   ({t_call / t_batch:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@
 # 1. Copies the baked-in roads data from the image into the data volume.
 #    This ensures that every time a new image version is pulled and the
 #    container restarted, the roads data is updated without touching reports.db.
+#    That includes roads.sqlite, the read-only road catalog api.php queries.
 #
 # 2. Initialises the SQLite database schema on first run (when reports.db
 #    is absent — i.e., a fresh deployment with an empty volume).
@@ -16,12 +17,40 @@ IMAGE_ROADS="/image-roads"
 mkdir -p "$DATA_DIR"
 
 # Always overwrite roads data from the baked-in image copy
-for f in roads_optimized.json roads_optimized.jsonl area_boundary_geojson.json rebuild_metadata.json merge_issues.csv; do
+for f in roads.sqlite area_boundary_geojson.json rebuild_metadata.json merge_issues.csv; do
     if [ -f "$IMAGE_ROADS/$f" ]; then
         cp "$IMAGE_ROADS/$f" "$DATA_DIR/$f"
     fi
 done
 
+# Road data files have content-hashed names listed in data-manifest.json.
+# Copy what the manifest lists (plus the .gz/.br siblings Caddy serves),
+# then the manifest itself, then prune every road data file it does not
+# list — older hashes and the plain names used before hashing.
+if [ -f "$IMAGE_ROADS/data-manifest.json" ]; then
+    MANIFEST_FILES=$(php -r "
+\$m = json_decode(file_get_contents('$IMAGE_ROADS/data-manifest.json'), true);
+foreach (\$m['files'] ?? [] as \$f) {
+    echo basename(\$f['path']), \"\\n\";
+    foreach (array_keys(\$f['encodings'] ?? []) as \$ext) {
+        echo basename(\$f['path']), '.', \$ext, \"\\n\";
+    }
+}
+")
+    for f in $MANIFEST_FILES; do
+        cp "$IMAGE_ROADS/$f" "$DATA_DIR/$f"
+    done
+    cp "$IMAGE_ROADS/data-manifest.json" "$DATA_DIR/data-manifest.json.tmp"
+    mv "$DATA_DIR/data-manifest.json.tmp" "$DATA_DIR/data-manifest.json"
+
+    for path in "$DATA_DIR"/roads_optimized.* "$DATA_DIR"/roads_overview.*; do
+        [ -e "$path" ] || continue
+        if ! printf '%s\n' "$MANIFEST_FILES" | grep -qxF "$(basename "$path")"; then
+            rm -f "$path"
+        fi
+    done
+fi
+
 echo "[entrypoint] Roads data ready in $DATA_DIR"
 
 # Restore from Litestream replica only when reports.db is absent.
@@ -183,6 +212,9 @@ echo \"[entrypoint] Auth schema ready.\\n\";
 
 # Write rebuild metadata from the baked-in JSON into the SQLite metadata table.
 # Runs on every container start so the table stays current when a new image is pulled.
+# Nested values (the per-stage build stats) are stored as JSON.  Each rebuild is
+# also kept in rebuild_history, keyed by its timestamp, so admin.php can show
+# the stage timings over time.
 if [ -f "$DATA_DIR/rebuild_metadata.json" ]; then
     php -r "
 \$meta = json_decode(file_get_contents('$DATA_DIR/rebuild_metadata.json'), true);
@@ -192,7 +224,22 @@ if (\$meta) {
     \$now = gmdate('Y-m-d\TH:i:s.000Z');
     \$stmt = \$db->prepare('INSERT OR REPLACE INTO metadata (key, value, updated_at) VALUES (?, ?, ?)');
     foreach (\$meta as \$k => \$v) {
-        \$stmt->execute([\$k, (string)\$v, \$now]);
+        \$stmt->execute([\$k, is_array(\$v) ? json_encode(\$v) : (string)\$v, \$now]);
+    }
+    \$db->exec('
+        CREATE TABLE IF NOT EXISTS rebuild_history (
+            last_rebuild TEXT PRIMARY KEY,
+            road_count INTEGER,
+            osm_timestamp TEXT,
+            stages TEXT
+        )
+    ');
+    if (!empty(\$meta['last_rebuild'])) {
+        \$db->prepare('INSERT OR IGNORE INTO rebuild_history (last_rebuild, road_count, osm_timestamp, stages) VALUES (?, ?, ?, ?)')
+            ->execute([\$meta['last_rebuild'], \$meta['road_count'] ?? null, \$meta['osm_timestamp'] ?? null,
+                       isset(\$meta['stages']) ? json_encode(\$meta['stages']) : null]);
+        \$db->exec('DELETE FROM rebuild_history WHERE last_rebuild NOT IN
+                    (SELECT last_rebuild FROM rebuild_history ORDER BY last_rebuild DESC LIMIT 90)');
     }
     echo \"[entrypoint] Rebuild metadata written to reports.db.\\n\";
 }
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+batch_build.py — Rebuild the road data of several areas from one shared
+Geofabrik extract.
+
+Usage:
+    python batch_build.py <config.yaml> [<config.yaml> ...] [--output-root <dir>]
+                          [--workers N] [--pbf-cache-dir <dir>] [--spill-dir <dir>]
+                          [--coord-precision N] [--trace-memory]
+
+Areas are grouped by data.geofabrik_url.  Each extract is downloaded (or
+refreshed) once and read once by osmpbf.extract_areas(), which collects the
+roads and boundary relations of every area in the group in a single set of
+passes.  Each area's roads are then clipped to its own boundary relation and
+processed in a separate worker process, up to --workers at a time; the node
+coordinates are handed to the workers through shared memory.
+
+Each area gets the same tree rebuild_roads.py --source pbf writes:
+
+    <output-root>/<area>/data/    roads_optimized.*, roads.sqlite, data-manifest.json,
+                                  area_boundary_geojson.json, rebuild_metadata.json, ...
+
+where <area> is the name of the directory holding the area's config.yaml.
+The "fetch" and "parse" stages in each area's rebuild_metadata.json are
+those of the shared pass.  Vector tiles are still built per area by
+update_pmtiles.py, which reuses the same --pbf-cache-dir.
+"""
+
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError as e:
+    print(f"ERROR: Missing dependency — {e}", file=sys.stderr)
+    print("Run: pip install requests shapely pyproj pyyaml numpy", file=sys.stderr)
+    sys.exit(1)
+
+try:
+    # rebuild_roads first: it reports the packages the modules below need
+    from rebuild_roads import (download_extract, log, process, saved_boundary, write_boundary,
+                               write_outputs)
+    from nodestore import NodeStore
+    from osmpbf import extract_areas
+    from overpass_stream import RoadData
+    from roadbin import DEFAULT_PRECISION, MAX_PRECISION
+    from sharedarrays import SharedArrays, attach
+    from stagestats import StageStats
+except ImportError as e:
+    # A module of this directory is missing or broken; pip cannot fix that
+    print(f"ERROR: Cannot import a scripts/ module — {e}", file=sys.stderr)
+    sys.exit(1)
+
+
+def load_areas(config_paths: list, output_root: Path) -> list:
+    """[(area name, cfg, output dir)] for each config, in the order given."""
+    areas, seen = [], set()
+    for path in map(Path, config_paths):
+        if not path.exists():
+            log(f"ERROR: Config not found: {path}")
+            sys.exit(1)
+        name = path.resolve().parent.name
+        if name in seen:
+            log(f"ERROR: Area {name} is listed twice")
+            sys.exit(1)
+        seen.add(name)
+        with path.open() as f:
+            cfg = yaml.safe_load(f)
+        areas.append((name, cfg, output_root / name / "data"))
+    return areas
+
+
+def read_extract(url: str, areas: list, pbf_cache_dir: Path, workers: int,
+                 spill_dir: Path | None, stats: StageStats) -> tuple:
+    """
+    Download the extract at ``url`` if needed and read the roads of every
+    area in ``areas`` from it in one pass.
+    Returns ([(RoadData, boundary polygons)] in the order of ``areas``, PBF file name).
+    """
+    pbf_file = download_extract(url, pbf_cache_dir, stats=stats)
+
+    specs = [(cfg["data"]["road_types"], cfg["area"]["osm_relation_id"],
+              saved_boundary(output_dir)) for _name, cfg, output_dir in areas]
+    try:
+        with stats.stage("parse"):
+            results = extract_areas(pbf_file, specs, workers=workers, spill_dir=spill_dir,
+                                    log=log)
+    except ValueError as exc:
+        log(f"ERROR: {exc}")
+        sys.exit(1)
+    return results, pbf_file.name
+
+
+# ── Per-area worker ───────────────────────────────────────────────────────────
+
+def build_area(name: str, cfg: dict, output_dir: Path, handle: tuple, ways: list,
+               osm_ts: str, element_count: int, polygons: list, data_source: str,
+               shared_stages: dict, coord_precision: int, trace_memory: bool) -> int:
+    """
+    process() and write_outputs() for one area whose nodes were published by
+    the parent under ``handle``.  Returns the number of roads written.
+    """
+    shm, arrays = attach(handle)
+    try:
+        nodes = NodeStore.from_sorted(arrays["ids"], arrays["lats"], arrays["lons"])
+        road_data = RoadData(nodes, ways, osm_ts, element_count)
+        stats = StageStats(trace_memory=trace_memory)
+        stats.merge(shared_stages)
+        stats.count("parse", elements=element_count, ways=len(ways), nodes=len(nodes))
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        merge_issues = []
+        roads = process(cfg, road_data, output_dir, merge_issues, stats=stats)
+        with stats.stage("write"):
+            road_count = write_outputs(roads, merge_issues, osm_ts, data_source, output_dir,
+                                       cfg, coord_precision=coord_precision, stats=stats)
+        if polygons:
+            with stats.stage("boundary"):
+                write_boundary(polygons, output_dir)
+        stats.save(output_dir / "rebuild_metadata.json")
+    finally:
+        del arrays
+        shm.close()
+    log(f"[{name}] {road_count} roads written to {output_dir}")
+    return road_count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild several areas' road data from one shared Geofabrik extract")
+    parser.add_argument("configs", nargs="+", help="Paths to area config.yaml files")
+    parser.add_argument("--output-root", default="build-output",
+                        help="Each area is written to <output-root>/<area>/data "
+                             "(default: build-output)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Build up to N areas at once in worker processes, and read "
+                             "the extract with N workers (default: 1)")
+    parser.add_argument("--pbf-cache-dir", default="/tmp/geofabrik-cache",
+                        help="Geofabrik PBF cache shared with update_pmtiles.py "
+                             "(default: /tmp/geofabrik-cache)")
+    parser.add_argument("--spill-dir", default=None,
+                        help="Keep node coordinates in memory-mapped files in this "
+                             "directory instead of RAM while reading the extract")
+    parser.add_argument("--coord-precision", type=int, default=DEFAULT_PRECISION,
+                        help="Decimal places kept for coordinates in roads_optimized.bin "
+                             f"(0–{MAX_PRECISION}, default: {DEFAULT_PRECISION})")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record each stage's peak Python/NumPy allocation with "
+                             "tracemalloc (slows the run down)")
+    args = parser.parse_args()
+
+    if not 0 <= args.coord_precision <= MAX_PRECISION:
+        log(f"ERROR: --coord-precision must be between 0 and {MAX_PRECISION}")
+        sys.exit(1)
+
+    areas = load_areas(args.configs, Path(args.output_root))
+    groups: dict = {}
+    for area in areas:
+        groups.setdefault(area[1]["data"]["geofabrik_url"], []).append(area)
+
+    spill_dir = Path(args.spill_dir) if args.spill_dir else None
+    failed = []
+    for url, group in groups.items():
+        log(f"Reading {len(group)} area(s) from {url}: {', '.join(a[0] for a in group)}")
+        stats = StageStats(trace_memory=args.trace_memory)
+        results, pbf_name = read_extract(url, group, Path(args.pbf_cache_dir), args.workers,
+                                         spill_dir, stats)
+        shared_stages = stats.records
+
+        published = []
+        try:
+            for road_data, _polygons in results:
+                published.append(SharedArrays(road_data.nodes.arrays()))
+                road_data.nodes.close()
+            with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(group)))) as pool:
+                futures = {
+                    pool.submit(build_area, name, cfg, output_dir, shared.handle,
+                                road_data.ways, road_data.osm_timestamp,
+                                road_data.element_count, polygons,
+                                f"Geofabrik PBF ({pbf_name})", shared_stages,
+                                args.coord_precision, args.trace_memory): name
+                    for (name, cfg, output_dir), (road_data, polygons), shared
+                    in zip(group, results, published)
+                }
+                for future, name in futures.items():
+                    try:
+                        future.result()
+                    except (Exception, SystemExit) as exc:
+                        log(f"ERROR: [{name}] build failed: {exc!r}")
+                        failed.append(name)
+        finally:
+            for shared in published:
+                shared.close()
+
+    if failed:
+        log(f"ERROR: {len(failed)} of {len(areas)} area(s) failed: {', '.join(failed)}")
+        sys.exit(1)
+    log(f"Batch build complete — {len(areas)} area(s)")
+
+
+if __name__ == "__main__":
+    main()
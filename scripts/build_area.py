@@ -7,12 +7,21 @@ Usage:
 
 What it does:
     1. Reads the area config.yaml
-    2. Writes <web_root>/area-config.json  (used by app.js at runtime)
-    3. Patches <web_root>/index.html         (title, subtitle, contact email, etc.)
+    2. Writes <web_root>/area-config.json  (used by the PHP pages at runtime)
+    3. Fingerprints the static assets in ASSETS: copies js/app.js to
+       js/app.<hash>.js etc., with .gz/.br siblings for Caddy's
+       precompressed file_server, and writes <web_root>/asset-manifest.json
+    4. Patches <web_root>/index.html in one pass: placeholders (title,
+       subtitle, contact email, etc.), asset references → fingerprinted names,
+       and the area config inlined so app.js does not have to fetch it
 """
 
+import gzip
+import hashlib
 import json
+import re
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
 
 try:
@@ -21,6 +30,16 @@ except ImportError:
     print("ERROR: pyyaml not installed. Run: pip install pyyaml", file=sys.stderr)
     sys.exit(1)
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static assets referenced by index.html, relative to the web root
+ASSETS = ["js/roadbin.js", "js/app.js", "css/style.css"]
+ASSET_MANIFEST = "asset-manifest.json"
+HASH_LENGTH = 16
+
 
 def _full_title(cfg):
     """StormPath - Area, State"""
@@ -45,6 +64,61 @@ PLACEHOLDER_MAP = {
 }
 
 
+def _asset_pattern(name):
+    """Matches ``name`` and its fingerprinted copies, e.g. js/app(.<hash>)?.js."""
+    stem, dot, suffix = name.rpartition(".")
+    return rf"{re.escape(stem)}(?:\.[0-9a-f]{{{HASH_LENGTH}}})?{re.escape(dot + suffix)}"
+
+
+def fingerprint_assets(web_root):
+    """
+    Copy each of ASSETS to a name carrying a prefix of its SHA-256, with
+    gzip (and, when the brotli module is installed, brotli) siblings, and
+    remove fingerprinted copies left by an earlier run.  The plain files
+    stay for anything that still asks for them.  Returns the manifest's
+    ``files`` table: {"js/app.js": {"path": "js/app.<hash>.js", ...}, ...}.
+    """
+    files = {}
+    for name in ASSETS:
+        src = web_root / name
+        if not src.exists():
+            print(f"WARNING: {src} not found — not fingerprinted", file=sys.stderr)
+            continue
+        data = src.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        dest = src.with_name(f"{src.stem}.{digest[:HASH_LENGTH]}{src.suffix}")
+        dest.write_bytes(data)
+
+        variants = {"gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)
+        encodings = {}
+        for ext, blob in variants.items():
+            dest.with_name(f"{dest.name}.{ext}").write_bytes(blob)
+            encodings[ext] = len(blob)
+
+        stale = re.compile(rf"{_asset_pattern(src.name)}(\.gz|\.br)?")
+        for path in src.parent.glob(f"{src.stem}.*"):
+            if (path != src and stale.fullmatch(path.name)
+                    and not path.name.startswith(dest.name)):
+                path.unlink()
+
+        files[name] = {
+            "path": dest.relative_to(web_root).as_posix(),
+            "size": len(data),
+            "sha256": digest,
+            "encodings": encodings,
+        }
+    return files
+
+
+def _inline_config(area_config):
+    """<script> element carrying the area config for app.js."""
+    # "<" escaped so no value can close the element early
+    payload = json.dumps(area_config, separators=(",", ":")).replace("<", "\\u003c")
+    return f'<script id="area-config" type="application/json">{payload}</script>'
+
+
 def main():
     if len(sys.argv) != 3:
         print(f"Usage: {sys.argv[0]} <config.yaml> <web_root>", file=sys.stderr)
@@ -70,6 +144,9 @@ def main():
         # PMTiles file basename (becomes tiles/<name>.pmtiles in the container)
         "pmtiles_file":         cfg["data"]["pmtiles_area_name"],
 
+        # Road/segment vector tiles from rebuild_roads.py, when the image has them
+        "roads_overlay":        (web_root / "tiles" / "roads_overlay.pmtiles").exists(),
+
         # UI text
         "title":                _full_title(cfg),
         "subtitle":             cfg["app"].get("subtitle", "Realtime, community-sourced, road status"),
@@ -84,17 +161,54 @@ def main():
     out_json.write_text(json.dumps(area_config, indent=2))
     print(f"✓ Wrote {out_json}")
 
-    # ── 2. Patch index.html ────────────────────────────────────────────────────
+    # ── 2. Fingerprint static assets ───────────────────────────────────────────
+    assets = fingerprint_assets(web_root)
+    manifest = {
+        "version": 1,
+        "generated": datetime.now(timezone.utc).isoformat(),
+        "files": assets,
+    }
+    out_manifest = web_root / ASSET_MANIFEST
+    out_manifest.write_text(json.dumps(manifest, indent=2))
+    for name, entry in assets.items():
+        print(f"✓ {name} → {entry['path']} "
+              f"({', '.join(f'{k} {v:,}' for k, v in entry['encodings'].items())} bytes)")
+    print(f"✓ Wrote {out_manifest}")
+
+    # ── 3. Patch index.html ────────────────────────────────────────────────────
     html_path = web_root / "index.html"
     if not html_path.exists():
         print(f"WARNING: index.html not found at {html_path} — skipping HTML patch",
               file=sys.stderr)
         return
 
-    html = html_path.read_text()
-    for placeholder, value_fn in PLACEHOLDER_MAP.items():
-        value = value_fn(cfg)
-        html = html.replace(placeholder, value)
+    # Every replacement is one alternative of a single regex, so the HTML is
+    # scanned once and a substituted value is never rescanned:
+    #   placeholders         STORMPATH_TITLE → "StormPath – Area, State", ...
+    #   asset references     "js/app.js?v=…" → "js/app.<hash>.js"
+    #   inlined area config  a previous run's element is dropped, then a fresh
+    #                        one goes in front of </head>
+    replacements = {placeholder: value_fn(cfg) for placeholder, value_fn in PLACEHOLDER_MAP.items()}
+    alternatives = [re.escape(p) for p in sorted(replacements, key=len, reverse=True)]
+    for i, name in enumerate(assets):
+        alternatives.append(rf'(?P<asset{i}>(?<=")/?{_asset_pattern(name)}(?:\?[^"]*)?(?="))')
+    alternatives.append(r'(?P<config>[ \t]*<script id="area-config" type="application/json">.*?</script>\s*)')
+    alternatives.append(r"(?P<head></head>)")
+    pattern = re.compile("|".join(alternatives), re.DOTALL)
+    asset_paths = [entry["path"] for entry in assets.values()]
+    config_element = _inline_config(area_config)
+
+    def substitute(m):
+        if m.lastgroup is None:
+            return replacements[m.group()]
+        if m.lastgroup == "config":
+            return ""
+        if m.lastgroup == "head":
+            return f"    {config_element}\n</head>"
+        path = asset_paths[int(m.lastgroup[len("asset"):])]
+        return ("/" if m.group().startswith("/") else "") + path
+
+    html = pattern.sub(substitute, html_path.read_text())
 
     html_path.write_text(html)
     print(f"✓ Patched {html_path}")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+build_pipeline.py — Run the nightly build of one area (roads, outline and
+vector tiles) with independent stages running concurrently.
+
+Usage:
+    python build_pipeline.py <config.yaml> [--output <dir>] [--source overpass|pbf]
+                             [--pbf-cache-dir <dir>] [--no-tiles] [--max-age-hours H]
+                             [--buffer-tiles N] [--no-prune]
+                             [--workers N] [--spill-dir <dir>] [--incremental]
+                             [--tile-grid N] [--max-connections N] [--coord-precision N]
+                             [--build-cache <dir>] [--profile [<dir>]] [--dry-run]
+
+Writes the same files as running rebuild_roads.py and then update_pmtiles.py
+--metadata:
+
+    <output>/data/     everything rebuild_roads.py writes (cache files included)
+    <output>/tiles/    <pmtiles_area_name>.pmtiles
+
+but overlaps the stages that do not depend on each other (scheduler.py).
+With --source overpass:
+
+    roads_fetch      Overpass road query → RoadData
+    boundary         Overpass boundary query → area_boundary_geojson.json
+    pbf_download     Geofabrik extract, for Planetiler
+    process          process() + write_outputs(), after roads_fetch
+    planetiler       PBF → PMTiles in Docker, after pbf_download, then pruned to
+                     the area outline (update_pmtiles.prune_pmtiles), after boundary
+    metadata         stage timings → rebuild_metadata.json, after everything
+
+With --source pbf the roads are read from the same download, so the extract
+is fetched once and parsing overlaps with Planetiler:
+
+    pbf_download → parse → process, boundary;  pbf_download, boundary → planetiler
+
+--dry-run prints this plan for the given config and exits without touching
+the network.  --profile runs the stages one at a time, since only one
+cProfile profiler can be active in a process.  --no-prune keeps every tile
+of the extract.  --incremental and --tile-grid behave as in
+rebuild_roads.py; --update (replication diffs) is only available there.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError as e:
+    print(f"ERROR: Missing dependency — {e}", file=sys.stderr)
+    print("Run: pip install requests shapely pyproj pyyaml numpy", file=sys.stderr)
+    sys.exit(1)
+
+try:
+    # rebuild_roads first: it reports the packages the modules below need
+    from rebuild_roads import (build_outputs, download_extract, fetch_boundary, fetch_overpass,
+                               log, log_stages, read_pbf, write_boundary)
+    from incremental import IncrementalState
+    from roadbin import DEFAULT_PRECISION, MAX_PRECISION
+    from scheduler import Scheduler
+    from stagecache import StageCache
+    from stagestats import StageStats
+    from update_pmtiles import build_tiles, download_pbf, pmtiles_is_fresh, prune_to_boundary
+except ImportError as e:
+    # A module of this directory is missing or broken; pip cannot fix that
+    print(f"ERROR: Cannot import a scripts/ module — {e}", file=sys.stderr)
+    sys.exit(1)
+
+
+def build_schedule(cfg: dict, args, data_dir: Path, tiles_dir: Path) -> tuple:
+    """
+    The Scheduler for one build, and the StageStats of its stages.  Each
+    stage records into its own StageStats, since StageStats is not
+    thread-safe; the metadata stage merges them.
+    """
+    profile_dir = Path(args.profile) if args.profile else None
+    url = cfg["data"]["geofabrik_url"]
+    pbf_cache_dir = Path(args.pbf_cache_dir)
+    pbf_file = pbf_cache_dir / url.rsplit("/", 1)[-1]
+    tiles_file = tiles_dir / f"{cfg['data']['pmtiles_area_name']}.pmtiles"
+    spill_dir = Path(args.spill_dir) if args.spill_dir else None
+    state = IncrementalState(data_dir / "rebuild_state.json") if args.incremental else None
+    cache = StageCache(Path(args.build_cache)) if args.build_cache else None
+    # cProfile allows one active profiler per process (Python 3.12 raises on
+    # a second enable()), so profiled stages run one at a time
+    sched = Scheduler(max_workers=1 if profile_dir else 4, log=log)
+    stats = {}
+
+    def new_stats(stage: str) -> StageStats:
+        stats[stage] = StageStats(profile_dir=profile_dir)
+        return stats[stage]
+
+    # ── Roads ────────────────────────────────────────────────────────────────
+    if args.source == "pbf":
+        def fetch_extract():
+            return download_extract(url, pbf_cache_dir, stats=new_stats("pbf_download"))
+
+        def parse(pbf_path):
+            road_data, polygons = read_pbf(cfg, pbf_path, data_dir, workers=args.workers,
+                                           spill_dir=spill_dir, stats=new_stats("parse"))
+            return road_data, polygons, f"Geofabrik PBF ({pbf_path.name})"
+
+        def boundary(parsed):
+            with new_stats("boundary").stage("boundary"):
+                if parsed[1]:
+                    write_boundary(parsed[1], data_dir)
+                else:
+                    fetch_boundary(cfg, data_dir)
+
+        sched.add("pbf_download", fetch_extract, note=f"Geofabrik extract → {pbf_file}")
+        sched.add("parse", parse, after=["pbf_download"], note="roads and outline from the PBF")
+        sched.add("boundary", boundary, after=["parse"], note="area_boundary_geojson.json")
+        roads_source = "parse"
+    else:
+        def fetch_roads():
+            st = new_stats("roads_fetch")
+            with st.stage("fetch"):
+                road_data = fetch_overpass(cfg, data_dir / "roads.json", spill_dir=spill_dir,
+                                           tile_grid=args.tile_grid,
+                                           max_connections=args.max_connections, stats=st)
+            return road_data, [], "Overpass API (live)"
+
+        def boundary():
+            with new_stats("boundary").stage("boundary"):
+                fetch_boundary(cfg, data_dir)
+
+        sched.add("roads_fetch", fetch_roads, note="Overpass road query → roads.json")
+        sched.add("boundary", boundary, note="Overpass boundary query → area_boundary_geojson.json")
+        roads_source = "roads_fetch"
+
+    def process_write(parsed) -> int:
+        road_data, _polygons, data_source = parsed
+        st = new_stats("process")
+        st.count("parse", elements=road_data.element_count, ways=len(road_data.ways),
+                 nodes=len(road_data.nodes))
+        return build_outputs(cfg, road_data, data_source, data_dir, workers=args.workers,
+                             state=state, coord_precision=args.coord_precision, cache=cache,
+                             stats=st)
+
+    sched.add("process", process_write, after=[roads_source],
+              note="process() + write_outputs() → roads_optimized.*"
+                   + (", or restore from the build cache" if cache else ""))
+
+    # ── Vector tiles ─────────────────────────────────────────────────────────
+    if not args.no_tiles and not pmtiles_is_fresh(tiles_file, args.max_age_hours):
+        if "pbf_download" not in sched:
+            def fetch_pbf():
+                with new_stats("pbf_download").stage("pmtiles_fetch") as st:
+                    path = download_pbf(url, pbf_cache_dir, pbf_file)
+                    st.count(bytes=path.stat().st_size)
+                return path
+
+            sched.add("pbf_download", fetch_pbf, note=f"Geofabrik extract → {pbf_file}")
+
+        def planetiler(pbf_path, *_boundary):
+            # Planetiler runs in a container, so only wall time here is meaningful
+            tile_stats = new_stats("planetiler")
+            with tile_stats.stage("pmtiles_build") as st:
+                cached = build_tiles(pbf_path, cfg["data"]["pmtiles_area_name"], tiles_file,
+                                     cache=cache)
+                st.count(bytes=tiles_file.stat().st_size, cache_hits=int(cached))
+            if not args.no_prune:
+                with tile_stats.stage("pmtiles_prune") as st:
+                    pruned = prune_to_boundary(tiles_file, data_dir / "area_boundary_geojson.json",
+                                               args.buffer_tiles)
+                    if pruned is not None:
+                        st.count(tiles=pruned["tiles_out"], bytes=pruned["bytes_out"])
+
+        sched.add("planetiler", planetiler,
+                  after=["pbf_download"] + ([] if args.no_prune else ["boundary"]),
+                  note=f"Planetiler → {tiles_file}"
+                       + (", or restore from the build cache" if cache else "")
+                       + ("" if args.no_prune else ", pruned to the area outline"))
+
+    def metadata(*_results):
+        # Merge in the order the stages started, each in its own report() order
+        merged = StageStats()
+        for name in sorted(stats, key=lambda n: sched.timings[n][0]):
+            records = stats[name].records
+            merged.merge({stage: records[stage] for stage in stats[name].report()})
+            stats[name].write_profiles()
+        merged.save(data_dir / "rebuild_metadata.json")
+        return merged
+
+    sched.add("metadata", metadata, after=sched.stages,
+              note="stage timings → rebuild_metadata.json")
+    return sched, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="StormPath area build with concurrent independent stages")
+    parser.add_argument("config", help="Path to area config.yaml")
+    parser.add_argument("--output", default="build-output",
+                        help="Writes <output>/data and <output>/tiles (default: build-output)")
+    parser.add_argument("--source", choices=("overpass", "pbf"), default="overpass",
+                        help="Read roads from the Overpass API (default) or from the "
+                             "Geofabrik .osm.pbf extract")
+    parser.add_argument("--pbf-cache-dir", default="/tmp/geofabrik-cache",
+                        help="Geofabrik PBF cache (default: /tmp/geofabrik-cache)")
+    parser.add_argument("--no-tiles", action="store_true",
+                        help="Skip the PMTiles download and Planetiler stages")
+    parser.add_argument("--max-age-hours", type=float, default=20,
+                        help="Skip Planetiler if the existing PMTiles file is younger than "
+                             "this many hours (default: 20). Set to 0 to always rebuild.")
+    parser.add_argument("--buffer-tiles", type=int, default=1,
+                        help="Keep PMTiles within N tiles of the area outline at each zoom "
+                             "(default: 1)")
+    parser.add_argument("--no-prune", action="store_true",
+                        help="Keep every tile Planetiler renders for the extract")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes for reading the PBF and processing roads "
+                             "(default: 1)")
+    parser.add_argument("--spill-dir", default=None,
+                        help="Keep node coordinates in memory-mapped files in this directory")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Recompute only changed roads, as rebuild_roads.py --incremental")
+    parser.add_argument("--tile-grid", type=int, default=1,
+                        help="Fetch the area as an N x N grid of Overpass queries (default: 1)")
+    parser.add_argument("--max-connections", type=int, default=4,
+                        help="Concurrent Overpass requests for --tile-grid (default: 4)")
+    parser.add_argument("--coord-precision", type=int, default=DEFAULT_PRECISION,
+                        help="Decimal places kept for coordinates in roads_optimized.bin "
+                             f"(0–{MAX_PRECISION}, default: {DEFAULT_PRECISION})")
+    parser.add_argument("--build-cache", default=None, metavar="DIR",
+                        help="Restore road outputs and PMTiles from this content-addressed "
+                             "cache when their inputs are unchanged (see stagecache.py)")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="DIR",
+                        help="Run each stage under cProfile and write <stage>.pstats and "
+                             "<stage>.txt to DIR (default: ./profile). Stages then run "
+                             "one at a time.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the execution plan and exit")
+    args = parser.parse_args()
+
+    if not 0 <= args.coord_precision <= MAX_PRECISION:
+        log(f"ERROR: --coord-precision must be between 0 and {MAX_PRECISION}")
+        sys.exit(1)
+
+    config_path = Path(args.config)
+    if not config_path.exists():
+        log(f"ERROR: Config not found: {config_path}")
+        sys.exit(1)
+
+    with config_path.open() as f:
+        cfg = yaml.safe_load(f)
+
+    data_dir = Path(args.output) / "data"
+    tiles_dir = Path(args.output) / "tiles"
+    sched, _stats = build_schedule(cfg, args, data_dir, tiles_dir)
+    if args.dry_run:
+        print(sched.describe())
+        return
+
+    log(f"Starting pipeline build of {cfg['area']['name']}...")
+    log(sched.describe())
+    data_dir.mkdir(parents=True, exist_ok=True)
+    results = sched.run()
+
+    log_stages(results["metadata"])
+    elapsed = sched.timings["metadata"][1]
+    busy = sum(end - start for start, end in sched.timings.values())
+    log(f"Pipeline complete — {results['process']} roads written in {elapsed:.1f} s "
+        f"({busy:.1f} s of stage time)")
+
+
+if __name__ == "__main__":
+    main()
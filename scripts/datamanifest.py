@@ -0,0 +1,86 @@
+"""
+datamanifest.py — data-manifest.json: logical road-data names → hashed files.
+
+The road data files are written under content-hashed names
+(``roads_optimized.<hash>.jsonl``, see jsonstream.OutputFile) so browsers
+and proxies can cache them indefinitely; only this small manifest has to be
+revalidated.  It looks like:
+
+    {"version": 1, "generated": "<ISO time>",
+     "files": {"roads_optimized.jsonl": {"path": "roads_optimized.<hash>.jsonl",
+                                         "size": 123, "sha256": "<hex>",
+                                         "encodings": {"gz": 45, "br": 40}}, ...}}
+
+Readers — the web client, api.php, entrypoint.sh and --incremental — look
+files up by logical name and fall back to that name when there is no
+manifest (output from before hashed names).
+"""
+
+import json
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+MANIFEST_NAME = "data-manifest.json"
+VERSION = 1
+
+
+def load(output_dir: Path) -> dict:
+    """The manifest's ``files`` table, or {} when there is none."""
+    try:
+        return json.loads((output_dir / MANIFEST_NAME).read_text()).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def resolve(output_dir: Path, name: str) -> Path:
+    """Current path of the logical file ``name`` in ``output_dir``."""
+    entry = load(output_dir).get(name)
+    return output_dir / entry["path"] if entry else output_dir / name
+
+
+def write(output_dir: Path, committed: list):
+    """
+    Write the manifest for ``committed``, a list of (hashed OutputFile, the
+    {path: size} its commit() returned), then delete every earlier version
+    of those files, hashed or not.
+    """
+    files = {}
+    for out, sizes in committed:
+        files[out.logical_path.name] = {
+            "path": out.path.name,
+            "size": sizes[out.path],
+            "sha256": out.sha256,
+            "encodings": {p.name[len(out.path.name) + 1:]: n
+                          for p, n in sizes.items() if p != out.path},
+        }
+    manifest = {
+        "version": VERSION,
+        "generated": datetime.now(timezone.utc).isoformat(),
+        "files": files,
+    }
+    part = output_dir / (MANIFEST_NAME + ".part")
+    part.write_text(json.dumps(manifest, indent=2))
+    os.replace(part, output_dir / MANIFEST_NAME)
+
+    # Only after the manifest points at the new files
+    prune(output_dir, files)
+
+
+def files_of(entries: dict) -> list:
+    """File names of a manifest ``files`` table: each hashed file and its encodings."""
+    return [name for entry in entries.values()
+            for name in [entry["path"]] + [f"{entry['path']}.{enc}" for enc in entry["encodings"]]]
+
+
+def prune(output_dir: Path, entries: dict):
+    """Delete every version of the files in ``entries``, hashed or not, but the listed one."""
+    keep = set(files_of(entries))
+    for logical in entries:
+        name = Path(logical)
+        pattern = re.compile(rf"{re.escape(name.stem)}(\.[0-9a-f]+)?{re.escape(name.suffix)}"
+                             r"(\.gz|\.br)?")
+        for path in output_dir.glob(f"{name.stem}.*"):
+            if pattern.fullmatch(path.name) and path.name not in keep:
+                path.unlink()
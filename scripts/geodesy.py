@@ -0,0 +1,101 @@
+"""
+geodesy.py — Batched distance helpers for the StormPath road pipeline.
+
+Every function takes whole coordinate arrays and makes a single pyproj call
+(or a handful of NumPy operations) instead of one GEOD.inv call per pair of
+points.  Coordinates are always (lat, lon) in degrees; distances are in km.
+
+Fast mode
+---------
+Functions accepting ``fast=True`` use an ellipsoidal equirectangular
+approximation: the offset between two points is projected onto a plane using
+the WGS84 meridional and prime-vertical radii of curvature at their mean
+latitude.  Against the full geodesic solution the relative error is below
+1e-6 (1 mm per km) for spans up to 10 km and below 3e-5 for spans up to
+50 km, anywhere between 70°S and 70°N.  That is ample for threshold checks
+such as the minimum intersection spacing and maximum segment length, but
+reported distances (e.g. merge gap sizes) should use the geodesic path.
+"""
+
+import numpy as np
+from pyproj import Geod
+
+GEOD = Geod(ellps="WGS84")
+
+# WGS84 semi-major axis (km) and first eccentricity squared
+_WGS84_A_KM = 6378.137
+_WGS84_E2 = (1 / 298.257223563) * (2 - 1 / 298.257223563)
+
+
+def _as_arrays(lats, lons) -> tuple:
+    return np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+
+
+def equirectangular_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Ellipsoidal equirectangular distance (see module docstring for error bound)."""
+    lat1, lon1 = _as_arrays(lat1, lon1)
+    lat2, lon2 = _as_arrays(lat2, lon2)
+    phi = np.radians((lat1 + lat2) / 2.0)
+    w = np.sqrt(1.0 - _WGS84_E2 * np.sin(phi) ** 2)
+    meridional = _WGS84_A_KM * (1.0 - _WGS84_E2) / w ** 3
+    prime_vertical = _WGS84_A_KM / w
+    dlon = (lon2 - lon1 + 180.0) % 360.0 - 180.0
+    x = np.radians(dlon) * prime_vertical * np.cos(phi)
+    y = np.radians(lat2 - lat1) * meridional
+    return np.hypot(x, y)
+
+
+def distances_km(lat1, lon1, lat2, lon2, fast: bool = False) -> np.ndarray:
+    """Element-wise distance between two sets of points (broadcasting allowed)."""
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2)))
+    if lat1.size == 0:
+        return np.zeros(lat1.shape)
+    if fast:
+        return equirectangular_km(lat1, lon1, lat2, lon2)
+    _, _, dist_m = GEOD.inv(np.ascontiguousarray(lon1), np.ascontiguousarray(lat1),
+                            np.ascontiguousarray(lon2), np.ascontiguousarray(lat2))
+    return np.asarray(dist_m) / 1000.0
+
+
+def edge_lengths_km(lats, lons, fast: bool = False) -> np.ndarray:
+    """Length of each edge of a polyline (n - 1 values for n vertices)."""
+    lats, lons = _as_arrays(lats, lons)
+    if len(lats) < 2:
+        return np.zeros(0)
+    return distances_km(lats[:-1], lons[:-1], lats[1:], lons[1:], fast=fast)
+
+
+def cumulative_lengths_km(lats, lons, fast: bool = False) -> np.ndarray:
+    """
+    Distance along a polyline at each vertex, starting at 0.0.
+
+    The running sum is accumulated in vertex order, so the last value is
+    exactly the sum a sequential Python loop over the edges would produce.
+    """
+    lats, _ = _as_arrays(lats, lons)
+    cum = np.zeros(len(lats))
+    if len(lats) > 1:
+        np.cumsum(edge_lengths_km(lats, lons, fast=fast), out=cum[1:])
+    return cum
+
+
+def split_points(edges_km: np.ndarray, target_km: float, max_cuts: int) -> list:
+    """
+    Vertex indices at which to cut a polyline into pieces of ``target_km``.
+
+    A cut is made at the first vertex whose distance from the previous cut
+    reaches the target, up to ``max_cuts`` cuts.  The distance is
+    re-accumulated from each cut so the result matches a running-sum loop
+    that resets after every split.
+    """
+    cuts = []
+    start = 0
+    while len(cuts) < max_cuts and start < len(edges_km):
+        run = np.cumsum(edges_km[start:])
+        k = int(np.searchsorted(run, target_km, side="left"))
+        if k >= len(run):
+            break
+        start += k + 1
+        cuts.append(start)
+    return cuts
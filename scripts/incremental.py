@@ -0,0 +1,145 @@
+"""
+incremental.py — Per-road-name fingerprints for incremental rebuilds.
+
+Each name group's output (its merged roads, segments and merge issues) is a
+pure function of:
+    the member way ids, their highway tags and their node lists
+    the coordinates of those nodes (or their absence)
+    the other road names meeting at each of its intersection nodes
+    the ``segments`` config
+A fingerprint hashes exactly those inputs.  IncrementalState remembers the
+fingerprint of every group from the previous run together with the number
+of output records it produced, so unchanged groups can be copied from the
+previous roads_optimized.jsonl instead of being recomputed.
+
+The state file is only trusted when the jsonl it describes is unchanged
+(checked by SHA-256) and the ``segments`` config is the same; otherwise every
+group is rebuilt.  The latter check lets callers that already know which
+names changed (e.g. from an OSM diff) reuse the other groups without
+fingerprinting them.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from nodestore import NodeStore
+from roadgraph import RoadGraph
+
+# Bump when a code change alters the output for unchanged inputs
+STATE_VERSION = 2
+
+
+def group_fingerprints(groups: list, graph: RoadGraph, nodes: NodeStore,
+                       seg_cfg: dict) -> list:
+    """Hex fingerprint of each (name, [way index, ...]) group, in order."""
+    config = json.dumps([STATE_VERSION, seg_cfg], sort_keys=True).encode()
+    empty = not len(nodes)
+    fingerprints = []
+    for name, members in groups:
+        h = hashlib.blake2b(config, digest_size=16)
+        h.update(name.encode())
+        members = np.asarray(members, dtype=np.int64)
+        h.update(graph.way_ids[members].tobytes())
+        h.update((graph.way_ptr[members + 1] - graph.way_ptr[members]).tobytes())
+        h.update(json.dumps([graph.ways[i]["tags"].get("highway") for i in members.tolist()])
+                 .encode())
+
+        node_ids = np.concatenate([graph.way_nodes(i) for i in members.tolist()])
+        h.update(node_ids.tobytes())
+        idx = nodes.indices(node_ids)
+        found = idx >= 0
+        safe = np.maximum(idx, 0)
+        h.update(found.tobytes())
+        if not empty:
+            h.update(np.where(found, nodes.lats[safe], 0.0).tobytes())
+            h.update(np.where(found, nodes.lons[safe], 0.0).tobytes())
+
+        # Intersection nodes and, in order, the names crossing there
+        crossings = np.unique(node_ids[graph.intersection_mask(node_ids)])
+        for nid in crossings.tolist():
+            h.update(json.dumps([nid, graph.cross_names(nid, name)]).encode())
+        fingerprints.append(h.hexdigest())
+    return fingerprints
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class IncrementalState:
+    """Group fingerprints and outputs carried from one rebuild to the next."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._previous: dict = {}
+        self._entries: list = []
+        self._seg_cfg: dict = {}
+
+    def load(self, jsonl_path: Path, seg_cfg: dict) -> str | None:
+        """
+        Read the previous state and the roads it produced from ``jsonl_path``.
+        Returns None on success, or the reason nothing can be reused.
+        """
+        self._previous = {}
+        self._seg_cfg = seg_cfg
+        if not self.path.exists():
+            return "no previous state"
+        if not jsonl_path.exists():
+            return f"{jsonl_path.name} is missing"
+        try:
+            state = json.loads(self.path.read_text())
+        except (OSError, ValueError) as exc:
+            return f"unreadable state file ({exc})"
+        if state.get("version") != STATE_VERSION:
+            return "state file is from a different version"
+        if state.get("segments") != seg_cfg:
+            return "segments config changed"
+        if state.get("jsonl_sha256") != _sha256(jsonl_path):
+            return f"{jsonl_path.name} changed since the state was saved"
+
+        previous = {}
+        with jsonl_path.open() as f:
+            try:
+                for name, fingerprint, n_roads, issues, merged in state["groups"]:
+                    roads = [json.loads(next(f)) for _ in range(n_roads)]
+                    previous[name] = (fingerprint, roads, issues, merged)
+            except (StopIteration, KeyError, TypeError, ValueError):
+                return "state file does not match the previous output"
+        self._previous = previous
+        return None
+
+    def fingerprint(self, name: str) -> str | None:
+        """Fingerprint a group had in the previous run, if it had output then."""
+        entry = self._previous.get(name)
+        return entry[0] if entry else None
+
+    def reusable(self, name: str, fingerprint: str) -> tuple | None:
+        """(roads, merge_issues, merged_count) of an unchanged group, else None."""
+        entry = self._previous.get(name)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        return entry[1:]
+
+    def record(self, name: str, fingerprint: str, roads: list, issues: list, merged: int):
+        """Note a group's output for this run, in output order."""
+        self._entries.append([name, fingerprint, len(roads), issues, merged])
+
+    def save(self, jsonl_path: Path):
+        """Write the state describing the freshly written ``jsonl_path``."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "version": STATE_VERSION,
+            "segments": self._seg_cfg,
+            "jsonl_sha256": _sha256(jsonl_path),
+            "groups": self._entries,
+        }
+        partial = self.path.with_name(self.path.name + ".part")
+        partial.write_text(json.dumps(state))
+        partial.replace(self.path)
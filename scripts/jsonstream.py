@@ -0,0 +1,148 @@
+"""
+jsonstream.py — Serialise records once and stream them into several outputs.
+
+OutputFile writes one logical file together with precompressed siblings
+(``<name>.gz`` and, when the brotli module is installed, ``<name>.br``) that
+Caddy's ``file_server { precompressed }`` can serve as-is.  Everything is
+written to ``.part`` files and renamed into place by commit(), so readers
+never see a half-written file and a failed build leaves the previous one.
+With ``hashed=True`` the committed name carries a prefix of the content's
+SHA-256 (``roads_optimized.<hash>.jsonl``) so it can be cached as immutable.
+
+dumps() uses orjson when it is installed (several times faster, compact
+separators) and the standard json module otherwise, whose output matches
+json.dumps() byte for byte.
+"""
+
+import hashlib
+import json
+import zlib
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# gzip level 9 and brotli quality 9: the files are compressed once per build
+# and served many times, but quality 10–11 costs minutes on large areas.
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+    ITEM_SEPARATOR = b","
+    _KEY_SEPARATOR = b":"
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+else:
+    JSON_BACKEND = "json"
+    ITEM_SEPARATOR = b", "
+    _KEY_SEPARATOR = b": "
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+
+def open_array(head: dict, key: str) -> bytes:
+    """
+    Bytes opening ``{**head, key: [`` — follow with items joined by
+    ITEM_SEPARATOR and close with ``b"]}"``.
+    """
+    return dumps(head)[:-1] + ITEM_SEPARATOR + dumps(key) + _KEY_SEPARATOR + b"["
+
+
+# Precompressed siblings an OutputFile writes by default
+PRECOMPRESS_SUFFIXES = (".gz", ".br") if brotli is not None else (".gz",)
+
+
+class _Gzip:
+    suffix = ".gz"
+
+    def __init__(self):
+        # wbits=31: gzip container with a zero mtime, so output is reproducible
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._z.compress(data)
+
+    def finish(self) -> bytes:
+        return self._z.flush()
+
+
+class _Brotli:
+    suffix = ".br"
+
+    def __init__(self):
+        self._c = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class OutputFile:
+    """A file plus precompressed siblings, written together and committed atomically."""
+
+    _SUFFIXES = (".gz", ".br")
+
+    HASH_LENGTH = 16    # hex digits of the SHA-256 kept in hashed file names
+
+    def __init__(self, path: Path, precompress: bool = True, hashed: bool = False):
+        self.path = path
+        self.logical_path = path
+        self._hash = hashlib.sha256() if hashed else None
+        self.sha256 = None
+        codecs = [_Gzip()] + ([_Brotli()] if brotli is not None else []) if precompress else []
+        self._sinks = [(path, None)] + [(path.with_name(path.name + c.suffix), c) for c in codecs]
+        self._files = [self._part(p).open("wb") for p, _ in self._sinks]
+
+    @staticmethod
+    def _part(path: Path) -> Path:
+        return path.with_name(path.name + ".part")
+
+    def write(self, data: bytes):
+        if self._hash is not None:
+            self._hash.update(data)
+        for f, (_path, codec) in zip(self._files, self._sinks):
+            f.write(data if codec is None else codec.compress(data))
+
+    def commit(self) -> dict:
+        """
+        Finish all streams, move them into place and return {path: size}.
+        For a hashed file, ``path`` is the hashed name from then on.
+        """
+        if self._hash is not None:
+            self.sha256 = self._hash.hexdigest()
+            name = self.logical_path
+            self.path = name.with_name(f"{name.stem}.{self.sha256[:self.HASH_LENGTH]}{name.suffix}")
+        sizes = {}
+        for f, (path, codec) in zip(self._files, self._sinks):
+            if codec is not None:
+                f.write(codec.finish())
+            f.close()
+            final = self.path if codec is None else self.path.with_name(self.path.name + codec.suffix)
+            self._part(path).replace(final)
+            sizes[final] = final.stat().st_size
+        # Drop siblings this run could not produce (e.g. brotli uninstalled),
+        # so a stale .br is never served in place of the new data.
+        written = set(sizes)
+        for suffix in self._SUFFIXES:
+            stale = self.path.with_name(self.path.name + suffix)
+            if stale not in written:
+                stale.unlink(missing_ok=True)
+        return sizes
+
+    def abort(self):
+        """Discard everything written so far."""
+        for f, (path, _codec) in zip(self._files, self._sinks):
+            f.close()
+            self._part(path).unlink(missing_ok=True)
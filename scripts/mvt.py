@@ -0,0 +1,224 @@
+"""
+mvt.py — Minimal Mapbox Vector Tile (MVT 2.1) encoder and decoder.
+
+Only what the road overlay needs: line geometries (LineString and
+MultiLineString) in integer tile coordinates, a numeric feature id, and
+string / integer / float / boolean properties.  decode() exists so a
+written archive can be checked without a browser.
+
+Tiles are protobuf messages:
+
+    Tile    { repeated Layer layers = 3; }
+    Layer   { version = 15; name = 1; repeated Feature features = 2;
+              repeated string keys = 3; repeated Value values = 4; extent = 5; }
+    Feature { id = 1; packed uint32 tags = 2; type = 3; packed uint32 geometry = 4; }
+    Value   { string = 1; float = 2; double = 3; int64 = 4; uint64 = 5;
+              sint64 = 6; bool = 7; }
+"""
+
+import struct
+
+import numpy as np
+
+from protowire import (FIXED64, VARINT, bytes_field, encode_varint, encode_varints, fields,
+                       key, packed_field, read_packed, to_int64, unzigzag, zigzag)
+
+EXTENT = 4096
+
+_LINESTRING = 2
+_MOVE_TO, _LINE_TO = 1, 2
+
+
+# ── Encoding ──────────────────────────────────────────────────────────────────
+
+def _value(value) -> bytes:
+    if isinstance(value, bool):
+        return key(7, VARINT) + encode_varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return key(5, VARINT) + encode_varint(value)
+        return key(6, VARINT) + encode_varint(zigzag(value))
+    if isinstance(value, float):
+        return key(3, FIXED64) + struct.pack("<d", value)
+    return bytes_field(1, str(value).encode())
+
+
+def line_geometries(points: np.ndarray, part_sizes: np.ndarray,
+                    part_groups: np.ndarray) -> list:
+    """
+    Packed geometry fields for many line features at once.
+
+    ``points`` is an (N, 2) integer array of every part's vertices in order,
+    ``part_sizes`` the vertex count of each part (at least two) and
+    ``part_groups`` the feature each part belongs to — non-decreasing, so a
+    feature's parts are adjacent.  Returns one bytes value per feature.
+    """
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    part_sizes = np.asarray(part_sizes, dtype=np.int64)
+    part_groups = np.asarray(part_groups)
+    n_parts = len(part_sizes)
+    if not n_parts:
+        return []
+    point_start = np.cumsum(part_sizes) - part_sizes
+
+    # The cursor carries over between the parts of a feature, so each vertex
+    # is a delta from the previous one; a feature's first vertex is absolute.
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    first_of_group = np.ones(n_parts, dtype=bool)
+    first_of_group[1:] = part_groups[1:] != part_groups[:-1]
+    deltas[point_start[first_of_group]] = points[point_start[first_of_group]]
+    params = (deltas << 1) ^ (deltas >> 63)
+
+    # Per part: MoveTo(1) x y LineTo(n - 1) x y ...
+    cmd_sizes = 2 * part_sizes + 2
+    cmd_start = np.cumsum(cmd_sizes) - cmd_sizes
+    commands = np.empty(int(cmd_sizes.sum()), dtype=np.int64)
+    commands[cmd_start] = (1 << 3) | _MOVE_TO
+    commands[cmd_start + 1] = params[point_start, 0]
+    commands[cmd_start + 2] = params[point_start, 1]
+    commands[cmd_start + 3] = ((part_sizes - 1) << 3) | _LINE_TO
+    point_part = np.repeat(np.arange(n_parts), part_sizes)
+    within = np.arange(len(points)) - point_start[point_part]
+    rest = within > 0
+    pos = cmd_start[point_part[rest]] + 2 + 2 * within[rest]
+    commands[pos] = params[rest, 0]
+    commands[pos + 1] = params[rest, 1]
+
+    encoded, sizes = encode_varints(commands)
+    byte_at = np.concatenate([[0], np.cumsum(sizes)])
+    group_cmd = np.append(cmd_start[first_of_group], len(commands))
+    data = encoded.tobytes()
+    return [data[byte_at[a]:byte_at[b]] for a, b in zip(group_cmd[:-1].tolist(),
+                                                       group_cmd[1:].tolist())]
+
+
+class Layer:
+    """One named layer of line features, encoded as they are added."""
+
+    def __init__(self, name: str, extent: int = EXTENT):
+        self.name = name
+        self.extent = extent
+        self._keys: dict = {}
+        self._values: dict = {}
+        self._features: list = []
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def add_line(self, parts: list, properties: dict, feature_id: int | None = None):
+        """
+        Add a (multi-)line given as integer tile-coordinate parts,
+        [[(x, y), ...], ...]; each part needs at least two distinct points.
+        """
+        points = np.concatenate([np.asarray(part, dtype=np.int64).reshape(-1, 2)
+                                 for part in parts])
+        geometry = line_geometries(points, [len(part) for part in parts],
+                                   np.zeros(len(parts), dtype=np.int64))[0]
+        self.add_geometry(geometry, properties, feature_id)
+
+    def add_geometry(self, geometry: bytes, properties: dict, feature_id: int | None = None):
+        """Add a line feature whose geometry came from line_geometries()."""
+        tags = []
+        for k, v in properties.items():
+            tags.append(self._keys.setdefault(k, len(self._keys)))
+            tags.append(self._values.setdefault((type(v), v), len(self._values)))
+        feature = b""
+        if feature_id is not None:
+            feature += key(1, VARINT) + encode_varint(feature_id)
+        feature += packed_field(2, tags)
+        feature += key(3, VARINT) + encode_varint(_LINESTRING)
+        feature += bytes_field(4, geometry)
+        self._features.append(feature)
+
+    def encode(self) -> bytes:
+        return (key(15, VARINT) + encode_varint(2)
+                + bytes_field(1, self.name.encode())
+                + b"".join(bytes_field(2, f) for f in self._features)
+                + b"".join(bytes_field(3, k.encode()) for k in self._keys)
+                + b"".join(bytes_field(4, _value(v)) for _t, v in self._values)
+                + key(5, VARINT) + encode_varint(self.extent))
+
+
+def encode(layers: list) -> bytes:
+    """A tile holding the non-empty ``layers``."""
+    return b"".join(bytes_field(3, layer.encode()) for layer in layers if len(layer))
+
+
+# ── Decoding ──────────────────────────────────────────────────────────────────
+
+def _decode_value(buf):
+    for field, value in fields(buf):
+        if field == 1:
+            return value.decode()
+        if field == 2:
+            return struct.unpack("<f", value)[0]
+        if field == 3:
+            return struct.unpack("<d", value)[0]
+        if field == 4:
+            return to_int64(value)
+        if field == 5:
+            return value
+        if field == 6:
+            return unzigzag(value)
+        if field == 7:
+            return bool(value)
+    return None
+
+
+def _decode_geometry(commands: list) -> list:
+    parts, pos, cx, cy = [], 0, 0, 0
+    while pos < len(commands):
+        cmd, count = commands[pos] & 7, commands[pos] >> 3
+        pos += 1
+        if cmd == 7:  # ClosePath
+            continue
+        for _ in range(count):
+            dx, dy = commands[pos], commands[pos + 1]
+            pos += 2
+            cx += unzigzag(dx)
+            cy += unzigzag(dy)
+            if cmd == _MOVE_TO:
+                parts.append([(cx, cy)])
+            else:
+                parts[-1].append((cx, cy))
+    return parts
+
+
+def decode(data: bytes) -> dict:
+    """
+    {layer name: {"extent": int, "features": [{"id", "type", "properties",
+    "geometry": [[(x, y), ...], ...]}, ...]}} for an uncompressed tile.
+    """
+    layers = {}
+    for field, layer_buf in fields(bytes(data)):
+        if field != 3:
+            continue
+        name, extent, keys, values, raw = "", EXTENT, [], [], []
+        for lf, value in fields(layer_buf):
+            if lf == 1:
+                name = value.decode()
+            elif lf == 2:
+                raw.append(value)
+            elif lf == 3:
+                keys.append(value.decode())
+            elif lf == 4:
+                values.append(_decode_value(value))
+            elif lf == 5:
+                extent = value
+        features = []
+        for feature_buf in raw:
+            feature = {"id": None, "type": 0, "properties": {}, "geometry": []}
+            for ff, value in fields(feature_buf):
+                if ff == 1:
+                    feature["id"] = value
+                elif ff == 2:
+                    tags = read_packed(value)
+                    feature["properties"] = {keys[k]: values[v]
+                                             for k, v in zip(tags[::2], tags[1::2])}
+                elif ff == 3:
+                    feature["type"] = value
+                elif ff == 4:
+                    feature["geometry"] = _decode_geometry(read_packed(value))
+            features.append(feature)
+        layers[name] = {"extent": extent, "features": features}
+    return layers
@@ -0,0 +1,155 @@
+"""
+nodestore.py — Compact array-backed storage for OSM node coordinates.
+
+A NodeStore holds every node as one entry in three parallel arrays: a sorted
+int64 id array and float64 lat/lon arrays (24 bytes per node, versus several
+hundred for a parsed Overpass dict).  Id lookups are vectorised with
+np.searchsorted, so a whole way's node list resolves in one call.
+
+For very large areas the arrays can be spilled to numpy.memmap files so the
+operating system pages coordinates in and out on demand instead of holding
+them all in RAM.  The sorted arrays are then written straight into the
+memmaps a chunk at a time, so building a spilled store needs, besides the
+caller's input arrays, only the 8-byte sort permutation and a 1-byte
+duplicate mask per node in RAM — not a sorted in-memory copy of the table.
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+_CHUNK = 1 << 20            # rows per chunk when writing spilled arrays
+
+
+class NodeStore:
+    """Sorted id → (lat, lon) table with vectorised lookups."""
+
+    def __init__(self, ids, lats, lons, spill_dir: Path | None = None):
+        ids = np.asarray(ids, dtype=np.int64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if not (len(ids) == len(lats) == len(lons)):
+            raise ValueError("NodeStore: ids, lats and lons must have equal length")
+
+        order = np.argsort(ids, kind="stable")
+        self._spill_dir = None
+        if spill_dir is not None:
+            self._spill_dir = Path(tempfile.mkdtemp(prefix="nodestore-", dir=spill_dir))
+            self.ids, self.lats, self.lons = self._spill_sorted(order, ids, lats, lons)
+            return
+
+        ids, lats, lons = ids[order], lats[order], lons[order]
+        if len(ids) > 1:
+            # Keep the last occurrence of a duplicated id (later data wins)
+            keep = np.ones(len(ids), dtype=bool)
+            keep[:-1] = ids[1:] != ids[:-1]
+            ids, lats, lons = ids[keep], lats[keep], lons[keep]
+        self.ids = ids
+        self.lats = lats
+        self.lons = lons
+
+    @classmethod
+    def from_elements(cls, elements: list, spill_dir: Path | None = None) -> "NodeStore":
+        """Build a store from the node entries of an Overpass ``elements`` list."""
+        node_elems = [e for e in elements if e["type"] == "node"]
+        n = len(node_elems)
+        ids = np.fromiter((e["id"] for e in node_elems), dtype=np.int64, count=n)
+        lats = np.fromiter((e["lat"] for e in node_elems), dtype=np.float64, count=n)
+        lons = np.fromiter((e["lon"] for e in node_elems), dtype=np.float64, count=n)
+        return cls(ids, lats, lons, spill_dir=spill_dir)
+
+    @classmethod
+    def from_sorted(cls, ids, lats, lons) -> "NodeStore":
+        """Wrap arrays that are already sorted and unique by id (no copy)."""
+        store = cls.__new__(cls)
+        store.ids, store.lats, store.lons = ids, lats, lons
+        store._spill_dir = None
+        return store
+
+    def arrays(self) -> dict:
+        return {"ids": self.ids, "lats": self.lats, "lons": self.lons}
+
+    def _spill_sorted(self, order: np.ndarray, *arrays) -> list:
+        """
+        Write ``arrays`` (ids first) permuted by ``order`` into memmap files
+        chunk by chunk, then drop duplicated ids in place, keeping the last
+        occurrence as the in-memory path does.
+        """
+        n = len(order)
+        maps = []
+        for name, arr in zip(("ids", "lats", "lons"), arrays):
+            mm = np.memmap(self._spill_dir / f"{name}.bin", dtype=arr.dtype, mode="w+",
+                           shape=(max(n, 1),))
+            for start in range(0, n, _CHUNK):
+                mm[start:start + _CHUNK] = arr[order[start:start + _CHUNK]]
+            maps.append(mm)
+        if n == 0:
+            return [mm[:0] for mm in maps]
+
+        ids = maps[0]
+        keep = np.ones(n, dtype=bool)
+        for start in range(0, n - 1, _CHUNK):
+            end = min(start + _CHUNK, n - 1)
+            keep[start:end] = ids[start + 1:end + 1] != ids[start:end]
+        size = n
+        if not keep.all():
+            # Compact forwards: the write position never passes the read position
+            size = 0
+            for start in range(0, n, _CHUNK):
+                sel = keep[start:start + _CHUNK]
+                count = int(np.count_nonzero(sel))
+                for mm in maps:
+                    mm[size:size + count] = mm[start:start + _CHUNK][sel]
+                size += count
+        for mm in maps:
+            mm.flush()
+        return [mm[:size] for mm in maps]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, node_id) -> bool:
+        i = np.searchsorted(self.ids, node_id)
+        return bool(i < len(self.ids) and self.ids[i] == node_id)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.lats.nbytes + self.lons.nbytes
+
+    def indices(self, node_ids) -> np.ndarray:
+        """Array positions for ``node_ids``; -1 where a node is not in the store."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(node_ids.shape, -1, dtype=np.int64)
+        idx = np.searchsorted(self.ids, node_ids)
+        idx[idx >= len(self.ids)] = 0
+        return np.where(self.ids[idx] == node_ids, idx, -1)
+
+    def coords(self, node_ids) -> tuple:
+        """
+        (lats, lons) arrays for the nodes of ``node_ids`` present in the store,
+        in input order.  Missing nodes are dropped.
+        """
+        idx = self.indices(node_ids)
+        idx = idx[idx >= 0]
+        return self.lats[idx], self.lons[idx]
+
+    def latlon(self, node_id) -> tuple | None:
+        """(lat, lon) of a single node, or None if it is not in the store."""
+        i = np.searchsorted(self.ids, node_id)
+        if i < len(self.ids) and self.ids[i] == node_id:
+            return float(self.lats[i]), float(self.lons[i])
+        return None
+
+    def close(self):
+        """Delete memory-mapped spill files, if any.  The store is empty afterwards."""
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.lats = np.zeros(0, dtype=np.float64)
+        self.lons = np.zeros(0, dtype=np.float64)
+        if self._spill_dir is None:
+            return
+        for f in self._spill_dir.glob("*.bin"):
+            f.unlink()
+        self._spill_dir.rmdir()
+        self._spill_dir = None
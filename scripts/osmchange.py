@@ -0,0 +1,342 @@
+"""
+osmchange.py — Keep a local copy of the area's roads current with OSM diffs.
+
+ElementStore is a small SQLite database holding the named road ways of one
+area and the nodes they reference, keyed by id, with versions where known.
+It is seeded from a full fetch (roads.json) and then brought forward by
+applying osmChange (.osc) files from an OSM replication feed:
+
+    <base>/state.txt                 latest sequence number and timestamp
+    <base>/000/123/456.state.txt     timestamp of sequence 123456
+    <base>/000/123/456.osc.gz        changes up to that timestamp
+
+``base`` is either a URL (e.g. a Geofabrik "-updates" directory) or a local
+directory with the same layout.
+
+All pending diffs are folded into one change set first (the highest version
+of each element wins), so the result does not depend on how changes were
+split across files.  apply_changes() reports the road names whose output can
+have changed: names of ways that were created, modified or deleted, and of
+every way touching a node that moved or that a changed way gained or lost.
+"""
+
+import gzip
+import io
+import sqlite3
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import requests
+import shapely
+
+from nodestore import NodeStore
+from overpass_stream import RoadData
+
+# ── Replication feed ──────────────────────────────────────────────────────────
+
+
+class ReplicationSource:
+    """Reads state files and diffs from a replication URL or directory."""
+
+    def __init__(self, base: str):
+        self.base = base.rstrip("/")
+        self._remote = self.base.startswith(("http://", "https://"))
+        self._states: dict = {}
+
+    def _read(self, rel_path: str) -> bytes:
+        if self._remote:
+            resp = requests.get(f"{self.base}/{rel_path}", timeout=120,
+                                headers={"User-Agent": "StormPath/1.0 road-status-app"})
+            resp.raise_for_status()
+            return resp.content
+        return (Path(self.base) / rel_path).read_bytes()
+
+    @staticmethod
+    def _path(sequence: int, suffix: str) -> str:
+        s = f"{sequence:09d}"
+        return f"{s[0:3]}/{s[3:6]}/{s[6:9]}{suffix}"
+
+    @staticmethod
+    def _parse_state(text: str) -> tuple:
+        props = {}
+        for line in text.splitlines():
+            if "=" in line and not line.startswith("#"):
+                key, value = line.split("=", 1)
+                props[key.strip()] = value.strip().replace("\\:", ":")
+        return int(props["sequenceNumber"]), props["timestamp"]
+
+    def latest(self) -> tuple:
+        """(sequence, timestamp) of the newest diff."""
+        return self._parse_state(self._read("state.txt").decode())
+
+    def timestamp(self, sequence: int) -> str:
+        if sequence not in self._states:
+            text = self._read(self._path(sequence, ".state.txt")).decode()
+            self._states[sequence] = self._parse_state(text)[1]
+        return self._states[sequence]
+
+    def first_after(self, timestamp: str, latest: int) -> int:
+        """
+        Smallest sequence whose state timestamp is later than ``timestamp``,
+        by binary search (timestamps increase with the sequence number).
+        Returns latest + 1 if nothing is newer.  A missing state file counts
+        as older (the server prunes old sequences); any other error is raised.
+        """
+        lo, hi = 0, latest + 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            try:
+                newer = _parse_ts(self.timestamp(mid)) > _parse_ts(timestamp)
+            except FileNotFoundError:
+                newer = False  # pruned old sequences are older than anything we have
+            except requests.HTTPError as e:
+                if getattr(e.response, "status_code", None) != 404:
+                    raise
+                newer = False  # pruned old sequences are older than anything we have
+            if newer:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def diff(self, sequence: int) -> bytes:
+        return gzip.decompress(self._read(self._path(sequence, ".osc.gz")))
+
+
+def _parse_ts(ts: str) -> datetime:
+    return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+# ── Change sets ───────────────────────────────────────────────────────────────
+
+
+class ChangeSet:
+    """Latest version of every node and way mentioned by a series of diffs."""
+
+    def __init__(self):
+        self.nodes: dict = {}  # id → (version, lat, lon) or (version, None, None) if deleted
+        self.ways: dict = {}   # id → (version, tags, node ids) or (version, None, None)
+
+    def add_osc(self, data: bytes):
+        """Fold one osmChange document into the set."""
+        action = None
+        for event, elem in ET.iterparse(io.BytesIO(data), events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag in ("create", "modify", "delete"):
+                    action = tag
+                continue
+            if tag == "node":
+                nid, version = int(elem.get("id")), int(elem.get("version", 0))
+                if version >= self.nodes.get(nid, (-1,))[0]:
+                    self.nodes[nid] = ((version, None, None) if action == "delete" else
+                                       (version, float(elem.get("lat")), float(elem.get("lon"))))
+                elem.clear()
+            elif tag == "way":
+                wid, version = int(elem.get("id")), int(elem.get("version", 0))
+                if version >= self.ways.get(wid, (-1,))[0]:
+                    if action == "delete":
+                        self.ways[wid] = (version, None, None)
+                    else:
+                        tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+                        refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                        self.ways[wid] = (version, tags, refs)
+                elem.clear()
+            elif tag == "relation":
+                elem.clear()
+
+
+# ── Element store ─────────────────────────────────────────────────────────────
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, version INTEGER, lat REAL, lon REAL);
+CREATE TABLE IF NOT EXISTS ways  (id INTEGER PRIMARY KEY, version INTEGER, highway TEXT,
+                                  name TEXT, nodes BLOB);
+CREATE TABLE IF NOT EXISTS meta  (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class ElementStore:
+    """SQLite copy of the area's named road ways and their nodes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def commit(self):
+        """Make applied changes permanent (call once the outputs are written)."""
+        self._db.commit()
+
+    def close(self):
+        """Close the database, discarding anything not committed."""
+        self._db.close()
+
+    # ── Metadata ──────────────────────────────────────────────────────────────
+
+    def get_meta(self, key: str) -> str | None:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                         (key, None if value is None else str(value)))
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM ways").fetchone()[0]
+
+    # ── Loading and saving ────────────────────────────────────────────────────
+
+    def replace(self, data: RoadData):
+        """Reset the store to the contents of a full fetch (versions unknown)."""
+        self._db.execute("DELETE FROM nodes")
+        self._db.execute("DELETE FROM ways")
+        self._db.execute("DELETE FROM meta")
+        self._db.executemany(
+            "INSERT INTO nodes VALUES (?, 0, ?, ?)",
+            zip(data.nodes.ids.tolist(), data.nodes.lats.tolist(), data.nodes.lons.tolist()))
+        self._db.executemany(
+            "INSERT INTO ways VALUES (?, ?, ?, ?, ?)",
+            ((w["id"], w.get("version", 0), w["tags"].get("highway"), w["tags"]["name"],
+              np.asarray(w.get("nodes", []), dtype=np.int64).tobytes()) for w in data.ways))
+        self.set_meta("osm_timestamp", data.osm_timestamp)
+
+    def road_data(self, spill_dir: Path | None = None) -> RoadData:
+        """The stored roads as RoadData, ways ordered by id like an Overpass response."""
+        ways = [
+            {"type": "way", "id": wid, "nodes": np.frombuffer(refs, dtype=np.int64).tolist(),
+             "tags": {"highway": highway, "name": name} if highway is not None
+             else {"name": name}}
+            for wid, highway, name, refs in self._db.execute(
+                "SELECT id, highway, name, nodes FROM ways ORDER BY id")
+        ]
+        rows = self._db.execute("SELECT id, lat, lon FROM nodes ORDER BY id").fetchall()
+        arr = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        nodes = NodeStore(ids, arr[:, 1], arr[:, 2], spill_dir=spill_dir)
+        return RoadData(nodes, ways, self.get_meta("osm_timestamp") or "unknown",
+                        len(ways) + len(nodes))
+
+    def _way_refs(self, wid: int) -> tuple:
+        row = self._db.execute("SELECT version, name, nodes FROM ways WHERE id = ?",
+                               (wid,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], np.frombuffer(row[2], dtype=np.int64).tolist()
+
+    def _names_at(self, node_ids: set) -> set:
+        """Names of stored ways passing through any of ``node_ids``."""
+        if not node_ids:
+            return set()
+        wanted = np.array(sorted(node_ids), dtype=np.int64)
+        names = set()
+        for name, refs in self._db.execute("SELECT name, nodes FROM ways"):
+            refs = np.frombuffer(refs, dtype=np.int64)
+            idx = np.minimum(np.searchsorted(wanted, refs), len(wanted) - 1)
+            if (wanted[idx] == refs).any():
+                names.add(name)
+        return names
+
+    # ── Applying changes ──────────────────────────────────────────────────────
+
+    def missing_nodes(self, changes: ChangeSet, is_road) -> list:
+        """Nodes that changed road ways need but neither the store nor the diffs hold."""
+        missing = set()
+        for wid, (_version, tags, refs) in changes.ways.items():
+            if tags is None or not is_road(tags):
+                continue
+            for nid in refs:
+                if nid in changes.nodes or nid in missing:
+                    continue
+                if self._db.execute("SELECT 1 FROM nodes WHERE id = ?", (nid,)).fetchone() is None:
+                    missing.add(nid)
+        return sorted(missing)
+
+    def apply_changes(self, changes: ChangeSet, is_road, inside,
+                      extra_nodes: dict | None = None) -> set:
+        """
+        Apply a change set.  ``is_road(tags)`` decides whether a way belongs in
+        the store and ``inside(coords)`` whether its (lon, lat) coordinates
+        touch the area.  ``extra_nodes`` supplies {id: (lat, lon)} for nodes
+        fetched separately.  Returns the road names whose output may change.
+        Nothing is committed until commit() is called.
+        """
+        extra_nodes = extra_nodes or {}
+        affected, touched = set(), set()
+        # Moved and deleted nodes we hold
+        for nid, (version, lat, lon) in changes.nodes.items():
+            row = self._db.execute("SELECT version FROM nodes WHERE id = ?", (nid,)).fetchone()
+            if row is None or version < row[0]:
+                continue
+            touched.add(nid)
+            if lat is None:
+                self._db.execute("DELETE FROM nodes WHERE id = ?", (nid,))
+            else:
+                self._db.execute("UPDATE nodes SET version = ?, lat = ?, lon = ? WHERE id = ?",
+                                 (version, lat, lon, nid))
+
+        for wid, (version, tags, refs) in sorted(changes.ways.items()):
+            old = self._way_refs(wid)
+            if old is not None and version < old[0]:
+                continue
+            keep = tags is not None and is_road(tags)
+            if keep:
+                coords = [self._coord(nid, changes, extra_nodes) for nid in refs]
+                keep = inside([c[::-1] for c in coords if c is not None])
+            if old is not None:
+                affected.add(old[1])
+                touched.update(old[2])
+                self._db.execute("DELETE FROM ways WHERE id = ?", (wid,))
+            if not keep:
+                continue
+            affected.add(tags["name"])
+            touched.update(refs)
+            self._db.execute("INSERT INTO ways VALUES (?, ?, ?, ?, ?)",
+                             (wid, version, tags.get("highway"), tags["name"],
+                              np.asarray(refs, dtype=np.int64).tobytes()))
+            for nid in refs:
+                coord = self._coord(nid, changes, extra_nodes, stored=False)
+                if coord is not None:
+                    version_n = changes.nodes.get(nid, (0,))[0]
+                    self._db.execute("INSERT OR IGNORE INTO nodes VALUES (?, ?, ?, ?)",
+                                     (nid, version_n, *coord))
+
+        affected |= self._names_at(touched)
+        self._prune_nodes()
+        return affected
+
+    def _coord(self, nid: int, changes: ChangeSet, extra_nodes: dict,
+               stored: bool = True) -> tuple | None:
+        change = changes.nodes.get(nid)
+        if change is not None:
+            return None if change[1] is None else (change[1], change[2])
+        if nid in extra_nodes:
+            return extra_nodes[nid]
+        if stored:
+            row = self._db.execute("SELECT lat, lon FROM nodes WHERE id = ?", (nid,)).fetchone()
+            return tuple(row) if row else None
+        return None
+
+    def _prune_nodes(self):
+        """Drop nodes no longer referenced by any stored way."""
+        used = set()
+        for (refs,) in self._db.execute("SELECT nodes FROM ways"):
+            used.update(np.frombuffer(refs, dtype=np.int64).tolist())
+        stale = [nid for (nid,) in self._db.execute("SELECT id FROM nodes") if nid not in used]
+        self._db.executemany("DELETE FROM nodes WHERE id = ?", ((nid,) for nid in stale))
+
+
+def area_filter(boundary):
+    """inside(coords) predicate for apply_changes(): any part of the way in ``boundary``."""
+    shapely.prepare(boundary)
+
+    def inside(coords: list) -> bool:
+        if not coords:
+            return False
+        geom = shapely.LineString(coords) if len(coords) >= 2 else shapely.Point(coords[0])
+        return bool(shapely.intersects(boundary, geom))
+
+    return inside
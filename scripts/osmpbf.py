@@ -0,0 +1,386 @@
+"""
+osmpbf.py — Read named roads straight from an OpenStreetMap .osm.pbf extract.
+
+The PBF format is a sequence of blobs, each a zlib-compressed protobuf
+"PrimitiveBlock" holding a few thousand nodes, ways or relations.  Blobs are
+independent, so they are decoded in parallel across worker processes, and
+only the blocks a pass needs are ever decompressed.  Packed integer arrays
+(dense node ids/coordinates, way node refs) are decoded with NumPy.
+
+extract_roads() makes three passes over the file:
+    1. ways matching the road filter, plus the area's boundary relation
+    2. the boundary relation's member ways (skipped if not needed)
+    3. coordinates of every node those ways reference
+and returns the same RoadData the Overpass path produces, clipped to the
+boundary the way Overpass's ``area`` filter would.  extract_areas() does the
+same for several areas of one extract (e.g. neighbouring counties) with a
+single set of passes.
+
+Only what the pipeline needs is decoded: ``highway`` and ``name`` tags, node
+lists and coordinates.  Blobs must be raw or zlib-compressed (as written by
+Geofabrik, osmium and osmosis).
+"""
+
+import multiprocessing
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from nodestore import NodeStore
+from overpass_stream import RoadData
+from protowire import decode_varints, fields, read_packed, to_int64, unzigzag, unzigzag_array
+
+# ── Protobuf fields ───────────────────────────────────────────────────────────
+
+def _delta_sint64(buf) -> np.ndarray:
+    """Packed, delta-coded sint64 field (ids, refs, coordinates) as int64."""
+    return np.cumsum(unzigzag_array(decode_varints(buf)))
+
+
+# ── Blobs ─────────────────────────────────────────────────────────────────────
+
+def blob_index(path: Path) -> list:
+    """[(type, offset, size), ...] of every blob, read from the headers only."""
+    index = []
+    with path.open("rb") as f:
+        while header_len := f.read(4):
+            if len(header_len) < 4:
+                raise ValueError(f"{path.name}: truncated blob header")
+            header = f.read(int.from_bytes(header_len, "big"))
+            blob_type, size = "", 0
+            for field, value in fields(header):
+                if field == 1:
+                    blob_type = bytes(value).decode()
+                elif field == 3:
+                    size = value
+            index.append((blob_type, f.tell(), size))
+            f.seek(size, 1)
+    return index
+
+
+def read_blob(path: Path, offset: int, size: int) -> bytes:
+    """Decompressed payload of the blob at ``offset``."""
+    with path.open("rb") as f:
+        f.seek(offset)
+        blob = f.read(size)
+    for field, value in fields(blob):
+        if field == 1:
+            return bytes(value)
+        if field == 3:
+            return zlib.decompress(value)
+        if field in (4, 5, 6, 7):
+            raise ValueError(f"{path.name}: unsupported blob compression (field {field}); "
+                             "re-encode the extract with zlib")
+    return b""
+
+
+def header_timestamp(path: Path, index: list) -> str:
+    """Replication timestamp from the OSMHeader block, as Overpass formats it."""
+    for blob_type, offset, size in index:
+        if blob_type == "OSMHeader":
+            for field, value in fields(read_blob(path, offset, size)):
+                if field == 32:  # osmosis_replication_timestamp
+                    ts = datetime.fromtimestamp(value, tz=timezone.utc)
+                    return ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return "unknown"
+
+
+class _Block:
+    """A decoded PrimitiveBlock: string table, groups and coordinate scaling."""
+
+    def __init__(self, data: bytes):
+        self.strings: list = []
+        self.groups: list = []
+        self.granularity, self.lat_offset, self.lon_offset = 100, 0, 0
+        for field, value in fields(memoryview(data)):
+            if field == 1:
+                self.strings = [bytes(s) for f, s in fields(value) if f == 1]
+            elif field == 2:
+                self.groups.append(value)
+            elif field == 17:
+                self.granularity = value
+            elif field == 19:
+                self.lat_offset = to_int64(value)       # int64, not sint64
+            elif field == 20:
+                self.lon_offset = to_int64(value)
+
+    def string_id(self, s: bytes) -> int:
+        try:
+            return self.strings.index(s)
+        except ValueError:
+            return -1
+
+    def degrees(self, raw: np.ndarray, offset: int) -> np.ndarray:
+        # Integer nanodegrees divided once, so values round-trip exactly as
+        # the 7-decimal coordinates Overpass prints.
+        return (int(offset) + self.granularity * raw) / 1e9
+
+    def members(self, kind: int):
+        """Yield the raw messages of one kind (1 node, 2 dense, 3 way, 4 relation)."""
+        for group in self.groups:
+            for field, value in fields(group):
+                if field == kind:
+                    yield value
+
+
+def _block_kinds(block: _Block) -> set:
+    kinds = set()
+    for group in block.groups:
+        for field, _value in fields(group):
+            kinds.add({1: "nodes", 2: "nodes", 3: "ways", 4: "relations"}.get(field, "other"))
+            break
+    return kinds
+
+
+# ── Pass 1: road ways and the boundary relation ───────────────────────────────
+
+def _scan_roads(task: tuple) -> tuple:
+    """
+    (block kinds, [(way id, refs, highway, name)], {relation id: boundary
+    member way ids} for the requested relations found in the block).
+    """
+    path, offset, size, road_pattern, relation_ids = task
+    block = _Block(read_blob(path, offset, size))
+    kinds = _block_kinds(block)
+    roads, boundaries = [], {}
+
+    if "ways" in kinds:
+        k_highway, k_name = block.string_id(b"highway"), block.string_id(b"name")
+        if k_highway >= 0 and k_name >= 0:
+            road_re = re.compile(road_pattern)
+            matches = {}  # string id → does this highway value match the filter?
+            for msg in block.members(3):
+                way_id, keys, vals, refs = 0, b"", b"", b""
+                for field, value in fields(msg):
+                    if field == 1:
+                        way_id = value
+                    elif field == 2:
+                        keys = value
+                    elif field == 3:
+                        vals = value
+                    elif field == 8:
+                        refs = value
+                tags = dict(zip(read_packed(keys), read_packed(vals)))
+                hw, name = tags.get(k_highway), tags.get(k_name)
+                if hw is None or name is None:
+                    continue
+                if hw not in matches:
+                    matches[hw] = bool(road_re.search(block.strings[hw].decode()))
+                if matches[hw]:
+                    roads.append((way_id, _delta_sint64(refs),
+                                  block.strings[hw].decode(), block.strings[name].decode()))
+
+    if "relations" in kinds:
+        for msg in block.members(4):
+            props = dict(fields(msg))
+            if props.get(1) not in relation_ids:
+                continue
+            roles = read_packed(props.get(8, b""))
+            memids = _delta_sint64(props.get(9, b"")).tolist()
+            types = read_packed(props.get(10, b""))
+            boundaries[props[1]] = [
+                mid for mid, role, kind in zip(memids, roles, types)
+                if kind == 1 and block.strings[role] in (b"outer", b"")
+            ]
+    return kinds, roads, boundaries
+
+
+# ── Pass 2: boundary member ways ──────────────────────────────────────────────
+
+def _scan_ways(task: tuple) -> dict:
+    """{way id: refs} for the requested way ids found in one block."""
+    path, offset, size, wanted = task
+    block = _Block(read_blob(path, offset, size))
+    found = {}
+    for msg in block.members(3):
+        props = dict(fields(msg))
+        if props.get(1) in wanted:
+            found[props[1]] = _delta_sint64(props.get(8, b""))
+    return found
+
+
+# ── Pass 3: node coordinates ──────────────────────────────────────────────────
+
+_NEEDED: np.ndarray | None = None
+
+
+def _init_nodes(needed: np.ndarray):
+    global _NEEDED
+    _NEEDED = needed
+
+
+def _scan_nodes(task: tuple) -> tuple:
+    """(ids, lats, lons) of the needed nodes in one block."""
+    path, offset, size = task
+    block = _Block(read_blob(path, offset, size))
+    ids, lats, lons = [], [], []
+    for dense in block.members(2):
+        props = dict(fields(dense))
+        ids.append(_delta_sint64(props.get(1, b"")))
+        lats.append(block.degrees(_delta_sint64(props.get(8, b"")), block.lat_offset))
+        lons.append(block.degrees(_delta_sint64(props.get(9, b"")), block.lon_offset))
+    for msg in block.members(1):
+        props = dict(fields(msg))
+        ids.append(np.array([unzigzag(props.get(1, 0))], dtype=np.int64))
+        lats.append(block.degrees(np.array([unzigzag(props.get(8, 0))], dtype=np.int64),
+                                  block.lat_offset))
+        lons.append(block.degrees(np.array([unzigzag(props.get(9, 0))], dtype=np.int64),
+                                  block.lon_offset))
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    ids, lats, lons = np.concatenate(ids), np.concatenate(lats), np.concatenate(lons)
+    keep = _isin_sorted(ids, _NEEDED)
+    return ids[keep], lats[keep], lons[keep]
+
+
+def _isin_sorted(values: np.ndarray, sorted_ids: np.ndarray) -> np.ndarray:
+    if not len(sorted_ids):
+        return np.zeros(len(values), dtype=bool)
+    idx = np.minimum(np.searchsorted(sorted_ids, values), len(sorted_ids) - 1)
+    return sorted_ids[idx] == values
+
+
+# ── Driver ────────────────────────────────────────────────────────────────────
+
+def _map(fn, tasks: list, workers: int, initializer=None, initargs=()) -> list:
+    if workers > 1 and len(tasks) > 1:
+        # Not forked: build_pipeline.py starts this from a scheduler thread,
+        # and forking a process that has other threads running can deadlock
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                 initargs=initargs,
+                                 mp_context=multiprocessing.get_context("forkserver")) as pool:
+            return list(pool.map(fn, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+    if initializer is not None:
+        initializer(*initargs)
+    return [fn(task) for task in tasks]
+
+
+def boundary_polygons(rings: list) -> list:
+    """Polygons assembled from the boundary's outer member ways (lon/lat lines)."""
+    lines = [shapely.LineString(r) for r in rings if len(r) >= 2]
+    if not lines:
+        return []
+    merged = shapely.line_merge(shapely.multilinestrings(lines))
+    return list(shapely.get_parts(shapely.polygonize(shapely.get_parts(merged))))
+
+
+def extract_roads(path: Path, road_types: list, relation_id: int, workers: int = 1,
+                  boundary=None, spill_dir: Path | None = None,
+                  log=print) -> tuple:
+    """
+    Named roads of the given highway types inside the boundary relation.
+
+    ``road_types`` is matched like the Overpass ``"highway"~"a|b"`` filter.
+    If the relation is not in the extract, ``boundary`` (a shapely geometry)
+    is used for clipping instead.  Returns (RoadData, boundary polygons),
+    where the polygons are empty if the relation was not found.
+    """
+    return extract_areas(path, [(road_types, relation_id, boundary)], workers=workers,
+                         spill_dir=spill_dir, log=log)[0]
+
+
+def extract_areas(path: Path, areas: list, workers: int = 1,
+                  spill_dir: Path | None = None, log=print) -> list:
+    """
+    extract_roads() for several areas of the same extract, reading the file
+    once.  ``areas`` is a list of (road_types, relation_id, fallback boundary
+    or None); returns a (RoadData, boundary polygons) pair for each, in order.
+    """
+    index = blob_index(path)
+    data_blobs = [(offset, size) for kind, offset, size in index if kind == "OSMData"]
+    osm_ts = header_timestamp(path, index)
+    log(f"Reading {path.name}: {len(data_blobs)} blocks, {workers} worker(s)...")
+
+    # One scan with the union of the areas' road filters; each area applies
+    # its own filter to the highway values afterwards.
+    patterns = ["|".join(road_types) for road_types, _rel, _b in areas]
+    relation_ids = frozenset(rel for _types, rel, _b in areas)
+    scanned = _map(_scan_roads, [(path, o, s, "|".join(f"(?:{p})" for p in patterns),
+                                  relation_ids) for o, s in data_blobs], workers)
+    roads, members = [], {}
+    way_blobs, node_blobs = [], []
+    for (offset, size), (kinds, block_roads, block_members) in zip(data_blobs, scanned):
+        roads.extend(block_roads)
+        members.update(block_members)
+        if "ways" in kinds:
+            way_blobs.append((offset, size))
+        if "nodes" in kinds:
+            node_blobs.append((offset, size))
+    roads.sort(key=lambda r: r[0])
+    log(f"Found {len(roads)} named road ways")
+
+    for _types, relation_id, boundary in areas:
+        if not members.get(relation_id) and boundary is None:
+            raise ValueError(f"Relation {relation_id} is not in {path.name} and no "
+                             f"boundary was supplied")
+    found = {}
+    wanted = {m for member_ids in members.values() for m in member_ids}
+    if wanted:
+        for block_found in _map(_scan_ways, [(path, o, s, wanted) for o, s in way_blobs],
+                                workers):
+            found.update(block_found)
+    rings_refs = {}
+    for relation_id, member_ids in members.items():
+        rings_refs[relation_id] = [found[m] for m in member_ids if m in found]
+        if len(rings_refs[relation_id]) < len(member_ids):
+            log(f"WARNING: {len(member_ids) - len(rings_refs[relation_id])} boundary way(s) "
+                f"of relation {relation_id} missing from the extract")
+
+    road_refs = [r[1] for r in roads]
+    ring_list = [refs for refs_list in rings_refs.values() for refs in refs_list]
+    needed = np.unique(np.concatenate(road_refs + ring_list + [np.zeros(0, dtype=np.int64)]))
+    parts = _map(_scan_nodes, [(path, o, s) for o, s in node_blobs], workers,
+                 initializer=_init_nodes, initargs=(needed,))
+    nodes = NodeStore(np.concatenate([p[0] for p in parts] or [np.zeros(0, dtype=np.int64)]),
+                      np.concatenate([p[1] for p in parts] or [np.zeros(0)]),
+                      np.concatenate([p[2] for p in parts] or [np.zeros(0)]))
+
+    geoms = []
+    for refs in road_refs:
+        lats, lons = nodes.coords(refs)
+        geoms.append(shapely.linestrings(np.column_stack([lons, lats])) if len(lats) >= 2
+                     else shapely.points(np.column_stack([lons, lats])) if len(lats) == 1
+                     else None)
+    geoms = np.array(geoms, dtype=object)
+    has_geom = np.array([g is not None for g in geoms], dtype=bool)
+
+    results = []
+    for pattern, (_types, relation_id, boundary) in zip(patterns, areas):
+        polygons = []
+        if rings_refs.get(relation_id):
+            rings = []
+            for refs in rings_refs[relation_id]:
+                lats, lons = nodes.coords(refs)
+                rings.append(np.column_stack([lons, lats]))
+            polygons = boundary_polygons(rings)
+            if polygons:
+                boundary = shapely.union_all(polygons)
+            elif boundary is None:
+                raise ValueError(f"Could not assemble the boundary of relation {relation_id}")
+
+        # Keep ways with any part inside the boundary, as Overpass's area filter does
+        road_re = re.compile(pattern)
+        shapely.prepare(boundary)
+        inside = np.asarray(shapely.intersects(boundary, geoms), dtype=bool) & has_geom
+        inside &= np.array([bool(road_re.search(r[2])) for r in roads], dtype=bool)
+
+        ways = [
+            {"type": "way", "id": way_id, "nodes": refs.tolist(),
+             "tags": {"highway": highway, "name": name}}
+            for (way_id, refs, highway, name), keep in zip(roads, inside.tolist()) if keep
+        ]
+        kept_refs = np.unique(np.concatenate([r for r, k in zip(road_refs, inside) if k]
+                                             + [np.zeros(0, dtype=np.int64)]))
+        keep_nodes = _isin_sorted(nodes.ids, kept_refs)
+        road_nodes = NodeStore(nodes.ids[keep_nodes], nodes.lats[keep_nodes],
+                               nodes.lons[keep_nodes], spill_dir=spill_dir)
+        log(f"Clipped to boundary{f' of relation {relation_id}' if len(areas) > 1 else ''}: "
+            f"{len(ways)} ways, {len(road_nodes)} nodes")
+        results.append((RoadData(road_nodes, ways, osm_ts, len(ways) + len(road_nodes)),
+                        polygons))
+    return results
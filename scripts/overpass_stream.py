@@ -0,0 +1,270 @@
+"""
+overpass_stream.py — Incremental parsing of Overpass API JSON responses.
+
+An Overpass response is one JSON object whose bulk is the ``elements`` array:
+
+    {"version": 0.6, "generator": ..., "osm3s": {...}, "elements": [ {...}, ... ]}
+
+OverpassStreamParser consumes the body chunk by chunk and yields each element
+as soon as it is complete, so neither the raw text nor the full parsed
+document is ever held in memory.  RoadDataBuilder collects the yielded nodes
+straight into flat arrays (later a NodeStore) and keeps only the named ways
+the pipeline uses.
+
+The same code path reads a live HTTP response (optionally teeing the bytes to
+the roads.json cache on a background thread) and the cache file itself.
+Results of several tile queries are combined with merge_road_data() and can
+be saved back in Overpass format with write_cache().
+"""
+
+import codecs
+import json
+import queue
+import re
+import threading
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from nodestore import NodeStore
+
+_ELEMENTS_KEY = re.compile(r'"elements"\s*:\s*\[')
+_SEPARATORS = re.compile(r"[\s,]*")
+_DECODER = json.JSONDecoder()
+
+# Bytes read per chunk from HTTP responses and cache files
+CHUNK_SIZE = 1 << 20
+
+
+class OverpassStreamParser:
+    """Push parser: feed() text chunks, iterate the completed elements."""
+
+    def __init__(self):
+        self._buf = ""
+        self._state = "header"
+        self._tail = ""
+        self.header: dict = {}
+        self.trailer: dict = {}
+
+    def feed(self, text: str):
+        """Add a chunk of response text; yields every element it completes."""
+        self._buf += text
+        if self._state == "header":
+            m = _ELEMENTS_KEY.search(self._buf)
+            if not m:
+                return
+            prefix = self._buf[:m.start()].rstrip().rstrip(",")
+            self.header = json.loads(prefix + "}") if prefix.lstrip().startswith("{") else {}
+            self._buf = self._buf[m.end():]
+            self._state = "elements"
+
+        if self._state == "elements":
+            buf, pos = self._buf, 0
+            while True:
+                pos = _SEPARATORS.match(buf, pos).end()
+                if pos >= len(buf):
+                    break
+                if buf[pos] == "]":
+                    self._state = "tail"
+                    self._tail = buf[pos + 1:]
+                    pos = len(buf)
+                    break
+                try:
+                    element, end = _DECODER.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    break  # incomplete element — wait for more text
+                yield element
+                pos = end
+            self._buf = buf[pos:]
+
+        elif self._state == "tail":
+            self._tail += self._buf
+            self._buf = ""
+
+    def close(self):
+        """Finish parsing; raises ValueError if the document was incomplete."""
+        if self._state == "header":
+            raise ValueError("Response missing 'elements' key")
+        if self._state == "elements":
+            raise ValueError("Response ended inside the 'elements' array")
+        tail = self._tail.strip().lstrip(",").strip()
+        if tail and tail != "}":
+            try:
+                self.trailer = json.loads("{" + tail)
+            except json.JSONDecodeError:
+                self.trailer = {}
+
+
+class RoadData:
+    """Parsed road data ready for process(): node coordinates plus named ways."""
+
+    def __init__(self, nodes: NodeStore, ways: list, osm_timestamp: str,
+                 element_count: int = 0, remark: str | None = None):
+        self.nodes = nodes
+        self.ways = ways
+        self.osm_timestamp = osm_timestamp
+        self.element_count = element_count
+        self.remark = remark
+
+
+class RoadDataBuilder:
+    """Collects streamed elements into compact structures."""
+
+    def __init__(self):
+        self._ids = array("q")
+        self._lats = array("d")
+        self._lons = array("d")
+        self.ways: list = []
+        self.count = 0
+
+    def add(self, element: dict):
+        self.count += 1
+        kind = element.get("type")
+        if kind == "node":
+            self._ids.append(element["id"])
+            self._lats.append(element["lat"])
+            self._lons.append(element["lon"])
+        elif kind == "way" and "name" in element.get("tags", {}):
+            self.ways.append(element)
+
+    def build(self, header: dict, trailer: dict | None = None,
+              spill_dir: Path | None = None) -> RoadData:
+        nodes = NodeStore(self._ids, self._lats, self._lons, spill_dir=spill_dir)
+        self._ids, self._lats, self._lons = array("q"), array("d"), array("d")
+        osm_ts = header.get("osm3s", {}).get("timestamp_osm_base", "unknown")
+        return RoadData(nodes, self.ways, osm_ts, self.count,
+                        (trailer or {}).get("remark"))
+
+
+class _TeeWriter:
+    """Writes chunks to a file on a background thread, in order."""
+
+    def __init__(self, path: Path):
+        self._f = path.open("wb")
+        self._q: queue.Queue = queue.Queue(maxsize=64)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self._q.get()
+            if chunk is None:
+                break
+            if self._error is None:
+                try:
+                    self._f.write(chunk)
+                except BaseException as exc:  # surfaced by close()
+                    self._error = exc
+
+    def write(self, chunk: bytes):
+        self._q.put(chunk)
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+        self._f.close()
+        if self._error is not None:
+            raise self._error
+
+
+def ingest(chunks, tee_path: Path | None = None, spill_dir: Path | None = None) -> RoadData:
+    """
+    Parse an iterable of response byte chunks into RoadData.
+
+    With ``tee_path``, the raw bytes are also written to that file while
+    parsing proceeds.  The file is removed again if parsing fails.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = OverpassStreamParser()
+    builder = RoadDataBuilder()
+    tee = _TeeWriter(tee_path) if tee_path is not None else None
+    try:
+        for chunk in chunks:
+            if tee is not None:
+                tee.write(chunk)
+            for element in parser.feed(decoder.decode(chunk)):
+                builder.add(element)
+        for element in parser.feed(decoder.decode(b"", final=True)):
+            builder.add(element)
+        parser.close()
+    except BaseException:
+        if tee is not None:
+            try:
+                tee.close()
+            finally:
+                tee_path.unlink(missing_ok=True)
+        raise
+    if tee is not None:
+        tee.close()
+    return builder.build(parser.header, parser.trailer, spill_dir=spill_dir)
+
+
+def read_chunks(path: Path, chunk_size: int = CHUNK_SIZE):
+    with path.open("rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def load_file(path: Path, spill_dir: Path | None = None) -> RoadData:
+    """Parse a saved Overpass response (e.g. the roads.json cache)."""
+    return ingest(read_chunks(path), spill_dir=spill_dir)
+
+
+def from_json(data: dict, spill_dir: Path | None = None) -> RoadData:
+    """Build RoadData from an already-parsed Overpass response dict."""
+    builder = RoadDataBuilder()
+    for element in data.get("elements", []):
+        builder.add(element)
+    return builder.build(data, spill_dir=spill_dir)
+
+
+def merge_road_data(parts: list, spill_dir: Path | None = None) -> RoadData:
+    """
+    Combine the RoadData of several overlapping queries (e.g. bbox tiles).
+
+    Ways and nodes returned by more than one query are kept once.  Ways are
+    ordered by id, as Overpass orders them in a single response, so the
+    merged data processes exactly like one query over the whole area.
+    """
+    ways = {}
+    for part in parts:
+        for way in part.ways:
+            ways.setdefault(way["id"], way)
+    ids = np.concatenate([p.nodes.ids for p in parts] or [np.zeros(0, dtype=np.int64)])
+    lats = np.concatenate([p.nodes.lats for p in parts] or [np.zeros(0)])
+    lons = np.concatenate([p.nodes.lons for p in parts] or [np.zeros(0)])
+    nodes = NodeStore(ids, lats, lons, spill_dir=spill_dir)
+    for part in parts:
+        part.nodes.close()
+
+    # The oldest database snapshot among the parts bounds the data's age
+    stamps = sorted(p.osm_timestamp for p in parts if p.osm_timestamp != "unknown")
+    remarks = list(dict.fromkeys(p.remark for p in parts if p.remark))
+    return RoadData(nodes, [ways[i] for i in sorted(ways)],
+                    stamps[0] if stamps else "unknown",
+                    len(nodes) + len(ways), "; ".join(remarks) or None)
+
+
+def write_cache(data: RoadData, path: Path, generator: str = "StormPath"):
+    """
+    Save RoadData as an Overpass-style JSON document readable by load_file().
+    Written element by element to a temporary file that replaces ``path``.
+    """
+    partial = path.with_name(path.name + ".part")
+    header = {"version": 0.6, "generator": generator,
+              "osm3s": {"timestamp_osm_base": data.osm_timestamp}}
+    with partial.open("w") as f:
+        f.write(json.dumps(header)[:-1] + ',\n"elements": [\n')
+        first = True
+        for way in data.ways:
+            f.write(("" if first else ",\n") + json.dumps(way))
+            first = False
+        nodes = data.nodes
+        for nid, lat, lon in zip(nodes.ids.tolist(), nodes.lats.tolist(), nodes.lons.tolist()):
+            f.write(("" if first else ",\n")
+                    + json.dumps({"type": "node", "id": nid, "lat": lat, "lon": lon}))
+            first = False
+        f.write("\n]\n}\n")
+    partial.replace(path)
@@ -0,0 +1,359 @@
+"""
+pmtiles.py — Read and write PMTiles v3 archives in pure Python.
+
+A PMTiles archive is one file the browser reads with HTTP range requests:
+
+    header            127 bytes, fixed layout
+    root directory    (tile id → offset/length), within the first 16 KiB
+    metadata          JSON
+    leaf directories  only when the root would not fit
+    tile data
+
+Tiles are addressed by a single id along a Hilbert curve per zoom level
+(zxy_to_tileid()).  Identical tile payloads are stored once; consecutive
+tile ids with the same payload collapse into one directory entry with a run
+length.  Directories and metadata are gzip-compressed.
+
+Writer spools tile data to a temporary file, so archives larger than memory
+can be rewritten tile by tile; Reader only reads the header, the directories
+it walks and the tiles asked for.
+
+Spec: https://github.com/protomaps/PMTiles/blob/main/spec/v3/spec.md
+"""
+
+import gzip
+import hashlib
+import json
+import struct
+import tempfile
+from pathlib import Path
+
+from protowire import encode_varint, read_varint
+
+HEADER_SIZE = 127
+_ROOT_LIMIT = 16384 - HEADER_SIZE
+_LEAF_CACHE = 64                  # decoded leaf directories kept by Reader
+_HEADER = struct.Struct("<7sB11QBBBBBBiiiiBii")
+
+# Compression and tile type codes from the spec
+COMPRESSION_NONE, COMPRESSION_GZIP = 1, 2
+TILE_TYPE_MVT = 1
+
+
+# ── Tile ids ──────────────────────────────────────────────────────────────────
+
+def zxy_to_tileid(z: int, x: int, y: int) -> int:
+    """Hilbert-curve tile id, counting every tile of lower zooms first."""
+    if z > 31:
+        raise OverflowError("tile zoom exceeds 31")
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"tile {z}/{x}/{y} is outside the zoom level")
+    tile_id = ((1 << (2 * z)) - 1) // 3
+    s = n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x, y = s - 1 - (x & (s - 1)), s - 1 - (y & (s - 1))
+            x, y = y, x
+        x, y = x & (s - 1), y & (s - 1)
+        s >>= 1
+    return tile_id
+
+
+def tileid_to_zxy(tile_id: int) -> tuple:
+    z, acc = 0, 0
+    while acc + (1 << (2 * z)) <= tile_id:
+        acc += 1 << (2 * z)
+        z += 1
+    d, x, y, s = tile_id - acc, 0, 0, 1
+    while s < (1 << z):
+        rx = 1 & (d // 2)
+        ry = 1 & (d ^ rx)
+        if ry == 0:
+            if rx == 1:
+                x, y = s - 1 - x, s - 1 - y
+            x, y = y, x
+        x += s * rx
+        y += s * ry
+        d //= 4
+        s <<= 1
+    return z, x, y
+
+
+# ── Directories ───────────────────────────────────────────────────────────────
+
+def _serialize_directory(entries: list) -> bytes:
+    """entries: [(tile_id, offset, length, run_length), ...] sorted by tile id."""
+    out = bytearray(encode_varint(len(entries)))
+    last = 0
+    for tile_id, _off, _len, _run in entries:
+        out += encode_varint(tile_id - last)
+        last = tile_id
+    for entry in entries:
+        out += encode_varint(entry[3])
+    for entry in entries:
+        out += encode_varint(entry[2])
+    for i, (_tid, offset, length, _run) in enumerate(entries):
+        prev = entries[i - 1] if i else None
+        if prev is not None and offset == prev[1] + prev[2]:
+            out += encode_varint(0)
+        else:
+            out += encode_varint(offset + 1)
+    return gzip.compress(bytes(out), mtime=0)
+
+
+def _deserialize_directory(data: bytes) -> list:
+    buf = gzip.decompress(data)
+    n, pos = read_varint(buf, 0)
+    tile_ids, last = [], 0
+    for _ in range(n):
+        delta, pos = read_varint(buf, pos)
+        last += delta
+        tile_ids.append(last)
+    runs, lengths = [], []
+    for column in (runs, lengths):
+        for _ in range(n):
+            value, pos = read_varint(buf, pos)
+            column.append(value)
+    entries = []
+    for i in range(n):
+        value, pos = read_varint(buf, pos)
+        if value == 0 and i:
+            offset = entries[-1][1] + entries[-1][2]
+        else:
+            offset = value - 1
+        entries.append((tile_ids[i], offset, lengths[i], runs[i]))
+    return entries
+
+
+def _build_directories(entries: list) -> tuple:
+    """(root bytes, leaf bytes), splitting into leaves when the root is too big."""
+    root = _serialize_directory(entries)
+    if len(root) <= _ROOT_LIMIT:
+        return root, b""
+    leaf_size = 4096
+    while True:
+        root_entries, leaves = [], bytearray()
+        for start in range(0, len(entries), leaf_size):
+            chunk = entries[start:start + leaf_size]
+            leaf = _serialize_directory(chunk)
+            root_entries.append((chunk[0][0], len(leaves), len(leaf), 0))
+            leaves += leaf
+        root = _serialize_directory(root_entries)
+        if len(root) <= _ROOT_LIMIT:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+# ── Writing ───────────────────────────────────────────────────────────────────
+
+class Writer:
+    """
+    Collects tiles and writes the archive on finish().  Tiles may be added
+    in any order; payloads must already be compressed as declared by
+    ``tile_compression``.
+    """
+
+    def __init__(self, path: Path, tile_compression: int = COMPRESSION_GZIP,
+                 tile_type: int = TILE_TYPE_MVT):
+        self.path = path
+        self.tile_compression = tile_compression
+        self.tile_type = tile_type
+        self._data = tempfile.TemporaryFile(dir=path.parent)
+        self._size = 0
+        self._by_hash: dict = {}
+        self._tiles: dict = {}
+
+    def add(self, tile_id: int, data: bytes):
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        offset = self._by_hash.get(digest)
+        if offset is None:
+            offset = self._size
+            self._by_hash[digest] = offset
+            self._data.write(data)
+            self._size += len(data)
+        self._tiles[tile_id] = (offset, len(data))
+
+    def add_tile(self, z: int, x: int, y: int, data: bytes):
+        self.add(zxy_to_tileid(z, x, y), data)
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    def finish(self, metadata: dict, bounds: tuple, center_zoom: int | None = None):
+        """
+        Write the archive.  ``bounds`` is (min_lon, min_lat, max_lon, max_lat);
+        the min/max zoom are taken from the tiles added.
+        """
+        # Lay tile data out in tile-id order so the archive is clustered;
+        # duplicates keep pointing at their first copy.
+        order = sorted(self._tiles)
+        layout, entries, size = {}, [], 0
+        for tile_id in order:
+            src = self._tiles[tile_id]
+            if src not in layout:
+                layout[src] = size
+                size += src[1]
+            offset, length = layout[src], src[1]
+            last = entries[-1] if entries else None
+            if (last is not None and last[1] == offset and last[2] == length
+                    and last[0] + last[3] == tile_id):
+                entries[-1] = (last[0], offset, length, last[3] + 1)
+            else:
+                entries.append((tile_id, offset, length, 1))
+
+        root, leaves = _build_directories(entries)
+        meta = gzip.compress(json.dumps(metadata).encode(), mtime=0)
+        zooms = [tileid_to_zxy(t)[0] for t in (order[0], order[-1])] if order else [0, 0]
+        min_lon, min_lat, max_lon, max_lat = bounds
+        if center_zoom is None:
+            center_zoom = zooms[0]
+
+        root_off = HEADER_SIZE
+        meta_off = root_off + len(root)
+        leaf_off = meta_off + len(meta)
+        data_off = leaf_off + len(leaves)
+        header = _HEADER.pack(
+            b"PMTiles", 3,
+            root_off, len(root), meta_off, len(meta), leaf_off, len(leaves),
+            data_off, size,
+            sum(e[3] for e in entries), len(entries), len(layout),
+            1, COMPRESSION_GZIP, self.tile_compression, self.tile_type,
+            zooms[0], zooms[1],
+            round(min_lon * 1e7), round(min_lat * 1e7),
+            round(max_lon * 1e7), round(max_lat * 1e7),
+            center_zoom,
+            round((min_lon + max_lon) / 2 * 1e7), round((min_lat + max_lat) / 2 * 1e7),
+        )
+
+        partial = self.path.with_name(self.path.name + ".part")
+        with partial.open("wb") as out:
+            out.write(header + root + meta + leaves)
+            for (src_offset, length), _dst in sorted(layout.items(), key=lambda kv: kv[1]):
+                self._data.seek(src_offset)
+                out.write(self._data.read(length))
+        self._data.close()
+        partial.replace(self.path)
+
+    def abort(self):
+        self._data.close()
+
+
+# ── Reading ───────────────────────────────────────────────────────────────────
+
+class Reader:
+    """Random access to the tiles of an archive on disk."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = path.open("rb")
+        fields = _HEADER.unpack(self._f.read(HEADER_SIZE))
+        if fields[0] != b"PMTiles" or fields[1] != 3:
+            self._f.close()
+            raise ValueError(f"{path.name}: not a PMTiles v3 archive")
+        names = ("root_offset", "root_length", "metadata_offset", "metadata_length",
+                 "leaf_offset", "leaf_length", "data_offset", "data_length",
+                 "addressed_tiles", "tile_entries", "tile_contents",
+                 "clustered", "internal_compression", "tile_compression", "tile_type",
+                 "min_zoom", "max_zoom", "min_lon_e7", "min_lat_e7", "max_lon_e7",
+                 "max_lat_e7", "center_zoom", "center_lon_e7", "center_lat_e7")
+        self.header = dict(zip(names, fields[2:]))
+        if self.header["internal_compression"] != COMPRESSION_GZIP:
+            self._f.close()
+            raise ValueError(f"{path.name}: only gzip-compressed directories are supported")
+        self._root = _deserialize_directory(
+            self._read(self.header["root_offset"], self.header["root_length"]))
+        self._leaves: dict = {}           # leaf offset → entries, for find() in id order
+
+    def _read(self, offset: int, length: int) -> bytes:
+        self._f.seek(offset)
+        return self._f.read(length)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def metadata(self) -> dict:
+        raw = self._read(self.header["metadata_offset"], self.header["metadata_length"])
+        return json.loads(gzip.decompress(raw)) if raw else {}
+
+    def _leaf(self, entry: tuple) -> list:
+        leaf = self._leaves.get(entry[1])
+        if leaf is None:
+            if len(self._leaves) >= _LEAF_CACHE:
+                self._leaves.clear()
+            leaf = self._leaves[entry[1]] = _deserialize_directory(
+                self._read(self.header["leaf_offset"] + entry[1], entry[2]))
+        return leaf
+
+    def entries(self):
+        """Yield every (tile_id, offset, length, run_length) tile entry in order."""
+        for entry in self._root:
+            if entry[3]:
+                yield entry
+            else:
+                yield from (e for e in self._leaf(entry))
+
+    def tile_data(self, offset: int, length: int) -> bytes:
+        """Raw (still compressed) payload at a data-section offset."""
+        return self._read(self.header["data_offset"] + offset, length)
+
+    def find(self, tile_id: int) -> tuple | None:
+        """The (tile_id, offset, length, run_length) entry addressing ``tile_id``, or None."""
+        directory = self._root
+        for _depth in range(4):
+            entry = _find(directory, tile_id)
+            if entry is None:
+                return None
+            if entry[3]:
+                return entry
+            directory = self._leaf(entry)
+        return None
+
+    def get(self, z: int, x: int, y: int) -> bytes | None:
+        """Raw payload of a tile, or None if the archive does not have it."""
+        entry = self.find(zxy_to_tileid(z, x, y))
+        return self.tile_data(entry[1], entry[2]) if entry is not None else None
+
+    def tiles(self):
+        """Yield ((z, x, y), raw payload) for every addressed tile, in id order."""
+        for tile_id, offset, length, run in self.entries():
+            data = self.tile_data(offset, length)
+            for i in range(run):
+                yield tileid_to_zxy(tile_id + i), data
+
+
+def _find(entries: list, tile_id: int) -> tuple | None:
+    """Entry covering ``tile_id``: an exact or run-length match, or a leaf."""
+    lo, hi = 0, len(entries) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if entries[mid][0] < tile_id:
+            lo = mid + 1
+        elif entries[mid][0] > tile_id:
+            hi = mid - 1
+        else:
+            return entries[mid]
+    if hi >= 0:
+        entry = entries[hi]
+        if entry[3] == 0 or tile_id - entry[0] < entry[3]:
+            return entry
+    return None
+
+
+def decompress(data: bytes, compression: int) -> bytes:
+    """Undo a tile's ``tile_compression``."""
+    if compression == COMPRESSION_GZIP:
+        return gzip.decompress(data)
+    if compression == COMPRESSION_NONE:
+        return data
+    raise ValueError(f"unsupported tile compression {compression}")
@@ -0,0 +1,140 @@
+"""
+protowire.py — Protocol Buffers wire format, shared by the PBF reader
+(osmpbf.py), the vector tile codec (mvt.py) and PMTiles directories
+(pmtiles.py, whose varints are the same unsigned LEB128 encoding).
+
+    encode_varint(300)                 b"\\xac\\x02"
+    read_varint(buf, pos)              (value, position after it)
+    fields(buf)                        (field number, value) per field
+    decode_varints(buf)                packed varint array → NumPy uint64
+
+Scalar helpers work on Python ints, the array helpers on NumPy arrays for
+the long packed fields (node ids, coordinates, tile geometry).  fields()
+yields length-delimited values as slices of ``buf``, so passing a
+memoryview decodes nested messages without copying.
+"""
+
+import numpy as np
+
+VARINT, FIXED64, BYTES, FIXED32 = 0, 1, 2, 5
+
+
+# ── Scalars ───────────────────────────────────────────────────────────────────
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def read_varint(buf, pos: int) -> tuple:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def zigzag(value: int) -> int:
+    """sint64 → the unsigned value that is written as a varint."""
+    return (value << 1) ^ (value >> 63)
+
+
+def unzigzag(value: int) -> int:
+    """Decoded varint of a sint32/sint64 field → signed value."""
+    return (value >> 1) ^ -(value & 1)
+
+
+def to_int64(value: int) -> int:
+    """Decoded varint of an int64 field (two's complement) → signed value."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+# ── Messages ──────────────────────────────────────────────────────────────────
+
+def key(field: int, wire: int) -> bytes:
+    return encode_varint((field << 3) | wire)
+
+
+def bytes_field(field: int, data: bytes) -> bytes:
+    return key(field, BYTES) + encode_varint(len(data)) + data
+
+
+def packed_field(field: int, values: list) -> bytes:
+    return bytes_field(field, b"".join(encode_varint(v) for v in values))
+
+
+def fields(buf):
+    """Yield (field number, value) for each field of a protobuf message."""
+    pos, end = 0, len(buf)
+    while pos < end:
+        tag, pos = read_varint(buf, pos)
+        wire = tag & 7
+        if wire == VARINT:
+            value, pos = read_varint(buf, pos)
+        elif wire == BYTES:
+            size, pos = read_varint(buf, pos)
+            value = buf[pos:pos + size]
+            pos += size
+        elif wire == FIXED64:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire == FIXED32:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield tag >> 3, value
+
+
+def read_packed(buf) -> list:
+    """Small packed varint array as a list (cheaper than NumPy for a few values)."""
+    out, pos, end = [], 0, len(buf)
+    while pos < end:
+        value, pos = read_varint(buf, pos)
+        out.append(value)
+    return out
+
+
+# ── Arrays ────────────────────────────────────────────────────────────────────
+
+def decode_varints(buf) -> np.ndarray:
+    """Vectorised decode of a packed varint array to uint64."""
+    b = np.frombuffer(buf, dtype=np.uint8)
+    if not len(b):
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shift = (np.arange(len(b)) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (b & 0x7F).astype(np.uint64) << shift.astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def encode_varints(values: np.ndarray) -> tuple:
+    """Varint bytes of a non-negative integer array, and the size of each value."""
+    v = values.astype(np.uint64)
+    sizes = np.ones(len(v), dtype=np.int64)
+    for bits in range(7, 64, 7):
+        sizes += v >= np.uint64(1 << bits)
+    starts = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for k in range(int(sizes.max(initial=0))):
+        sel = sizes > k
+        byte = (v[sel] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (sizes[sel] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[sel] + k] = byte | more
+    return out, sizes
+
+
+def unzigzag_array(values: np.ndarray) -> np.ndarray:
+    """unzigzag() of a decoded uint64 array, as int64."""
+    values = values.astype(np.int64)
+    return (values >> 1) ^ -(values & 1)
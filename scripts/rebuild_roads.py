@@ -1,48 +1,112 @@
 #!/usr/bin/env python3
 """
-rebuild_roads.py — Fetch road data from the Overpass API and produce optimised
-JSON/JSONL output for StormPath.
+rebuild_roads.py — Fetch road data from the Overpass API (or read it from the
+Geofabrik PBF extract) and produce optimised JSON/JSONL output for StormPath.
 
 Usage:
     python rebuild_roads.py <config.yaml> [--output <dir>] [--cache-dir <dir>]
-
-Output files (written to --output, default ./build-output/data/):
+                            [--workers N] [--spill-dir <dir>]
+                            [--tile-grid N] [--max-connections N]
+                            [--incremental [--verify-full]]
+                            [--source overpass|pbf] [--pbf-cache-dir <dir>]
+                            [--update [--replication <url|dir>]]
+                            [--coord-precision N] [--build-cache <dir>]
+                            [--trace-memory] [--profile [<dir>]]
+
+Output files (written to --output, default ./build-output/data/).  The road data
+files get content-hashed names, e.g. roads_optimized.<hash>.jsonl, listed by
+logical name in data-manifest.json (see datamanifest.py):
     roads_optimized.json    Full JSON payload (backwards compat)
     roads_optimized.jsonl   NDJSON for streaming (one road per line)
-    roads.json              Raw Overpass API response cache
+    roads_optimized.idx     Byte offset of each road/segment in the .jsonl
+                            (format and reader in roadindex.py)
+    roads_overview.json     Major roads plus a coarse copy of every other road, drawn
+                            by the web client before the full data arrives
+    data-manifest.json      Logical name → hashed file name, size, SHA-256
+                            (see datamanifest.py)
+    roads_optimized.bin     Fixed-point columnar binary read by the web client
+                            (format in roadbin.py, decoder in app/js/roadbin.js)
+    *.gz, *.br              Precompressed copies of the JSON, JSONL, .bin and overview,
+                            served by Caddy as-is
+                            (.br needs the optional brotli module)
+    roads_overlay.pmtiles   Road/segment vector tiles (moved to tiles/ in the image)
+    roads.sqlite            Road/segment catalog with an R*Tree over segment bounding
+                            boxes, queried by api.php (format in roadcatalog.py)
+    roads.json              Raw Overpass API response cache (in --cache-dir)
+    rebuild_state.json      Per-road fingerprints for --incremental (in --cache-dir)
+    osm_elements.sqlite     Road ways and nodes kept current by --update (in --cache-dir)
+
+rebuild_metadata.json also gets a "stages" table: wall and CPU time, peak RSS,
+tracemalloc peak (--trace-memory) and work counts for fetch, parse, index,
+merge, segment, simplify, write and boundary (see stagestats.py).  --profile
+writes a cProfile dump per stage.
+
+With --build-cache, the outputs are stored under a hash of the road data,
+the config sections they depend on and the script version; a later run with
+the same hash restores them instead of running process() (see stagecache.py).
 
 Python dependencies:
-    pip install requests shapely pyproj pyyaml
+    pip install requests shapely pyproj pyyaml numpy
+    pip install orjson brotli    (optional: faster JSON, .br outputs)
 """
 
 import argparse
+import asyncio
 import csv
+import hashlib
 import json
 import math
+import multiprocessing
+import re
 import sqlite3
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from collections import defaultdict
 
 try:
+    import numpy as np
+    import pyproj
     import requests
     import yaml
-    from shapely.geometry import LineString, mapping
+    import shapely
+    from shapely.geometry import LineString, mapping, shape
     from shapely.ops import linemerge, polygonize
-    from pyproj import Geod
 except ImportError as e:
     print(f"ERROR: Missing dependency — {e}", file=sys.stderr)
-    print("Run: pip install requests shapely pyproj pyyaml", file=sys.stderr)
+    print("Run: pip install requests shapely pyproj pyyaml numpy", file=sys.stderr)
     sys.exit(1)
 
-
-GEOD = Geod(ellps="WGS84")
+try:
+    import datamanifest
+    from geodesy import GEOD, cumulative_lengths_km, distances_km, edge_lengths_km, split_points
+    from incremental import IncrementalState, group_fingerprints
+    from jsonstream import (ITEM_SEPARATOR, JSON_BACKEND, PRECOMPRESS_SUFFIXES, OutputFile, dumps,
+                            open_array)
+    from osmchange import ChangeSet, ElementStore, ReplicationSource, area_filter
+    from nodestore import NodeStore
+    from osmpbf import extract_roads
+    from roadbin import DEFAULT_PRECISION, MAX_PRECISION, RoadBinWriter
+    from roadcatalog import RoadCatalogWriter
+    from roadindex import RoadIndexWriter
+    from overpass_stream import (CHUNK_SIZE, RoadData, ingest, load_file, merge_road_data,
+                                 write_cache)
+    from roadgraph import RoadGraph
+    from roadtiles import RoadTiler, verify as verify_overlay
+    from sharedarrays import SharedArrays, attach
+    from stagecache import StageCache, code_version
+    from stagestats import StageStats
+    from update_pmtiles import download_pbf
+except ImportError as e:
+    # A module of this directory is missing or broken; pip cannot fix that
+    print(f"ERROR: Cannot import a scripts/ module — {e}", file=sys.stderr)
+    sys.exit(1)
 
 
 def log(msg: str):
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+    # One write per line, so lines from concurrent stages (build_pipeline.py) never interleave
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}\n", end="", flush=True)
 
 
 # ── Distance helpers ────────────────────────────────────────────────────────────
@@ -53,12 +117,12 @@ def geodesic_distance_km(lat1, lon1, lat2, lon2) -> float:
     return dist_m / 1000.0
 
 
-def polyline_length_km(coords_lat_lon: list) -> float:
+def polyline_length_km(coords_lat_lon: list, fast: bool = False) -> float:
     """Total geodesic length of a polyline given as [(lat, lon), ...]."""
-    total = 0.0
-    for i in range(1, len(coords_lat_lon)):
-        total += geodesic_distance_km(*coords_lat_lon[i - 1], *coords_lat_lon[i])
-    return total
+    if len(coords_lat_lon) < 2:
+        return 0.0
+    lats, lons = np.asarray(coords_lat_lon, dtype=np.float64).T
+    return float(cumulative_lengths_km(lats, lons, fast=fast)[-1])
 
 
 # ── Geometry simplification ────────────────────────────────────────────────────
@@ -78,6 +142,106 @@ def simplify_geometry(coords_lat_lon: list, tolerance: float) -> list:
     return [(y, x) for x, y in simplified.coords]
 
 
+def simplify_geometries(lines: list, tolerance: float) -> list:
+    """
+    Batch form of simplify_geometry(): simplifies every polyline in ``lines``
+    with one vectorised Shapely 2 call and returns results in the same order.
+    """
+    result = list(lines)
+    todo = [i for i, coords in enumerate(lines) if len(coords) > 2]
+    if not todo:
+        return result
+
+    counts = np.array([len(lines[i]) for i in todo])
+    lat_lon = np.array([pt for i in todo for pt in lines[i]], dtype=np.float64)
+    geoms = shapely.linestrings(lat_lon[:, ::-1], indices=np.repeat(np.arange(len(todo)), counts))
+    simplified = shapely.simplify(geoms, tolerance, preserve_topology=False)
+
+    coords, owner = shapely.get_coordinates(simplified, return_index=True)
+    offsets = np.zeros(len(todo) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner, minlength=len(todo)), out=offsets[1:])
+    ys, xs = coords[:, 1].tolist(), coords[:, 0].tolist()
+    for k, i in enumerate(todo):
+        a, b = offsets[k], offsets[k + 1]
+        if a == b:
+            result[i] = lines[i][:1] + lines[i][-1:]
+        else:
+            result[i] = list(zip(ys[a:b], xs[a:b]))
+    return result
+
+
+# ── Overview ───────────────────────────────────────────────────────────────────
+
+# Drawn in full in roads_overview.json; every other road gets a coarse copy
+MAJOR_HIGHWAYS = frozenset({"motorway", "trunk", "primary", "secondary",
+                            "motorway_link", "trunk_link", "primary_link", "secondary_link"})
+OVERVIEW_TOLERANCE = 0.002    # degrees (~200 m) unless segments.overview_tolerance is set
+OVERVIEW_DECIMALS = 5         # ~1 m, far below the coarse tolerance
+OVERVIEW_BATCH = 2000         # roads simplified per build_overview() call while streaming
+
+
+def build_overview(roads: list, tolerance: float) -> tuple:
+    """
+    roads_overview.json records for ``roads`` given as (id, name, highway,
+    geometry) tuples.  Major-network roads keep their output geometry; all
+    others are simplified with ``tolerance``.  Returns (records, stats) where
+    stats is {"major": (roads, vertices), "coarse": (roads, vertices)}.
+    """
+    major = [r[2] in MAJOR_HIGHWAYS for r in roads]
+    coarse = simplify_geometries([r[3] for r, m in zip(roads, major) if not m], tolerance)
+    coarse_iter = iter(coarse)
+    records, stats = [], {"major": [0, 0], "coarse": [0, 0]}
+    for (road_id, name, highway, geometry), is_major in zip(roads, major):
+        geometry = geometry if is_major else next(coarse_iter)
+        level = stats["major" if is_major else "coarse"]
+        level[0] += 1
+        level[1] += len(geometry)
+        record = {"id": road_id, "name": name,
+                  "geometry": [[round(lat, OVERVIEW_DECIMALS), round(lon, OVERVIEW_DECIMALS)]
+                               for lat, lon in geometry]}
+        if highway:
+            record["highway"] = highway
+        records.append(record)
+    return records, {k: tuple(v) for k, v in stats.items()}
+
+
+class OverviewWriter:
+    """
+    Streams roads_overview.json records into ``out`` as roads arrive,
+    simplifying them OVERVIEW_BATCH at a time so only one batch of road
+    geometries is held.  ``levels`` totals build_overview()'s stats.
+    """
+
+    def __init__(self, out: OutputFile, head: dict, tolerance: float):
+        self._out = out
+        self.tolerance = tolerance
+        self._pending: list = []
+        self._written = 0
+        self.levels = {"major": (0, 0), "coarse": (0, 0)}
+        out.write(open_array({**head, "tolerance": tolerance}, "roads"))
+
+    def add(self, road: dict):
+        self._pending.append((road["id"], road["tags"].get("name", ""),
+                              road["tags"].get("highway"), road["geometry"]))
+        if len(self._pending) >= OVERVIEW_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        records, levels = build_overview(self._pending, self.tolerance)
+        data = ITEM_SEPARATOR.join(dumps(r) for r in records)
+        self._out.write(ITEM_SEPARATOR + data if self._written else data)
+        self._written += len(records)
+        self.levels = {k: (n + levels[k][0], v + levels[k][1])
+                       for k, (n, v) in self.levels.items()}
+        self._pending = []
+
+    def finish(self):
+        self._flush()
+        self._out.write(b"]}")
+
+
 # ── Overpass API fetch ──────────────────────────────────────────────────────────
 
 # Public mirror servers tried in order after the primary fails.
@@ -88,90 +252,350 @@ _OVERPASS_FALLBACKS = [
 ]
 
 
-def fetch_overpass(cfg: dict, cache_file: Path, retries: int = 3) -> dict:
-    """Fetch road data from Overpass API, with mirror fallbacks and local cache."""
-    relation_id = cfg["area"]["osm_relation_id"]
-    area_id = relation_id + 3600000000
+def _overpass_query(cfg: dict, bbox: tuple | None = None) -> str:
+    """Road query for the configured area, optionally limited to (s, w, n, e)."""
+    area_id = cfg["area"]["osm_relation_id"] + 3600000000
     road_types = "|".join(cfg["data"]["road_types"])
-    primary_url = cfg["data"]["overpass_url"]
-
-    query = f"""[out:json][timeout:120];
+    bbox_filter = "({:.7f},{:.7f},{:.7f},{:.7f})".format(*bbox) if bbox else ""
+    return f"""[out:json][timeout:120];
 area({area_id})->.searcharea;
 (
-  way(area.searcharea)["highway"~"{road_types}"]["name"];
+  way(area.searcharea){bbox_filter}["highway"~"{road_types}"]["name"];
 );
 out body;
 >;
 out skel qt;"""
 
-    log(f"Fetching road data for area {area_id}...")
 
-    # Try primary server (with retries), then each mirror once.
-    servers = [primary_url] + [s for s in _OVERPASS_FALLBACKS if s != primary_url]
+def _overpass_servers(cfg: dict) -> list:
+    primary_url = cfg["data"]["overpass_url"]
+    return [primary_url] + [s for s in _OVERPASS_FALLBACKS if s != primary_url]
+
+
+def _query_overpass(cfg: dict, query: str, retries: int, label: str = "",
+                    tee_path: Path | None = None, spill_dir: Path | None = None,
+                    stats: StageStats | None = None) -> RoadData | None:
+    """
+    Run one query against the primary server (with retries), then each mirror
+    once.  Returns None if every server failed.  Time spent waiting for the
+    response body counts as the "fetch" stage of ``stats``, parsing it as "parse".
+    """
+    stats = stats if stats is not None else StageStats()
+    servers = _overpass_servers(cfg)
     for server_idx, overpass_url in enumerate(servers):
         server_retries = retries if server_idx == 0 else 1
         if server_idx > 0:
-            log(f"Trying fallback Overpass mirror: {overpass_url}")
+            log(f"{label}Trying fallback Overpass mirror: {overpass_url}")
         for attempt in range(1, server_retries + 1):
             try:
-                resp = requests.post(
+                with requests.post(
                     overpass_url,
                     data={"data": query},
                     timeout=150,
                     headers={"User-Agent": "StormPath/1.0 road-status-app"},
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                if "elements" not in data:
-                    raise ValueError("Response missing 'elements' key")
-
-                # Save raw cache
-                cache_file.parent.mkdir(parents=True, exist_ok=True)
-                cache_file.write_text(resp.text)
-                log(f"Received {len(data['elements'])} elements from {overpass_url}")
+                    stream=True,
+                ) as resp:
+                    resp.raise_for_status()
+                    chunks = stats.iterate("fetch", resp.iter_content(chunk_size=CHUNK_SIZE),
+                                           unit="bytes")
+                    with stats.stage("parse"):
+                        data = ingest(chunks, tee_path=tee_path, spill_dir=spill_dir)
+                if data.remark:
+                    log(f"{label}WARNING: Overpass remark: {data.remark}")
+                log(f"{label}Received {data.element_count} elements from {overpass_url}")
                 return data
 
             except Exception as exc:
-                log(f"Attempt {attempt}/{server_retries} failed ({overpass_url}): {exc}")
+                log(f"{label}Attempt {attempt}/{server_retries} failed ({overpass_url}): {exc}")
                 if attempt < server_retries:
                     time.sleep(10 * attempt)
+    return None
+
+
+def fetch_area_bbox(cfg: dict) -> tuple | None:
+    """(south, west, north, east) of the area's boundary relation, or None."""
+    relation_id = cfg["area"]["osm_relation_id"]
+    query = f"[out:json][timeout:25];relation({relation_id});out bb;"
+    for overpass_url in _overpass_servers(cfg):
+        try:
+            resp = requests.post(
+                overpass_url,
+                data={"data": query},
+                timeout=60,
+                headers={"User-Agent": "StormPath/1.0 road-status-app"},
+            )
+            resp.raise_for_status()
+            for element in resp.json().get("elements", []):
+                if "bounds" in element:
+                    b = element["bounds"]
+                    return b["minlat"], b["minlon"], b["maxlat"], b["maxlon"]
+            log(f"WARNING: Relation {relation_id} has no bounds ({overpass_url})")
+        except Exception as exc:
+            log(f"WARNING: Bounding box query failed ({overpass_url}): {exc}")
+    return None
+
+
+def tile_bboxes(bbox: tuple, grid: int) -> list:
+    """Split (s, w, n, e) into grid × grid tiles, row by row from the south-west."""
+    south, west, north, east = bbox
+    lat_edges = np.linspace(south, north, grid + 1).tolist()
+    lon_edges = np.linspace(west, east, grid + 1).tolist()
+    return [(lat_edges[r], lon_edges[c], lat_edges[r + 1], lon_edges[c + 1])
+            for r in range(grid) for c in range(grid)]
+
+
+async def _fetch_tiles(cfg: dict, tiles: list, retries: int, max_connections: int) -> list:
+    """Fetch every tile concurrently, at most ``max_connections`` at a time."""
+    limit = asyncio.Semaphore(max(1, max_connections))
+
+    async def fetch_tile(i: int, tile: tuple):
+        async with limit:
+            label = f"[tile {i + 1}/{len(tiles)}] "
+            return await asyncio.to_thread(_query_overpass, cfg, _overpass_query(cfg, tile),
+                                           retries, label)
+
+    return await asyncio.gather(*(fetch_tile(i, t) for i, t in enumerate(tiles)))
+
+
+def _fetch_tiled(cfg: dict, cache_file: Path, retries: int, spill_dir: Path | None,
+                 tile_grid: int, max_connections: int) -> RoadData | None:
+    bbox = fetch_area_bbox(cfg)
+    if bbox is None:
+        log("ERROR: Could not determine the area bounding box for a tiled fetch")
+        return None
+    tiles = tile_bboxes(bbox, tile_grid)
+    log(f"Fetching {len(tiles)} tiles ({tile_grid}x{tile_grid}, "
+        f"{max_connections} concurrent connections)...")
+    parts = asyncio.run(_fetch_tiles(cfg, tiles, retries, max_connections))
+
+    failed = [i + 1 for i, part in enumerate(parts) if part is None]
+    if failed:
+        log(f"ERROR: Tiles {failed} failed on every Overpass server")
+        for part in parts:
+            if part is not None:
+                part.nodes.close()
+        return None
+
+    data = merge_road_data(parts, spill_dir=spill_dir)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    write_cache(data, cache_file, generator="StormPath tiled fetch")
+    log(f"Merged tiles: {len(data.ways)} ways, {len(data.nodes)} nodes")
+    return data
+
+
+def fetch_overpass(cfg: dict, cache_file: Path, retries: int = 3,
+                   spill_dir: Path | None = None, tile_grid: int = 1,
+                   max_connections: int = 4, stats: StageStats | None = None) -> RoadData:
+    """
+    Fetch road data from Overpass API, with mirror fallbacks and local cache.
+
+    The response is parsed as it streams in and teed to the cache file, so
+    the raw body and the parsed document are never both held in memory.
+
+    With ``tile_grid`` > 1 the area's bounding box is split into a grid and
+    the tiles are fetched concurrently, each retried on its own; ways and
+    nodes shared between tiles are deduplicated when the results are merged.
+    Tiled fetches are not split into "fetch" and "parse" in ``stats``.
+    """
+    stats = stats if stats is not None else StageStats()
+    area_id = cfg["area"]["osm_relation_id"] + 3600000000
+    log(f"Fetching road data for area {area_id}...")
+
+    if tile_grid > 1:
+        data = _fetch_tiled(cfg, cache_file, retries, spill_dir, tile_grid, max_connections)
+        if data is not None:
+            return data
+    else:
+        # Tee the body to a temporary file and only replace the cache once
+        # the whole response has parsed.
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        partial = cache_file.with_name(cache_file.name + ".part")
+        data = _query_overpass(cfg, _overpass_query(cfg), retries,
+                               tee_path=partial, spill_dir=spill_dir, stats=stats)
+        if data is not None:
+            partial.replace(cache_file)
+            return data
 
     # All servers failed — try local file cache
     if cache_file.exists() and cache_file.stat().st_size > 0:
         log("Using cached roads.json (all Overpass servers unavailable)")
-        data = json.loads(cache_file.read_text())
-        if "elements" in data:
-            return data
+        try:
+            with stats.stage("parse"):
+                return load_file(cache_file, spill_dir=spill_dir)
+        except ValueError as exc:
+            log(f"ERROR: Cached roads.json is unusable: {exc}")
 
     log("ERROR: No data available from any Overpass server or cache. Exiting.")
     sys.exit(1)
 
 
+def load_pbf(cfg: dict, pbf_cache_dir: Path, output_dir: Path, workers: int = 1,
+             spill_dir: Path | None = None, stats: StageStats | None = None) -> tuple:
+    """
+    Read road data from the Geofabrik extract cached by update_pmtiles.py
+    (downloading it first if it is missing or outdated).
+    Returns (RoadData, boundary polygons from the extract, PBF file name).
+    """
+    stats = stats if stats is not None else StageStats()
+    pbf_file = download_extract(cfg["data"]["geofabrik_url"], pbf_cache_dir, stats=stats)
+    road_data, polygons = read_pbf(cfg, pbf_file, output_dir, workers=workers,
+                                   spill_dir=spill_dir, stats=stats)
+    return road_data, polygons, pbf_file.name
+
+
+def download_extract(url: str, pbf_cache_dir: Path, stats: StageStats | None = None) -> Path:
+    """
+    The Geofabrik extract at ``url`` in ``pbf_cache_dir``, downloaded first if
+    it is missing or outdated.  A cached copy is used if the download fails.
+    """
+    stats = stats if stats is not None else StageStats()
+    pbf_file = pbf_cache_dir / url.rsplit("/", 1)[-1]
+    with stats.stage("fetch") as st:
+        try:
+            pbf_file = download_pbf(url, pbf_cache_dir, pbf_file)
+        except Exception as exc:
+            if not (pbf_file.exists() and pbf_file.stat().st_size > 0):
+                log(f"ERROR: Could not download {url}: {exc}")
+                sys.exit(1)
+            log(f"WARNING: Could not refresh the PBF ({exc}) — using cached {pbf_file.name}")
+        st.count(bytes=pbf_file.stat().st_size)
+    return pbf_file
+
+
+def read_pbf(cfg: dict, pbf_file: Path, output_dir: Path, workers: int = 1,
+             spill_dir: Path | None = None, stats: StageStats | None = None) -> tuple:
+    """Roads of the area from ``pbf_file``: (RoadData, boundary polygons)."""
+    stats = stats if stats is not None else StageStats()
+    try:
+        with stats.stage("parse"):
+            return extract_roads(pbf_file, cfg["data"]["road_types"],
+                                 cfg["area"]["osm_relation_id"], workers=workers,
+                                 boundary=saved_boundary(output_dir),
+                                 spill_dir=spill_dir, log=log)
+    except ValueError as exc:
+        log(f"ERROR: {exc}")
+        sys.exit(1)
+
+
+def saved_boundary(output_dir: Path):
+    """
+    The outline last written to area_boundary_geojson.json, or None.  PBF
+    clipping falls back to it if the extract does not contain the boundary
+    relation itself.
+    """
+    boundary_file = output_dir / "area_boundary_geojson.json"
+    if not boundary_file.exists():
+        return None
+    features = json.loads(boundary_file.read_text())["features"]
+    return shapely.union_all([shape(f["geometry"]) for f in features])
+
+
+def _road_filter(cfg: dict):
+    """is_road(tags) matching the Overpass query's highway and name filters."""
+    road_re = re.compile("|".join(cfg["data"]["road_types"]))
+    return lambda tags: "name" in tags and bool(road_re.search(tags.get("highway", "")))
+
+
+def _fetch_nodes(cfg: dict, node_ids: list, retries: int) -> dict | None:
+    """{id: (lat, lon)} for nodes a diff references but does not contain."""
+    found = {}
+    for start in range(0, len(node_ids), 5000):
+        ids = ",".join(str(n) for n in node_ids[start:start + 5000])
+        data = _query_overpass(cfg, f"[out:json][timeout:120];node(id:{ids});out skel qt;",
+                               retries, label="[nodes] ")
+        if data is None:
+            return None
+        found.update(zip(data.nodes.ids.tolist(),
+                         zip(data.nodes.lats.tolist(), data.nodes.lons.tolist())))
+        data.nodes.close()
+    return found
+
+
+def replication_url(cfg: dict) -> str:
+    """Configured replication feed, else the Geofabrik -updates directory of the extract."""
+    url = cfg["data"].get("replication_url")
+    if url:
+        return url
+    return cfg["data"]["geofabrik_url"].replace("-latest.osm.pbf", "-updates")
+
+
+def update_from_diffs(cfg: dict, store: ElementStore, source: ReplicationSource,
+                      output_dir: Path, retries: int = 3,
+                      spill_dir: Path | None = None) -> tuple | None:
+    """
+    Bring the element store up to date with the replication feed.
+    Returns (RoadData, affected road names), or None if a full fetch is needed.
+    """
+    if not len(store):
+        log("Update: element store is empty — a full fetch is needed")
+        return None
+    boundary_file = output_dir / "area_boundary_geojson.json"
+    if not boundary_file.exists():
+        log("Update: area_boundary_geojson.json is missing — a full fetch is needed")
+        return None
+    features = json.loads(boundary_file.read_text())["features"]
+    inside = area_filter(shapely.union_all([shape(f["geometry"]) for f in features]))
+    is_road = _road_filter(cfg)
+
+    try:
+        latest, latest_ts = source.latest()
+        sequence = store.get_meta("sequence")
+        if sequence is not None:
+            start = int(sequence) + 1
+        else:
+            start = source.first_after(store.get_meta("osm_timestamp") or "", latest)
+        if start > latest:
+            log(f"Update: already at replication sequence {latest} ({latest_ts})")
+            return store.road_data(spill_dir=spill_dir), set()
+
+        log(f"Update: applying replication diffs {start}–{latest} from {source.base}...")
+        changes = ChangeSet()
+        for seq in range(start, latest + 1):
+            changes.add_osc(source.diff(seq))
+    except Exception as exc:
+        log(f"Update: could not read replication diffs ({exc}) — a full fetch is needed")
+        return None
+    log(f"Update: {len(changes.ways)} changed ways, {len(changes.nodes)} changed nodes")
+
+    extra_nodes = {}
+    missing = store.missing_nodes(changes, is_road)
+    if missing:
+        log(f"Update: fetching {len(missing)} node(s) referenced by changed roads...")
+        extra_nodes = _fetch_nodes(cfg, missing, retries)
+        if extra_nodes is None:
+            log("Update: could not fetch missing nodes — a full fetch is needed")
+            return None
+
+    affected = store.apply_changes(changes, is_road, inside, extra_nodes)
+    store.set_meta("sequence", latest)
+    store.set_meta("osm_timestamp", latest_ts)
+    log(f"Update: now at sequence {latest} ({latest_ts}); "
+        f"{len(affected)} road name(s) affected")
+    return store.road_data(spill_dir=spill_dir), affected
+
+
 # ── Way merging ────────────────────────────────────────────────────────────────
 
-def merge_connected_ways(ways_group: list, nodes: dict, merge_issues: list) -> list:
+MAX_CHAIN_STARTS = 64         # endpoint ways tried when ordering a branched component
+
+
+def merge_connected_ways(graph: RoadGraph, way_indices: list, nodes: NodeStore,
+                         merge_issues: list) -> list:
     """Merge OSM ways with the same name that share endpoints."""
-    if len(ways_group) == 1:
-        return ways_group
+    if len(way_indices) == 1:
+        return [graph.ways[way_indices[0]]]
 
-    # Build connectivity graph
-    road_name = ways_group[0]["tags"].get("name", "Unknown")
+    # Adjacency comes from the graph's node → way index: ways of this name
+    # sharing an endpoint node, listed in ascending way order.
+    road_name = graph.ways[way_indices[0]]["tags"].get("name", "Unknown")
     conns = {}
-    for i, way in enumerate(ways_group):
+    for i in way_indices:
+        way = graph.ways[i]
         ns = way.get("nodes", [])
         if len(ns) < 2:
             continue
-        conns[i] = {"way": way, "start": ns[0], "end": ns[-1], "adj": []}
-
-    for i in conns:
-        for j in conns:
-            if i >= j:
-                continue
-            s1, e1 = conns[i]["start"], conns[i]["end"]
-            s2, e2 = conns[j]["start"], conns[j]["end"]
-            if e1 == s2 or e1 == e2 or s1 == s2 or s1 == e2:
-                conns[i]["adj"].append(j)
-                conns[j]["adj"].append(i)
+        conns[i] = {"way": way, "start": ns[0], "end": ns[-1],
+                    "adj": graph.endpoint_neighbours(i)}
 
     # Find connected components via DFS
     visited: set = set()
@@ -201,17 +625,27 @@ def merge_connected_ways(ways_group: list, nodes: dict, merge_issues: list) -> l
 
 
 def _order_component(comp: list, conns: dict) -> list:
-    """Order ways in a connected component into a linear chain."""
-    adj = {i: list(conns[i]["adj"]) for i in comp}
+    """
+    Order ways in a connected component into a linear chain.
+
+    Walks from an endpoint way (degree 1), always stepping to the lowest
+    unvisited neighbour.  A simple chain or loop is covered by the first walk.
+    A branched component has no single chain through every way, and the ways
+    a walk misses are left out of the merged road, so further starts are
+    tried and the longest chain kept.  Each walk costs up to len(comp) steps,
+    so only the first MAX_CHAIN_STARTS starts are tried: that keeps the
+    ordering linear in the component size, and real same-name components
+    rarely have more than a handful of endpoints.
+    """
     # Prefer starting from an endpoint (degree 1)
-    endpoints = [i for i in comp if len(adj[i]) == 1]
+    endpoints = [i for i in comp if len(conns[i]["adj"]) == 1]
     candidates = endpoints if endpoints else comp
 
     best = []
-    for start in candidates:
+    for start in candidates[:MAX_CHAIN_STARTS]:
         order, vis, cur = [start], {start}, start
         while len(order) < len(comp):
-            nxt = next((nb for nb in adj[cur] if nb not in vis), None)
+            nxt = next((nb for nb in conns[cur]["adj"] if nb not in vis), None)
             if nxt is None:
                 break
             order.append(nxt)
@@ -219,6 +653,8 @@ def _order_component(comp: list, conns: dict) -> list:
             cur = nxt
         if len(order) > len(best):
             best = order
+            if len(best) == len(comp):
+                break  # no later start can produce a longer chain
     return best
 
 
@@ -250,9 +686,9 @@ def _merge_component(comp, conns, nodes, road_name, merge_issues) -> dict | None
             if way_nodes[0] != last:
                 # Gap detected — record and skip
                 gap_km = 0.0
-                if last in nodes and way_nodes[0] in nodes:
-                    n1, n2 = nodes[last], nodes[way_nodes[0]]
-                    gap_km = geodesic_distance_km(n1["lat"], n1["lon"], n2["lat"], n2["lon"])
+                p1, p2 = nodes.latlon(last), nodes.latlon(way_nodes[0])
+                if p1 is not None and p2 is not None:
+                    gap_km = geodesic_distance_km(*p1, *p2)
                 merge_issues.append({
                     "road_name": road_name,
                     "osm_way_id": way["id"],
@@ -283,8 +719,8 @@ def _merge_component(comp, conns, nodes, road_name, merge_issues) -> dict | None
 
 # ── Segment calculation ─────────────────────────────────────────────────────────
 
-def calculate_segments(way: dict, nodes: dict, node_to_ways: dict,
-                        intersection_nodes: dict, cfg: dict) -> list | None:
+def calculate_segments(way: dict, nodes: NodeStore, graph: RoadGraph,
+                        cfg: dict) -> list | None:
     """
     Split a (merged) road into segments at intersection points.
     Returns a list of segment dicts, or None if the road should be one segment.
@@ -294,52 +730,59 @@ def calculate_segments(way: dict, nodes: dict, node_to_ways: dict,
     seg_cfg = cfg["segments"]
     MIN_KM = seg_cfg["min_distance_km"]
     MAX_KM = seg_cfg["max_distance_km"]
+    fast = seg_cfg.get("fast_distance", False)
 
     if len(way_nodes) < 10:
         return None
 
     # Find intersection nodes (shared with differently-named roads)
     intersection_indices = []
-    for idx, nid in enumerate(way_nodes):
-        if nid not in intersection_nodes:
-            continue
-        cross = [w["way_name"] for w in intersection_nodes[nid]
-                 if w["way_name"] != road_name]
-        cross = list(dict.fromkeys(cross))  # deduplicate, preserve order
+    for idx in np.flatnonzero(graph.intersection_mask(way_nodes)).tolist():
+        nid = way_nodes[idx]
+        cross = graph.cross_names(nid, road_name)
         if cross:
             intersection_indices.append({"index": idx, "node_id": nid, "cross": cross})
 
     if not intersection_indices:
         return None
 
-    # Filter by minimum distance
-    filtered, last_node_pos = [], None
-    for inter in intersection_indices:
-        nid = way_nodes[inter["index"]]
-        if nid not in nodes:
-            continue
-        nd = nodes[nid]
-        if last_node_pos is None:
-            filtered.append(inter)
-            last_node_pos = (nd["lat"], nd["lon"])
-        else:
-            if geodesic_distance_km(*last_node_pos, nd["lat"], nd["lon"]) >= MIN_KM:
-                filtered.append(inter)
-                last_node_pos = (nd["lat"], nd["lon"])
-
-    if not filtered:
+    # Resolve every node of the way in one lookup; nodes missing from the
+    # store are dropped from geometries, as before.
+    store_idx = nodes.indices(way_nodes)
+    present = np.flatnonzero(store_idx >= 0)
+    lats = nodes.lats[store_idx[present]]
+    lons = nodes.lons[store_idx[present]]
+
+    # Filter by minimum distance: keep the first intersection, then each one at
+    # least MIN_KM (straight line) from the last kept.  Distances from the last
+    # kept point to all later candidates are computed in one batched call.
+    candidates = [inter for inter in intersection_indices if store_idx[inter["index"]] >= 0]
+    if not candidates:
         return None
+    cand_pos = np.searchsorted(present, [inter["index"] for inter in candidates])
+    cand_lat, cand_lon = lats[cand_pos], lons[cand_pos]
+    filtered, last = [candidates[0]], 0
+    while last + 1 < len(candidates):
+        dist = distances_km(cand_lat[last], cand_lon[last],
+                            cand_lat[last + 1:], cand_lon[last + 1:], fast=fast)
+        far = np.flatnonzero(dist >= MIN_KM)
+        if not len(far):
+            break
+        last += 1 + int(far[0])
+        filtered.append(candidates[last])
 
     # Build segments between intersections
     segments = []
     start_idx = 0
+    points = list(zip(lats.tolist(), lons.tolist()))
 
-    def build_geom(node_ids):
-        return [(nodes[n]["lat"], nodes[n]["lon"]) for n in node_ids if n in nodes]
+    def build_geom(start, stop):
+        # Points for way_nodes[start:stop] that are present in the store
+        return points[np.searchsorted(present, start):np.searchsorted(present, stop)]
 
     for i, inter in enumerate(filtered):
         end_idx = inter["index"]
-        geom = build_geom(way_nodes[start_idx:end_idx + 1])
+        geom = build_geom(start_idx, end_idx + 1)
         if i == 0:
             desc = f"To {inter['cross'][0]}"
         else:
@@ -349,105 +792,74 @@ def calculate_segments(way: dict, nodes: dict, node_to_ways: dict,
         start_idx = end_idx
 
     # Final segment from last intersection to end
-    geom = build_geom(way_nodes[start_idx:])
+    geom = build_geom(start_idx, len(way_nodes))
     if len(geom) >= 2:
         last = filtered[-1]
         segments.append({"description": f"From {last['cross'][0]}", "geometry": geom})
 
     # Split long segments
-    segments = _split_long_segments(segments, MAX_KM)
+    segments = _split_long_segments(segments, MAX_KM, fast=fast)
     return segments if segments else None
 
 
-def _split_long_segments(segments: list, max_km: float) -> list:
+def _split_long_segments(segments: list, max_km: float, fast: bool = False) -> list:
     """Split any segment longer than max_km into equal-length parts."""
     result = []
     for seg in segments:
         geom = seg["geometry"]
-        total = polyline_length_km(geom)
+        lats, lons = np.asarray(geom, dtype=np.float64).T
+        edges = edge_lengths_km(lats, lons, fast=fast)
+        total = float(np.cumsum(edges)[-1]) if len(edges) else 0.0
         if total <= max_km:
             result.append(seg)
             continue
         n = math.ceil(total / max_km)
-        target = total / n
-        cur_geom = [geom[0]]
-        cur_dist = 0.0
-        part = 1
-        for i in range(1, len(geom)):
-            d = geodesic_distance_km(*geom[i - 1], *geom[i])
-            cur_dist += d
-            cur_geom.append(geom[i])
-            if cur_dist >= target and part < n:
-                result.append({"description": f"{seg['description']} (part {part} of {n})",
-                                "geometry": cur_geom})
-                cur_geom = [geom[i]]
-                cur_dist = 0.0
-                part += 1
-        if len(cur_geom) > 1:
+        cuts = split_points(edges, total / n, n - 1)
+        bounds = [0] + cuts
+        if cuts and cuts[-1] < len(geom) - 1:
+            bounds.append(len(geom) - 1)
+        for part, (a, b) in enumerate(zip(bounds, bounds[1:]), start=1):
             result.append({"description": f"{seg['description']} (part {part} of {n})",
-                            "geometry": cur_geom})
+                           "geometry": geom[a:b + 1]})
     return result
 
 
 # ── Main processing pipeline ────────────────────────────────────────────────────
 
-def process(cfg: dict, raw_data: dict, output_dir: Path) -> list:
-    elements = raw_data["elements"]
-    nodes = {e["id"]: e for e in elements if e["type"] == "node"}
-    ways  = [e for e in elements if e["type"] == "way" and "tags" in e
-             and "name" in e["tags"]]
-
-    log(f"Processing {len(ways)} named ways...")
-
-    # Build node→ways index
-    node_to_ways: dict = defaultdict(list)
-    for way in ways:
-        for nid in way.get("nodes", []):
-            node_to_ways[nid].append({"way_id": way["id"], "way_name": way["tags"]["name"]})
-
-    # Intersection nodes: shared by 2+ differently-named roads
-    intersection_nodes = {
-        nid: wlist for nid, wlist in node_to_ways.items()
-        if len({w["way_name"] for w in wlist}) >= 2
-    }
-
-    # Group ways by name and merge connected segments
-    ways_by_name: dict = defaultdict(list)
-    for way in ways:
-        ways_by_name[way["tags"]["name"]].append(way)
-
-    merge_issues: list = []
-    merged_ways = []
-    for name, group in ways_by_name.items():
-        merged_ways.extend(merge_connected_ways(group, nodes, merge_issues))
-
-    log(f"After merging: {len(merged_ways)} road features")
-
-    tol = cfg["segments"]["simplify_tolerance"]
-    optimized = []
-
-    for way in merged_ways:
-        way_nodes = way.get("nodes", [])
-        full_coords = [(nodes[n]["lat"], nodes[n]["lon"])
-                       for n in way_nodes if n in nodes]
-        if len(full_coords) < 2:
-            continue
+def _build_roads(pending: list, tol: float) -> list:
+    """
+    Turn (merged way, full coords, raw segments) triples into output records.
 
-        simplified_full = simplify_geometry(full_coords, tol)
+    Every road and segment geometry is simplified in one batch.  A segment
+    whose geometry is the whole road reuses the road's simplified result.
+    """
+    lines, plan = [], []
+    for way, full_coords, raw_segs in pending:
+        full_idx = len(lines)
+        lines.append(full_coords)
+        seg_idx = []
+        for seg in raw_segs or ():
+            if len(seg["geometry"]) == len(full_coords) and seg["geometry"] == full_coords:
+                seg_idx.append(full_idx)
+            else:
+                seg_idx.append(len(lines))
+                lines.append(seg["geometry"])
+        plan.append((full_idx, seg_idx))
+
+    simplified = simplify_geometries(lines, tol)
+
+    roads = []
+    for (way, _full, raw_segs), (full_idx, seg_idx) in zip(pending, plan):
         # Store as [[lat, lon], ...] (matches original PHP output format)
-        full_geom_out = [[lat, lon] for lat, lon in simplified_full]
-
-        # Calculate intersection-based segments
-        raw_segs = calculate_segments(way, nodes, node_to_ways, intersection_nodes, cfg)
+        full_geom_out = [[lat, lon] for lat, lon in simplified[full_idx]]
 
         if raw_segs:
             seg_out = []
-            for seg_num, seg in enumerate(raw_segs, start=1):
-                simp = simplify_geometry(seg["geometry"], tol)
+            for seg_num, (seg, idx) in enumerate(zip(raw_segs, seg_idx), start=1):
                 seg_out.append({
                     "id": f"{way['id']}-{seg_num}",
                     "description": seg["description"],
-                    "geometry": [[lat, lon] for lat, lon in simp],
+                    "geometry": [[lat, lon] for lat, lon in simplified[idx]],
                 })
         else:
             seg_out = [{
@@ -456,37 +868,354 @@ def process(cfg: dict, raw_data: dict, output_dir: Path) -> list:
                 "geometry": full_geom_out,
             }]
 
-        optimized.append({
+        tags = {"name": way["tags"].get("name", "Unnamed Road")}
+        if "highway" in way["tags"]:
+            tags["highway"] = way["tags"]["highway"]
+        roads.append({
             "type": way.get("type", "way"),
             "id": way["id"],
-            "tags": {"name": way["tags"].get("name", "Unnamed Road")},
+            "tags": tags,
             "geometry": full_geom_out,
             "segments": seg_out,
         })
+    return roads
+
 
-    return optimized, merge_issues, raw_data.get("osm3s", {}).get("timestamp_osm_base", "unknown")
+def _process_groups(groups: list, graph: RoadGraph, nodes: NodeStore, cfg: dict,
+                    stats: StageStats | None = None) -> tuple:
+    """
+    Merge, segment and simplify a run of same-name groups, timing each step
+    as a stage of ``stats``.
+    Returns (roads, merge_issues, counts) in group order, where counts holds
+    (roads, merge issues, merged ways) for each group.
+    """
+    stats = stats if stats is not None else StageStats()
+    pending, merge_issues, counts = [], [], []
+    for _name, group in groups:
+        n_pending, n_issues = len(pending), len(merge_issues)
+        with stats.stage("merge") as st:
+            merged = merge_connected_ways(graph, group, nodes, merge_issues)
+            st.count(ways=len(group), roads=len(merged),
+                     merge_issues=len(merge_issues) - n_issues)
+        with stats.stage("segment") as st:
+            for way in merged:
+                lats, lons = nodes.coords(way.get("nodes", []))
+                full_coords = list(zip(lats.tolist(), lons.tolist()))
+                if len(full_coords) < 2:
+                    continue
+                # Calculate intersection-based segments
+                segments = calculate_segments(way, nodes, graph, cfg)
+                pending.append((way, full_coords, segments))
+                st.count(roads=1, vertices=len(full_coords), segments=len(segments or ()))
+        counts.append((len(pending) - n_pending, len(merge_issues) - n_issues, len(merged)))
+
+    with stats.stage("simplify") as st:
+        roads = _build_roads(pending, cfg["segments"]["simplify_tolerance"])
+        st.count(vertices_in=sum(len(full) + sum(len(seg["geometry"]) for seg in segs or ())
+                                 for _way, full, segs in pending),
+                 vertices_out=sum(len(road["geometry"])
+                                  + sum(len(seg["geometry"]) for seg in road["segments"])
+                                  for road in roads))
+    return roads, merge_issues, counts
+
+
+def _chunk_groups(groups: list, graph: RoadGraph, n_chunks: int) -> list:
+    """Split groups into contiguous runs of roughly equal vertex count."""
+    sizes = [int(sum(graph.way_length(i) for i in group)) for _name, group in groups]
+    budget = max(1, sum(sizes) // max(1, n_chunks))
+    chunks, current, filled = [], [], 0
+    for group, size in zip(groups, sizes):
+        current.append(group)
+        filled += size
+        if filled >= budget:
+            chunks.append(current)
+            current, filled = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Per-worker state set up once by _init_worker(): (shm, graph, nodes, cfg)
+_WORKER: tuple | None = None
+
+
+def _init_worker(handle: tuple, names: list, highways: list, cfg: dict):
+    global _WORKER
+    shm, arrays = attach(handle)
+    graph = RoadGraph.from_arrays({f: arrays[f"graph.{f}"] for f in RoadGraph.ARRAY_FIELDS},
+                                  names, highways)
+    nodes = NodeStore.from_sorted(arrays["nodes.ids"], arrays["nodes.lats"],
+                                  arrays["nodes.lons"])
+    _WORKER = (shm, graph, nodes, cfg)
+
+
+def _process_chunk(groups: list) -> tuple:
+    _shm, graph, nodes, cfg = _WORKER
+    stats = StageStats()
+    return (*_process_groups(groups, graph, nodes, cfg, stats), stats.records)
+
+
+def _process_parallel(groups: list, graph: RoadGraph, nodes: NodeStore, cfg: dict,
+                      workers: int, stats: StageStats):
+    """
+    Run _process_groups() over a process pool.  Node and topology arrays are
+    published once in shared memory; each task only pickles its group list.
+    Chunk results are yielded in chunk order, so output matches a serial run.
+    The workers' stage figures are merged into ``stats``.
+    """
+    chunks = _chunk_groups(groups, graph, workers * 4)
+    shared = {f"graph.{k}": v for k, v in graph.arrays().items()}
+    shared.update({f"nodes.{k}": v for k, v in nodes.arrays().items()})
+    block = SharedArrays(shared)
+    log(f"Processing {len(groups)} name groups in {len(chunks)} chunks "
+        f"across {workers} workers...")
+    try:
+        # forkserver rather than fork: build_pipeline.py runs this stage on a
+        # scheduler thread, and forking a multi-threaded process can deadlock
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(block.handle, graph.names, graph.highways, cfg),
+                                 mp_context=multiprocessing.get_context("forkserver")) as pool:
+            for roads, issues, counts, records in pool.map(_process_chunk, chunks):
+                stats.merge(records)
+                yield roads, issues, counts
+    finally:
+        block.close()
+
+
+# Serial runs are still processed in chunks so that only a fraction of the
+# output is held in memory before it is streamed to the writer.
+_SERIAL_CHUNKS = 16
+
+
+def _run_groups(groups: list, graph: RoadGraph, nodes: NodeStore, cfg: dict, workers: int,
+                stats: StageStats | None = None):
+    """Yield (roads, merge issues, merged ways) for each group, in group order."""
+    stats = stats if stats is not None else StageStats()
+    if workers > 1 and len(groups) > 1:
+        chunk_results = _process_parallel(groups, graph, nodes, cfg, workers, stats)
+    else:
+        chunk_results = (_process_groups(chunk, graph, nodes, cfg, stats)
+                         for chunk in _chunk_groups(groups, graph, _SERIAL_CHUNKS))
+    for roads, issues, counts in chunk_results:
+        road_pos = issue_pos = 0
+        for n_roads, n_issues, merged in counts:
+            yield (roads[road_pos:road_pos + n_roads],
+                   issues[issue_pos:issue_pos + n_issues], merged)
+            road_pos += n_roads
+            issue_pos += n_issues
+
+
+def _incremental(groups: list, graph: RoadGraph, nodes: NodeStore, cfg: dict,
+                 workers: int, state: IncrementalState, output_dir: Path,
+                 affected: set | None = None, stats: StageStats | None = None):
+    """
+    Recompute only the groups whose fingerprint changed since the last run;
+    reuse the previous output of every other group.  Per-group results are
+    yielded in group order, exactly as a full rebuild would produce them.
+
+    ``affected`` (names known to have changed, e.g. from an OSM diff) limits
+    fingerprinting to those groups; every other group keeps its previous
+    fingerprint and output.
+    """
+    stats = stats if stats is not None else StageStats()
+    reason = state.load(datamanifest.resolve(output_dir, "roads_optimized.jsonl"),
+                        cfg["segments"])
+    if reason:
+        log(f"Incremental: rebuilding every road ({reason})")
+
+    carried = [None if affected is None or name in affected else state.fingerprint(name)
+               for name, _ in groups]
+    check = [group for group, fp in zip(groups, carried) if fp is None]
+    with stats.stage("fingerprint") as st:
+        computed = iter(group_fingerprints(check, graph, nodes, cfg["segments"]))
+        st.count(groups=len(check))
+    fingerprints = [fp if fp is not None else next(computed) for fp in carried]
+
+    reused = [state.reusable(name, fp) for (name, _), fp in zip(groups, fingerprints)]
+    stale = [group for group, prev in zip(groups, reused) if prev is None]
+    log(f"Incremental: {len(groups) - len(stale)} name groups unchanged, "
+        f"{len(stale)} to rebuild")
+
+    fresh = _run_groups(stale, graph, nodes, cfg, workers, stats)
+    for (name, _), fp, prev in zip(groups, fingerprints, reused):
+        result = prev if prev is not None else next(fresh)
+        state.record(name, fp, *result)
+        yield result
+
+
+def process(cfg: dict, road_data: RoadData, output_dir: Path, merge_issues: list,
+            workers: int = 1, state: IncrementalState | None = None,
+            verify_full: bool = False, affected: set | None = None,
+            stats: StageStats | None = None):
+    """
+    Merge, segment and simplify every named road, yielding the output records
+    in order.  Merge issues are appended to ``merge_issues`` as their groups
+    complete, so the list is final once the generator is exhausted.
 
+    With ``state``, only the name groups whose inputs changed are recomputed
+    (only those named in ``affected``, if given); ``verify_full`` then also
+    runs a full rebuild and exits with an error if the two differ.
 
-def write_outputs(optimized: list, merge_issues: list, osm_ts: str,
-                  data_source: str, output_dir: Path, cfg: dict):
+    Each step is timed as a stage of ``stats``; whatever is left between them
+    (bookkeeping, waiting for worker processes) counts as "process".
+    """
+    stats = stats if stats is not None else StageStats()
+    nodes = road_data.nodes
+    ways  = road_data.ways
+
+    log(f"Processing {len(ways)} named ways ({len(nodes)} nodes, "
+        f"{nodes.nbytes // 1024 // 1024} MB node store)...")
+
+    # Node/way topology shared by merging and intersection detection
+    with stats.stage("index") as st:
+        graph = RoadGraph(ways)
+        groups = graph.groups()
+        intersections = int((graph.node_names >= 2).sum())
+        st.count(ways=len(ways), names=len(graph.names), nodes=len(graph.node_ids),
+                 intersections=intersections)
+    log(f"Road graph: {len(graph.names)} names, {len(graph.node_ids)} referenced nodes, "
+        f"{intersections} intersections")
+
+    verify = state is not None and verify_full
+    if state is not None:
+        results = _incremental(groups, graph, nodes, cfg, workers, state, output_dir, affected,
+                               stats)
+    else:
+        results = _run_groups(groups, graph, nodes, cfg, workers, stats)
+
+    merged_count, issue_start, produced = 0, len(merge_issues), []
+    for roads, issues, merged in stats.iterate("process", results):
+        merged_count += merged
+        merge_issues.extend(issues)
+        if verify:
+            produced.append(dumps(roads))
+        yield from roads
+
+    log(f"After merging: {merged_count} road features")
+
+    if verify:
+        log("Verifying incremental result against a full rebuild...")
+        full_issues, mismatched = [], []
+        with stats.stage("verify"):
+            full = _run_groups(groups, graph, nodes, cfg, workers)
+            for (name, _), ours, (roads, issues, _merged) in zip(groups, produced, full):
+                full_issues.extend(issues)
+                if ours != dumps(roads):
+                    mismatched.append(name)
+        if mismatched or merge_issues[issue_start:] != full_issues:
+            log(f"ERROR: Incremental output differs from a full rebuild "
+                f"(first mismatched roads: {mismatched[:5]})")
+            sys.exit(1)
+        log("Incremental output matches a full rebuild")
+
+    nodes.close()
+
+
+def write_outputs(roads, merge_issues: list, osm_ts: str,
+                  data_source: str, output_dir: Path, cfg: dict,
+                  coord_precision: int = DEFAULT_PRECISION,
+                  stats: StageStats | None = None) -> int:
+    """
+    Stream road records into roads_optimized.json and .jsonl (each with
+    .gz/.br siblings), serialising every road once, index the .jsonl lines
+    in roads_optimized.idx, write the roads_overview.json first-paint level,
+    and encode the records into roads_optimized.bin with ``coord_precision``
+    decimal places, the roads_overlay.pmtiles vector tiles and the
+    roads.sqlite catalog.  The road data files are committed under hashed
+    names and listed in data-manifest.json.  Then write merge_issues.csv and
+    rebuild_metadata.json.  ``roads`` may be a generator such as process();
+    ``merge_issues`` is read once it is exhausted.  The roads and bytes
+    written are counted in the "write" stage of ``stats``.  Returns the number
+    of roads written.
+
+    Records are not kept: the text outputs, the index entries, the catalog
+    and the overview (in OverviewWriter batches) are written as they
+    arrive.  Two products are held until the stream ends because they are
+    laid out from every road at once: RoadBinWriter's columns, 8 bytes per
+    stored vertex and 12 per segment (the size of the .bin itself), and
+    RoadTiler's Mercator lines, 16 bytes per road and segment vertex plus
+    about 350 bytes per road and per segment for the array and properties.
+    """
+    stats = stats if stats is not None else StageStats()
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # roads_optimized.json
-    full_json = {
+    # roads_optimized.json / roads_optimized.jsonl
+    head = {
         "version": 0.6,
         "generator": "StormPath rebuild_roads.py",
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "elements": optimized,
     }
-    (output_dir / "roads_optimized.json").write_text(json.dumps(full_json))
-    log(f"Wrote roads_optimized.json ({len(optimized)} roads)")
-
-    # roads_optimized.jsonl
-    jsonl_path = output_dir / "roads_optimized.jsonl"
-    with jsonl_path.open("w") as f:
-        for road in optimized:
-            f.write(json.dumps(road) + "\n")
-    log(f"Wrote roads_optimized.jsonl")
+    json_out = OutputFile(output_dir / "roads_optimized.json", hashed=True)
+    jsonl_out = OutputFile(output_dir / "roads_optimized.jsonl", hashed=True)
+    bin_out = OutputFile(output_dir / "roads_optimized.bin", hashed=True)
+    idx_out = OutputFile(output_dir / "roads_optimized.idx", precompress=False, hashed=True)
+    overview_out = OutputFile(output_dir / "roads_overview.json", hashed=True)
+    # roads_overview.json — small enough to fetch and draw in one round trip
+    tolerance = cfg["segments"].get("overview_tolerance", OVERVIEW_TOLERANCE)
+    overview = OverviewWriter(overview_out, head, tolerance)
+    detail_vertices = 0
+    index = RoadIndexWriter()
+    jsonl_offset = 0
+    binary = RoadBinWriter(coord_precision)
+    tiler = RoadTiler()
+    catalog = RoadCatalogWriter(output_dir / "roads.sqlite")
+    road_ids = set()
+    road_count = 0
+    log(f"Streaming roads to {output_dir} (JSON backend: {JSON_BACKEND})...")
+    try:
+        json_out.write(open_array(head, "elements"))
+        for road in roads:
+            data = dumps(road)
+            json_out.write(ITEM_SEPARATOR + data if road_count else data)
+            jsonl_out.write(data + b"\n")
+            index.add(road, jsonl_offset, len(data))
+            jsonl_offset += len(data) + 1
+            binary.add(road)
+            tiler.add(road)
+            catalog.add(road)
+            overview.add(road)
+            detail_vertices += len(road["geometry"]) + sum(
+                len(seg["geometry"]) for seg in road.get("segments") or ())
+            road_ids.add(road["id"])
+            road_count += 1
+        json_out.write(b"]}")
+        bin_out.write(binary.tobytes())
+        idx_out.write(index.tobytes())
+        overview.finish()
+
+        # roads_overlay.pmtiles — read back and checked before anything is committed
+        overlay = output_dir / "roads_overlay.pmtiles"
+        placed = tiler.write(overlay)
+        problems = verify_overlay(overlay, placed, road_ids)
+        if problems:
+            for problem in problems[:10]:
+                log(f"ERROR: roads_overlay.pmtiles: {problem}")
+            overlay.unlink(missing_ok=True)
+            sys.exit(1)
+        log(f"Wrote roads_overlay.pmtiles ({overlay.stat().st_size // 1024} KB, "
+            f"zooms {min(placed)}–{max(placed)}, verified)")
+    except BaseException:
+        for out in (json_out, jsonl_out, bin_out, idx_out, overview_out, catalog):
+            out.abort()
+        raise
+    committed = []
+    for out in (json_out, jsonl_out, bin_out, idx_out, overview_out):
+        sizes = out.commit()
+        committed.append((out, sizes))
+        log(f"Wrote {out.path.name} ({road_count} roads; "
+            + ", ".join(f"{p.name} {n // 1024} KB" for p, n in sizes.items()) + ")")
+    datamanifest.write(output_dir, committed)
+    log(f"Wrote {datamanifest.MANIFEST_NAME}")
+    catalog_size = catalog.commit()
+    log(f"Wrote roads.sqlite ({catalog_size // 1024} KB)")
+    stats.count("write", roads=road_count, vertices=detail_vertices,
+                bytes=sum(n for _out, sizes in committed for n in sizes.values())
+                + catalog_size + overlay.stat().st_size)
+    levels = overview.levels
+    log(f"Levels: overview {levels['major'][0]} major roads ({levels['major'][1]} vertices) "
+        f"+ {levels['coarse'][0]} coarse roads ({levels['coarse'][1]} vertices, "
+        f"tolerance {tolerance}); detail {road_count} roads ({detail_vertices} vertices "
+        f"incl. segments)")
 
     # merge_issues.csv
     issues_csv = output_dir / "merge_issues.csv"
@@ -499,13 +1228,21 @@ def write_outputs(optimized: list, merge_issues: list, osm_ts: str,
     elif issues_csv.exists():
         issues_csv.unlink()
 
-    # rebuild_metadata.json — baked into the image, copied to the data volume
-    # by entrypoint.sh on every container start, then written to the metadata
-    # SQLite table so admin.php and api.php can read it.
+    write_metadata(output_dir, road_count, len(merge_issues), data_source, osm_ts)
+    return road_count
+
+
+def write_metadata(output_dir: Path, road_count: int, merge_issues_count: int,
+                   data_source: str, osm_ts: str):
+    """
+    rebuild_metadata.json — baked into the image, copied to the data volume
+    by entrypoint.sh on every container start, then written to the metadata
+    SQLite table so admin.php and api.php can read it.
+    """
     metadata = {
         "last_rebuild":       datetime.now(timezone.utc).isoformat(),
-        "road_count":         len(optimized),
-        "merge_issues_count": len(merge_issues),
+        "road_count":         road_count,
+        "merge_issues_count": merge_issues_count,
         "data_source":        data_source,
         "osm_timestamp":      osm_ts,
     }
@@ -513,6 +1250,124 @@ def write_outputs(optimized: list, merge_issues: list, osm_ts: str,
     log("Wrote rebuild_metadata.json")
 
 
+# ── Build cache ───────────────────────────────────────────────────────────────
+
+# Modules whose code decides what the road outputs contain
+ROADS_CODE = ("rebuild_roads", "datamanifest", "geodesy", "jsonstream", "mvt", "pmtiles",
+              "roadbin", "roadcatalog", "roadgraph", "roadindex", "roadtiles")
+
+
+def source_digest(road_data: RoadData) -> str:
+    """SHA-256 of the named ways and node coordinates in ``road_data``."""
+    h = hashlib.sha256()
+    nodes = road_data.nodes
+    for arr in (nodes.ids, nodes.lats, nodes.lons):
+        h.update(np.ascontiguousarray(arr).tobytes())
+    for way in road_data.ways:
+        h.update(dumps(way))
+    return h.hexdigest()
+
+
+def roads_cache_key(cfg: dict, road_data: RoadData, coord_precision: int) -> str:
+    """
+    The "roads" stage key: the road data itself, the config the outputs
+    depend on, the code that writes them and the libraries whose choice or
+    version changes the bytes written: the JSON backend (orjson and json
+    space the output differently), whether brotli is there for the .br
+    siblings, and shapely/pyproj, which simplify and measure the geometry.
+    OSM timestamps are left out, since Overpass advances them every minute
+    whether or not the roads change.
+    """
+    return StageCache.key("roads", source=source_digest(road_data),
+                          relation=cfg["area"]["osm_relation_id"],
+                          road_types=cfg["data"]["road_types"],
+                          segments=cfg["segments"], coord_precision=coord_precision,
+                          code=code_version(*ROADS_CODE), json_backend=JSON_BACKEND,
+                          precompress=PRECOMPRESS_SUFFIXES, shapely=shapely.__version__,
+                          pyproj=pyproj.__version__)
+
+
+def _roads_artifacts(output_dir: Path, state: IncrementalState | None) -> dict:
+    """The files write_outputs() left in ``output_dir``, manifest last."""
+    files = {name: output_dir / name
+             for name in datamanifest.files_of(datamanifest.load(output_dir))}
+    for name in ("roads.sqlite", "roads_overlay.pmtiles", "merge_issues.csv"):
+        if (output_dir / name).exists():
+            files[name] = output_dir / name
+    if state is not None and state.path.exists():
+        files["rebuild_state.json"] = state.path
+    files[datamanifest.MANIFEST_NAME] = output_dir / datamanifest.MANIFEST_NAME
+    return files
+
+
+def _restore_roads(entry, output_dir: Path, state: IncrementalState | None):
+    targets = {}
+    if state is not None:
+        targets["rebuild_state.json"] = state.path
+        if "rebuild_state.json" not in entry.files:
+            state.path.unlink(missing_ok=True)
+    for name in entry.files:
+        if name == "rebuild_state.json" and state is None:
+            continue
+        entry.restore(name, targets.get(name, output_dir / name))
+    if "merge_issues.csv" not in entry.files:
+        (output_dir / "merge_issues.csv").unlink(missing_ok=True)
+    datamanifest.prune(output_dir, datamanifest.load(output_dir))
+
+
+def build_outputs(cfg: dict, road_data: RoadData, data_source: str, output_dir: Path,
+                workers: int = 1, state: IncrementalState | None = None,
+                verify_full: bool = False, affected: set | None = None,
+                coord_precision: int = DEFAULT_PRECISION, cache: StageCache | None = None,
+                stats: StageStats | None = None) -> int:
+    """
+    process() and write_outputs() (and the incremental state), unless
+    ``cache`` holds the outputs of an earlier build with the same
+    roads_cache_key(): then those are restored and only rebuild_metadata.json
+    is written afresh.  Misses are added to the cache.  Returns the number of
+    roads written.
+    """
+    stats = stats if stats is not None else StageStats()
+    key = None
+    if cache is not None and not verify_full:
+        with stats.stage("cache") as st:
+            key = roads_cache_key(cfg, road_data, coord_precision)
+            entry = cache.lookup("roads", key)
+            if entry is not None:
+                try:
+                    _restore_roads(entry, output_dir, state)
+                except (OSError, ValueError) as exc:
+                    log(f"WARNING: Could not restore cached roads ({exc}) — rebuilding")
+                    cache.drop("roads", key)
+                    entry = None
+            st.count(hits=int(entry is not None), misses=int(entry is None))
+        if entry is not None:
+            road_data.nodes.close()
+            log(f"Build cache hit ({key[:12]}): road data, settings and code unchanged — "
+                f"restored {entry.meta['road_count']} roads without processing")
+            write_metadata(output_dir, entry.meta["road_count"],
+                           entry.meta["merge_issues_count"], data_source,
+                           road_data.osm_timestamp)
+            return entry.meta["road_count"]
+
+    merge_issues = []
+    roads = process(cfg, road_data, output_dir, merge_issues, workers=workers, state=state,
+                    verify_full=verify_full, affected=affected, stats=stats)
+    with stats.stage("write"):
+        road_count = write_outputs(roads, merge_issues, road_data.osm_timestamp, data_source,
+                                   output_dir, cfg, coord_precision=coord_precision,
+                                   stats=stats)
+        if state is not None:
+            state.save(datamanifest.resolve(output_dir, "roads_optimized.jsonl"))
+    if key is not None:
+        with stats.stage("cache") as st:
+            st.count(bytes=cache.store("roads", key, _roads_artifacts(output_dir, state),
+                                       meta={"road_count": road_count,
+                                             "merge_issues_count": len(merge_issues)}))
+        log(f"Stored the road outputs in the build cache ({key[:12]})")
+    return road_count
+
+
 def fetch_boundary(cfg: dict, output_dir: Path):
     """
     Fetch the area boundary polygon from the Overpass API and write
@@ -563,21 +1418,37 @@ out geom;"""
             log("WARNING: Could not assemble boundary polygon — outline will be absent")
             return
 
-        # Use the largest polygon (county outline)
-        polygon = max(polygons, key=lambda p: p.area)
-        geojson = {
-            "type": "FeatureCollection",
-            "features": [{"type": "Feature", "geometry": mapping(polygon), "properties": {}}],
-        }
-
-        boundary_path = output_dir / "area_boundary_geojson.json"
-        boundary_path.write_text(json.dumps(geojson))
-        log(f"Wrote area_boundary_geojson.json")
+        write_boundary(polygons, output_dir)
 
     except Exception as exc:
         log(f"WARNING: Could not fetch area boundary: {exc} — outline will be absent")
 
 
+def write_boundary(polygons: list, output_dir: Path):
+    """Write the largest polygon (county outline) as area_boundary_geojson.json."""
+    polygon = max(polygons, key=lambda p: p.area)
+    geojson = {
+        "type": "FeatureCollection",
+        "features": [{"type": "Feature", "geometry": mapping(polygon), "properties": {}}],
+    }
+
+    boundary_path = output_dir / "area_boundary_geojson.json"
+    boundary_path.write_text(json.dumps(geojson))
+    log(f"Wrote area_boundary_geojson.json")
+
+
+def log_stages(stats: StageStats):
+    """Log one line per stage of ``stats``."""
+    for name, stage in stats.report().items():
+        log(f"Stage {name}: {stage['wall_s']:.1f} s wall, {stage['cpu_s']:.1f} s CPU, "
+            f"peak RSS {stage['peak_rss_mb']:.0f} MB"
+            + (f", traced peak {stage['traced_peak_mb']:.0f} MB"
+               if "traced_peak_mb" in stage else "")
+            + "".join(f", {n:,} {k}" for k, n in stage["counts"].items()))
+    if stats.profile_dir is not None:
+        log(f"Wrote per-stage profiles to {stats.profile_dir}/")
+
+
 def main():
     parser = argparse.ArgumentParser(description="StormPath road data rebuild script")
     parser.add_argument("config", help="Path to area config.yaml")
@@ -585,8 +1456,56 @@ def main():
                         help="Output directory (default: build-output/data)")
     parser.add_argument("--cache-dir", default=None,
                         help="Directory for raw API cache (default: same as --output)")
+    parser.add_argument("--spill-dir", default=None,
+                        help="Keep node coordinates in memory-mapped files in this "
+                             "directory instead of RAM (for very large areas)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Process road name groups across N worker processes "
+                             "(default: 1, no pool). Output is identical to a serial run.")
+    parser.add_argument("--source", choices=("overpass", "pbf"), default="overpass",
+                        help="Read roads from the Overpass API (default) or from the "
+                             "Geofabrik .osm.pbf extract in --pbf-cache-dir")
+    parser.add_argument("--pbf-cache-dir", default="/tmp/geofabrik-cache",
+                        help="Geofabrik PBF cache shared with update_pmtiles.py "
+                             "(default: /tmp/geofabrik-cache)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Recompute only roads whose ways, nodes, intersections or "
+                             "segment settings changed; reuse the rest of the previous "
+                             "roads_optimized.jsonl (state kept in the cache directory)")
+    parser.add_argument("--verify-full", action="store_true",
+                        help="With --incremental, also run a full rebuild and fail if the "
+                             "outputs differ")
+    parser.add_argument("--update", action="store_true",
+                        help="Apply OSM replication diffs to the local element store instead "
+                             "of refetching the area; implies --incremental. Falls back to "
+                             "a full fetch when the store cannot be brought up to date")
+    parser.add_argument("--replication", default=None,
+                        help="Replication feed URL or local directory for --update (default: "
+                             "data.replication_url, else the Geofabrik -updates directory)")
+    parser.add_argument("--tile-grid", type=int, default=1,
+                        help="Split the area's bounding box into an N x N grid and fetch "
+                             "the tiles concurrently (default: 1, a single query)")
+    parser.add_argument("--max-connections", type=int, default=4,
+                        help="Concurrent Overpass requests for --tile-grid (default: 4)")
+    parser.add_argument("--coord-precision", type=int, default=DEFAULT_PRECISION,
+                        help="Decimal places kept for coordinates in roads_optimized.bin "
+                             f"(0–{MAX_PRECISION}, default: {DEFAULT_PRECISION})")
+    parser.add_argument("--build-cache", default=None, metavar="DIR",
+                        help="Content-addressed cache of road outputs shared with "
+                             "update_pmtiles.py: restore instead of processing when the road "
+                             "data, settings and code are unchanged (see stagecache.py)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record each stage's peak Python/NumPy allocation with "
+                             "tracemalloc (slows the run down)")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="DIR",
+                        help="Run each stage under cProfile and write <stage>.pstats and "
+                             "<stage>.txt to DIR (default: ./profile)")
     args = parser.parse_args()
 
+    if not 0 <= args.coord_precision <= MAX_PRECISION:
+        log(f"ERROR: --coord-precision must be between 0 and {MAX_PRECISION}")
+        sys.exit(1)
+
     config_path = Path(args.config)
     if not config_path.exists():
         log(f"ERROR: Config not found: {config_path}")
@@ -600,15 +1519,59 @@ def main():
     cache_file = cache_dir / "roads.json"
 
     log("Starting road data rebuild...")
-    raw_data = fetch_overpass(cfg, cache_file)
-
-    data_source = "Overpass API (live)"
-    optimized, merge_issues, osm_ts = process(cfg, raw_data, output_dir)
-
-    write_outputs(optimized, merge_issues, osm_ts, data_source, output_dir, cfg)
-    fetch_boundary(cfg, output_dir)
+    stats = StageStats(trace_memory=args.trace_memory, profile_dir=args.profile)
+    spill_dir = Path(args.spill_dir) if args.spill_dir else None
+    boundary_polygons = []
+    road_data, affected, store = None, None, None
+    if args.update:
+        store = ElementStore(cache_dir / "osm_elements.sqlite")
+        feed = args.replication or replication_url(cfg)
+        with stats.stage("fetch"):
+            updated = update_from_diffs(cfg, store, ReplicationSource(feed), output_dir,
+                                        spill_dir=spill_dir)
+        if updated is not None:
+            road_data, affected = updated
+            write_cache(road_data, cache_file, generator="StormPath element store")
+            data_source = "OSM replication diffs"
+
+    if road_data is None:
+        if args.source == "pbf":
+            road_data, boundary_polygons, pbf_name = load_pbf(
+                cfg, Path(args.pbf_cache_dir), output_dir, workers=args.workers,
+                spill_dir=spill_dir, stats=stats)
+            data_source = f"Geofabrik PBF ({pbf_name})"
+        else:
+            with stats.stage("fetch"):
+                road_data = fetch_overpass(cfg, cache_file, spill_dir=spill_dir,
+                                           tile_grid=args.tile_grid,
+                                           max_connections=args.max_connections,
+                                           stats=stats)
+            data_source = "Overpass API (live)"
+        if store is not None:
+            with stats.stage("fetch"):
+                store.replace(road_data)
+    stats.count("parse", elements=road_data.element_count, ways=len(road_data.ways),
+                nodes=len(road_data.nodes))
+
+    use_state = args.incremental or args.update
+    state = IncrementalState(cache_dir / "rebuild_state.json") if use_state else None
+    cache = StageCache(Path(args.build_cache)) if args.build_cache else None
+    road_count = build_outputs(cfg, road_data, data_source, output_dir, workers=args.workers,
+                             state=state, verify_full=args.verify_full, affected=affected,
+                             coord_precision=args.coord_precision, cache=cache, stats=stats)
+    if store is not None:
+        # Only now that the outputs match the store may it move forward
+        store.commit()
+        store.close()
+    with stats.stage("boundary"):
+        if boundary_polygons:
+            write_boundary(boundary_polygons, output_dir)
+        else:
+            fetch_boundary(cfg, output_dir)
 
-    log(f"Rebuild complete — {len(optimized)} roads written")
+    stats.save(output_dir / "rebuild_metadata.json")
+    log_stages(stats)
+    log(f"Rebuild complete — {road_count} roads written")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,205 @@
+"""
+roadbin.py — Compact binary encoding of the road output (roads_optimized.bin).
+
+The JSON outputs spell every coordinate as a 15–17 digit float and repeat
+each segment's vertices next to the road's.  This format stores the same
+records as columnar typed arrays the browser can map without parsing
+(app/js/roadbin.js):
+
+    header       32 bytes  "SPRB", version u16, precision u16, then u32 counts:
+                           roads, segments, vertices, strings, string bytes,
+                           reserved
+    road_id      f64[roads]       OSM way id (exact up to 2^53)
+    road_name    u32[roads]       index into the string table
+    road_type    u32[roads]       index into the string table
+    road_highway u32[roads]       index into the string table of tags.highway,
+                                  "" if the road has none
+    road_start   u32[roads]       first vertex of the road geometry
+    road_count   u32[roads]       vertices in the road geometry
+    road_seg     u32[roads + 1]   road i owns segments road_seg[i]:road_seg[i+1]
+    seg_desc     u32[segments]    index into the string table
+    seg_start    u32[segments]    first vertex of the segment geometry
+    seg_count    u32[segments]    vertices in the segment geometry
+    lat, lon     i32[vertices]    fixed-point degrees × 10^precision, each
+                                  stored as the difference from the previous
+                                  vertex in the buffer (wrapping int32)
+    string_ptr   u32[strings + 1] byte offsets into the string data
+    strings      UTF-8 bytes
+
+All values are little-endian.  There is one shared vertex buffer, and a
+geometry is any start/count range of it.  A segment that is a contiguous
+run of its road's vertices points into the road's range.  Roads and
+segments are simplified separately, so most segments are not; they are
+stored after their road, and since consecutive segments meet at a
+junction, each one starts on the vertex the previous one ended with.
+Segment ids are not stored; they are always "<road id>-<n>", n counting
+from 1.
+"""
+
+import struct
+from array import array
+
+import numpy as np
+
+MAGIC = b"SPRB"
+VERSION = 2
+_HEADER = struct.Struct("<4sHH6I")
+
+# 6 decimal places is ~0.1 m — far below simplify_tolerance.  7 is the
+# precision OSM itself stores, i.e. lossless; int32 cannot hold more.
+DEFAULT_PRECISION = 6
+MAX_PRECISION = 7
+
+
+class RoadBinWriter:
+    """Accumulates road records (as written to roads_optimized.jsonl)."""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        if not 0 <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be 0–{MAX_PRECISION}, got {precision}")
+        self.precision = precision
+        self._scale = 10 ** precision
+        self._strings: dict = {}
+        self._road_id = array("d")
+        self._road_name = array("I")
+        self._road_type = array("I")
+        self._road_highway = array("I")
+        self._road_start = array("I")
+        self._road_count = array("I")
+        self._road_seg = array("I", [0])
+        self._seg_desc = array("I")
+        self._seg_start = array("I")
+        self._seg_count = array("I")
+        self._lat = array("i")
+        self._lon = array("i")
+
+    def _string(self, text: str) -> int:
+        return self._strings.setdefault(text, len(self._strings))
+
+    def _quantise(self, coords: list) -> list:
+        if not coords:
+            return []
+        fixed = np.rint(np.asarray(coords, dtype=np.float64) * self._scale).astype(np.int64)
+        return list(map(tuple, fixed.tolist()))
+
+    def _append(self, points: list) -> int:
+        """
+        Append ``points`` and return where they start.  A first point equal to
+        the last vertex in the buffer reuses that vertex.
+        """
+        start = len(self._lat)
+        if points and start and (self._lat[-1], self._lon[-1]) == points[0]:
+            start -= 1
+            points = points[1:]
+        self._lat.extend(p[0] for p in points)
+        self._lon.extend(p[1] for p in points)
+        return start
+
+    def add(self, road: dict):
+        points = self._quantise(road["geometry"])
+        start = self._append(points)
+        self._road_id.append(road["id"])
+        self._road_name.append(self._string(road["tags"].get("name", "")))
+        self._road_type.append(self._string(road.get("type", "way")))
+        self._road_highway.append(self._string(road["tags"].get("highway", "")))
+        self._road_start.append(start)
+        self._road_count.append(len(points))
+
+        # A segment that is a run of the road's vertices points into the
+        # road's range; any other is appended, sharing its first vertex
+        # with the previous segment's last where they meet
+        positions: dict = {}
+        for i, p in enumerate(points):
+            positions.setdefault(p, []).append(i)
+        for seg in road.get("segments") or ():
+            seg_points = self._quantise(seg["geometry"])
+            n = len(seg_points)
+            pos = None
+            if seg_points:
+                pos = next((i for i in positions.get(seg_points[0], ())
+                            if points[i:i + n] == seg_points), None)
+            self._seg_desc.append(self._string(seg.get("description", "")))
+            self._seg_start.append(start + pos if pos is not None else self._append(seg_points))
+            self._seg_count.append(n)
+        self._road_seg.append(len(self._seg_desc))
+
+    def __len__(self) -> int:
+        return len(self._road_id)
+
+    def tobytes(self) -> bytes:
+        """The complete file."""
+        encoded = [s.encode() for s in self._strings]
+        string_ptr = np.zeros(len(encoded) + 1, dtype="<u4")
+        np.cumsum([len(b) for b in encoded], out=string_ptr[1:])
+        string_data = b"".join(encoded)
+
+        def deltas(values: array) -> bytes:
+            v = np.frombuffer(values, dtype=np.int32)
+            return np.diff(v, prepend=np.int32(0)).astype("<i4").tobytes()
+
+        header = _HEADER.pack(MAGIC, VERSION, self.precision, len(self._road_id),
+                              len(self._seg_desc), len(self._lat), len(encoded),
+                              len(string_data), 0)
+        columns = [self._road_id, self._road_name, self._road_type, self._road_highway,
+                   self._road_start, self._road_count, self._road_seg, self._seg_desc,
+                   self._seg_start, self._seg_count]
+        return b"".join([header]
+                        + [np.frombuffer(c, dtype=c.typecode).astype("<" + c.typecode).tobytes()
+                           for c in columns]
+                        + [deltas(self._lat), deltas(self._lon),
+                           string_ptr.tobytes(), string_data])
+
+
+def decode(data: bytes) -> list:
+    """
+    Rebuild the road records from roads_optimized.bin, with coordinates
+    rounded to the stored precision.
+    """
+    magic, version, precision, n_roads, n_segs, n_verts, n_strings, n_bytes, _ = \
+        _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a roads_optimized.bin file")
+    if version != VERSION:
+        raise ValueError(f"unsupported roads_optimized.bin version {version}")
+
+    offset = _HEADER.size
+
+    def take(dtype: str, count: int) -> np.ndarray:
+        nonlocal offset
+        values = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += values.nbytes
+        return values
+
+    road_id = take("<f8", n_roads)
+    road_name, road_type, road_highway = (take("<u4", n_roads) for _ in range(3))
+    road_start, road_count = take("<u4", n_roads), take("<u4", n_roads)
+    road_seg = take("<u4", n_roads + 1)
+    seg_desc, seg_start, seg_count = (take("<u4", n_segs) for _ in range(3))
+    scale = 10 ** precision
+    lats = (np.cumsum(take("<i4", n_verts), dtype=np.int32) / scale).tolist()
+    lons = (np.cumsum(take("<i4", n_verts), dtype=np.int32) / scale).tolist()
+    string_ptr = take("<u4", n_strings + 1).tolist()
+    blob = data[offset:offset + n_bytes]
+    strings = [blob[a:b].decode() for a, b in zip(string_ptr, string_ptr[1:])]
+
+    def geometry(start: int, count: int) -> list:
+        return [[lats[i], lons[i]] for i in range(start, start + count)]
+
+    roads = []
+    for r in range(n_roads):
+        rid = int(road_id[r])
+        tags = {"name": strings[road_name[r]]}
+        if strings[road_highway[r]]:
+            tags["highway"] = strings[road_highway[r]]
+        roads.append({
+            "type": strings[road_type[r]],
+            "id": rid,
+            "tags": tags,
+            "geometry": geometry(int(road_start[r]), int(road_count[r])),
+            "segments": [{
+                "id": f"{rid}-{n}",
+                "description": strings[seg_desc[s]],
+                "geometry": geometry(int(seg_start[s]), int(seg_count[s])),
+            } for n, s in enumerate(range(road_seg[r], road_seg[r + 1]), start=1)],
+        })
+    return roads
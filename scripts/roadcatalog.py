@@ -0,0 +1,101 @@
+"""
+roadcatalog.py — SQLite road catalog with an R*Tree index (roads.sqlite).
+
+The image ships this next to reports.db so api.php can answer spatial and
+by-id questions without loading the JSON road file:
+
+    roads           id (OSM way id), name, type, geometry
+    segments        rowid, id ("<way id>-<n>"), road_id, seq (n), description,
+                    geometry
+    segments_rtree  R*Tree over segment bounding boxes, keyed by segments.rowid:
+                    min_lat, max_lat, min_lon, max_lon
+    meta            key/value: format version, road and segment counts
+
+Geometry blobs are packed little-endian float64 [lat, lon, lat, lon, ...] —
+exactly the coordinates in roads_optimized.jsonl (PHP: unpack('e*', $blob)).
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE roads    (id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL,
+                       geometry BLOB NOT NULL);
+CREATE TABLE segments (rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE,
+                       road_id INTEGER NOT NULL, seq INTEGER NOT NULL,
+                       description TEXT NOT NULL, geometry BLOB NOT NULL);
+CREATE INDEX idx_segments_road ON segments (road_id, seq);
+CREATE VIRTUAL TABLE segments_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE meta     (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def pack_geometry(coords: list) -> bytes:
+    """[[lat, lon], ...] → geometry blob."""
+    return np.asarray(coords, dtype="<f8").reshape(-1, 2).tobytes()
+
+
+def unpack_geometry(blob: bytes) -> list:
+    """Geometry blob → [[lat, lon], ...]."""
+    return np.frombuffer(blob, dtype="<f8").reshape(-1, 2).tolist()
+
+
+class RoadCatalogWriter:
+    """
+    Builds roads.sqlite from road records (as written to roads_optimized.jsonl)
+    in ``<path>.part``; commit() moves it into place, abort() discards it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._part = path.with_name(path.name + ".part")
+        self._part.unlink(missing_ok=True)
+        self._db = sqlite3.connect(self._part)
+        # A throwaway build file: no journal, no fsyncs, one transaction
+        self._db.execute("PRAGMA journal_mode=OFF")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.executescript(_SCHEMA)
+        self._roads = 0
+        self._segments = 0
+
+    def add(self, road: dict):
+        self._db.execute("INSERT INTO roads VALUES (?, ?, ?, ?)",
+                         (road["id"], road["tags"].get("name", ""), road.get("type", "way"),
+                          pack_geometry(road["geometry"])))
+        self._roads += 1
+        for seq, seg in enumerate(road.get("segments") or (), start=1):
+            coords = np.asarray(seg["geometry"], dtype="<f8").reshape(-1, 2)
+            self._segments += 1
+            self._db.execute("INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?)",
+                             (self._segments, seg["id"], road["id"], seq,
+                              seg.get("description", ""), coords.tobytes()))
+            if len(coords):
+                lo, hi = coords.min(axis=0), coords.max(axis=0)
+                self._db.execute("INSERT INTO segments_rtree VALUES (?, ?, ?, ?, ?)",
+                                 (self._segments, float(lo[0]), float(hi[0]),
+                                  float(lo[1]), float(hi[1])))
+
+    def __len__(self) -> int:
+        return self._roads
+
+    def commit(self) -> int:
+        """Finish the database, move it into place and return its size in bytes."""
+        self._db.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format_version", str(FORMAT_VERSION)),
+            ("road_count", str(self._roads)),
+            ("segment_count", str(self._segments)),
+        ])
+        self._db.commit()
+        self._db.execute("PRAGMA optimize")
+        self._db.close()
+        os.replace(self._part, self.path)
+        return self.path.stat().st_size
+
+    def abort(self):
+        self._db.close()
+        self._part.unlink(missing_ok=True)
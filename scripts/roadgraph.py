@@ -0,0 +1,212 @@
+"""
+roadgraph.py — Shared topology model of the named road network.
+
+A RoadGraph is built once from the parsed OSM ways and answers every graph
+question the pipeline asks: which ways share a name, which ways touch a node,
+which nodes are intersections between differently-named roads, and which
+same-name ways meet end to end.
+
+Storage is array-based:
+    names          interned road names; ways refer to them by integer id
+    way_name       name id of each way
+    highways       interned highway tag values
+    way_highway    highway id of each way (-1 when untagged)
+    way_ptr        CSR offsets into way_node_ids (way → nodes, in way order)
+    node_ids       sorted unique ids of every referenced node
+    node_ptr       CSR offsets into node_way (node → ways, ascending way index)
+    node_names     number of distinct road names meeting at each node
+"""
+
+from itertools import chain
+
+import numpy as np
+
+
+class RoadGraph:
+    """Way/node incidence of a list of named OSM ways."""
+
+    # Array attributes that fully describe the graph (see arrays()/from_arrays())
+    ARRAY_FIELDS = ("way_ids", "way_name", "way_highway", "way_ptr", "way_node_ids",
+                    "node_ids", "node_ptr", "node_way", "node_names")
+
+    def __init__(self, ways: list):
+        self.ways = ways
+        n = len(ways)
+
+        # ── Interned names ────────────────────────────────────────────────────
+        self.names: list = []
+        self._name_ids: dict = {}
+        self.way_name = np.empty(n, dtype=np.int32)
+        for i, way in enumerate(ways):
+            self.way_name[i] = self.name_id(way["tags"]["name"], create=True)
+        self.way_ids = np.fromiter((w["id"] for w in ways), dtype=np.int64, count=n)
+        highway_ids: dict = {}
+        self.way_highway = np.full(n, -1, dtype=np.int32)
+        for i, way in enumerate(ways):
+            highway = way["tags"].get("highway")
+            if highway is not None:
+                self.way_highway[i] = highway_ids.setdefault(highway, len(highway_ids))
+        self.highways: list = list(highway_ids)
+
+        # ── Way → node CSR ────────────────────────────────────────────────────
+        lengths = np.fromiter((len(w.get("nodes", ())) for w in ways), dtype=np.int64, count=n)
+        self.way_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.way_ptr[1:])
+        self.way_node_ids = np.fromiter(chain.from_iterable(w.get("nodes", ()) for w in ways),
+                                        dtype=np.int64, count=int(self.way_ptr[-1]))
+        self._way_ends = self._endpoints()
+
+        # ── Node → way CSR ────────────────────────────────────────────────────
+        entry_way = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        order = np.lexsort((entry_way, self.way_node_ids))
+        ref_nodes, ref_ways = self.way_node_ids[order], entry_way[order]
+        # A way visiting the same node twice (loops) is listed once
+        keep = np.ones(len(ref_nodes), dtype=bool)
+        keep[1:] = (ref_nodes[1:] != ref_nodes[:-1]) | (ref_ways[1:] != ref_ways[:-1])
+        ref_nodes, ref_ways = ref_nodes[keep], ref_ways[keep]
+
+        self.node_ids, starts = np.unique(ref_nodes, return_index=True)
+        self.node_ptr = np.append(starts, len(ref_nodes)).astype(np.int64)
+        self.node_way = ref_ways
+
+        # Distinct names per node: count (node, name) pairs
+        ref_names = self.way_name[ref_ways]
+        by_name = np.lexsort((ref_names, ref_nodes))
+        new_name = np.ones(len(by_name), dtype=np.int64)
+        new_name[1:] = ((ref_nodes[by_name][1:] != ref_nodes[by_name][:-1])
+                        | (ref_names[by_name][1:] != ref_names[by_name][:-1]))
+        self.node_names = (np.add.reduceat(new_name, starts) if len(starts)
+                           else np.zeros(0, dtype=np.int64))
+
+    def _endpoints(self) -> list:
+        """(first, last) node of every way with two or more nodes, else None."""
+        return [
+            (int(self.way_node_ids[a]), int(self.way_node_ids[b - 1])) if b - a >= 2 else None
+            for a, b in zip(self.way_ptr[:-1].tolist(), self.way_ptr[1:].tolist())
+        ]
+
+    # ── Array export (for sharing with worker processes) ──────────────────────
+
+    def arrays(self) -> dict:
+        return {field: getattr(self, field) for field in self.ARRAY_FIELDS}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, names: list, highways: list) -> "RoadGraph":
+        """
+        Rebuild a graph from arrays()/names/highways without the source way
+        dicts.  ``ways[i]`` is then synthesised on access with only the name
+        and highway tags.
+        """
+        graph = cls.__new__(cls)
+        for field in cls.ARRAY_FIELDS:
+            setattr(graph, field, arrays[field])
+        graph.names = list(names)
+        graph.highways = list(highways)
+        graph._name_ids = {name: i for i, name in enumerate(graph.names)}
+        graph._way_ends = graph._endpoints()
+        graph.ways = _SynthesisedWays(graph)
+        return graph
+
+    # ── Names and groups ──────────────────────────────────────────────────────
+
+    def name_id(self, name: str, create: bool = False) -> int:
+        """Interned id of ``name`` (-1 if unknown and ``create`` is False)."""
+        nid = self._name_ids.get(name)
+        if nid is None:
+            if not create:
+                return -1
+            nid = len(self.names)
+            self.names.append(name)
+            self._name_ids[name] = nid
+        return nid
+
+    def groups(self) -> list:
+        """[(name, [way index, ...]), ...] in order of each name's first way."""
+        members: list = [[] for _ in self.names]
+        for i, name_id in enumerate(self.way_name.tolist()):
+            members[name_id].append(i)
+        return list(zip(self.names, members))
+
+    # ── Per-way queries ───────────────────────────────────────────────────────
+
+    def way_nodes(self, way_idx: int) -> np.ndarray:
+        return self.way_node_ids[self.way_ptr[way_idx]:self.way_ptr[way_idx + 1]]
+
+    def way_length(self, way_idx: int) -> int:
+        return int(self.way_ptr[way_idx + 1] - self.way_ptr[way_idx])
+
+    def endpoint_neighbours(self, way_idx: int) -> list:
+        """
+        Ways with the same name that share an endpoint with ``way_idx``,
+        in ascending way order.  Ways with fewer than two nodes never connect.
+        """
+        if self._way_ends[way_idx] is None:
+            return []
+        name = self.way_name[way_idx]
+        ends = set(self._way_ends[way_idx])
+        found = set()
+        for node in ends:
+            for j in self.ways_at(node).tolist():
+                other = self._way_ends[j]
+                if (j != way_idx and other is not None and self.way_name[j] == name
+                        and (other[0] in ends or other[1] in ends)):
+                    found.add(j)
+        return sorted(found)
+
+    # ── Per-node queries ──────────────────────────────────────────────────────
+
+    def _node_index(self, node_ids) -> np.ndarray:
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if not len(self.node_ids):
+            return np.full(node_ids.shape, -1, dtype=np.int64)
+        idx = np.searchsorted(self.node_ids, node_ids)
+        idx[idx >= len(self.node_ids)] = 0
+        return np.where(self.node_ids[idx] == node_ids, idx, -1)
+
+    def ways_at(self, node_id) -> np.ndarray:
+        """Indices of the ways passing through ``node_id`` (ascending)."""
+        k = int(self._node_index([node_id])[0])
+        if k < 0:
+            return self.node_way[:0]
+        return self.node_way[self.node_ptr[k]:self.node_ptr[k + 1]]
+
+    def intersection_mask(self, node_ids) -> np.ndarray:
+        """True where a node is shared by two or more differently-named roads."""
+        idx = self._node_index(node_ids)
+        if not len(self.node_ids):
+            return idx >= 0
+        return (idx >= 0) & (self.node_names[np.maximum(idx, 0)] >= 2)
+
+    def cross_names(self, node_id, road_name: str) -> list:
+        """
+        Names of the other roads meeting at ``node_id``, deduplicated and in
+        order of the first way carrying each name.
+        """
+        exclude = self.name_id(road_name)
+        seen = []
+        for name in self.way_name[self.ways_at(node_id)].tolist():
+            if name != exclude and name not in seen:
+                seen.append(name)
+        return [self.names[name] for name in seen]
+
+
+class _SynthesisedWays:
+    """Read-only list of way dicts rebuilt from a RoadGraph's arrays."""
+
+    def __init__(self, graph: RoadGraph):
+        self._graph = graph
+
+    def __len__(self) -> int:
+        return len(self._graph.way_ids)
+
+    def __getitem__(self, i: int) -> dict:
+        g = self._graph
+        tags = {"name": g.names[g.way_name[i]]}
+        if g.way_highway[i] >= 0:
+            tags["highway"] = g.highways[g.way_highway[i]]
+        return {
+            "type": "way",
+            "id": int(g.way_ids[i]),
+            "tags": tags,
+            "nodes": g.way_nodes(i).tolist(),
+        }
@@ -0,0 +1,139 @@
+"""
+roadindex.py — Byte-offset index over roads_optimized.jsonl (roads_optimized.idx).
+
+Lets a reader fetch one road with a single seek and read — api.php's
+get_road action, or an HTTP Range request against the static .jsonl sent
+with "Accept-Encoding: identity" (Caddy otherwise answers from the
+precompressed copy) — instead of scanning the whole file.
+
+    header    24 bytes  "SPRX", version u16, record size u16, record count u32,
+                        reserved u32, size of the indexed .jsonl in bytes u64
+    records   24 bytes each, sorted by (road id, seq):
+                  road_id  i64   OSM way id
+                  seq      u32   0 for the road itself, n for segment "<id>-<n>"
+                  length   u32   bytes in the road's line, without the newline
+                  offset   u64   byte offset of the line in the .jsonl
+
+All values are little-endian.  A segment is stored inside its road's line,
+so a segment record points at that line; the reader picks the segment out.
+The .jsonl size in the header lets a reader detect an index that does not
+belong to the file next to it.
+"""
+
+import json
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+import datamanifest
+
+MAGIC = b"SPRX"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHIIQ")
+_RECORD = np.dtype([("road_id", "<i8"), ("seq", "<u4"), ("length", "<u4"), ("offset", "<u8")])
+
+
+def _segment_key(segment_id: str) -> tuple:
+    road, _, seq = segment_id.rpartition("-")
+    return int(road), int(seq)
+
+
+class RoadIndexWriter:
+    """Collects the position of each line as it is written to the .jsonl."""
+
+    def __init__(self):
+        self._records: list = []
+        self._size = 0
+
+    def add(self, road: dict, offset: int, length: int):
+        """``road`` was written as ``length`` bytes at ``offset``, plus a newline."""
+        self._records.append((road["id"], 0, length, offset))
+        for seg in road.get("segments") or ():
+            road_id, seq = _segment_key(seg["id"])
+            self._records.append((road_id, seq, length, offset))
+        self._size = max(self._size, offset + length + 1)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def tobytes(self) -> bytes:
+        """The complete file."""
+        records = np.array(self._records, dtype=_RECORD)
+        records.sort(order=["road_id", "seq"])
+        return (_HEADER.pack(MAGIC, VERSION, _RECORD.itemsize, len(records), 0, self._size)
+                + records.tobytes())
+
+
+class RoadIndex:
+    """
+    Read-only view of roads_optimized.idx, memory-mapped; lookups are a
+    binary search.  road() and segment() return the decoded records from
+    ``jsonl_path``, by default the roads_optimized.jsonl that
+    data-manifest.json lists next to the index (the files have hashed
+    names, so it is not simply the index path with a .jsonl suffix).
+    """
+
+    def __init__(self, path: Path, jsonl_path: Path | None = None):
+        self.path = Path(path)
+        self.jsonl_path = (Path(jsonl_path) if jsonl_path
+                           else datamanifest.resolve(self.path.parent, "roads_optimized.jsonl"))
+        with self.path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count, _, self.jsonl_size = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a roads_optimized.idx file")
+        if version != VERSION or record_size != _RECORD.itemsize:
+            raise ValueError(f"unsupported roads_optimized.idx version {version}")
+        self.records = np.frombuffer(self._map, dtype=_RECORD, count=count, offset=_HEADER.size)
+
+    def close(self):
+        self.records = None
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def locate(self, road_id: int, seq: int = 0) -> tuple | None:
+        """(offset, length) of the line holding road ``road_id`` (segment ``seq``)."""
+        ids = self.records["road_id"]
+        lo = int(np.searchsorted(ids, road_id, side="left"))
+        hi = int(np.searchsorted(ids, road_id, side="right"))
+        i = lo + int(np.searchsorted(self.records["seq"][lo:hi], seq))
+        if i == hi or self.records["seq"][i] != seq:
+            return None
+        return int(self.records["offset"][i]), int(self.records["length"][i])
+
+    def locate_segment(self, segment_id: str) -> tuple | None:
+        """(offset, length) of the line holding segment ``"<road id>-<n>"``."""
+        try:
+            return self.locate(*_segment_key(segment_id))
+        except ValueError:
+            return None
+
+    def _read(self, span: tuple | None) -> dict | None:
+        if span is None:
+            return None
+        if self.jsonl_path.stat().st_size != self.jsonl_size:
+            raise ValueError(f"{self.path} does not match {self.jsonl_path}")
+        with self.jsonl_path.open("rb") as f:
+            f.seek(span[0])
+            return json.loads(f.read(span[1]))
+
+    def road(self, road_id: int) -> dict | None:
+        """The road record for ``road_id``, or None."""
+        return self._read(self.locate(road_id))
+
+    def segment(self, segment_id: str) -> dict | None:
+        """The segment record for ``segment_id``, or None."""
+        road = self._read(self.locate_segment(segment_id))
+        if road is None:
+            return None
+        return next((s for s in road.get("segments") or () if s["id"] == segment_id), None)
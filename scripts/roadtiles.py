@@ -0,0 +1,231 @@
+"""
+roadtiles.py — Cut the road output into a vector-tile overlay (PMTiles).
+
+The browser can draw roads_overlay.pmtiles by viewport instead of turning
+every road in the area into one GeoJSON source.  Two MVT layers:
+
+    roads      one line per road        id (OSM way id), name
+    segments   one line per segment     id ("<way id>-<n>"), road_id, name
+               (from SEGMENT_MIN_ZOOM)
+
+Below MAX_ZOOM each zoom gets its own Douglas-Peucker simplification in
+tile units (about a screen pixel); MAX_ZOOM keeps the pipeline geometry and
+MapLibre over-zooms it beyond that.  Lines are clipped to each tile plus a
+small buffer so strokes join across tile edges.
+
+verify() reads a written archive back through pmtiles.Reader and mvt.decode
+and checks that every tile decodes and every zoom carries exactly the
+features the tiler put there.
+"""
+
+import gzip
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+import mvt
+from pmtiles import COMPRESSION_GZIP, Reader, Writer, decompress, zxy_to_tileid
+
+MIN_ZOOM = 8
+MAX_ZOOM = 14
+SEGMENT_MIN_ZOOM = 12
+BUFFER = 64            # tile units drawn beyond each edge (extent 4096)
+SIMPLIFY_UNITS = 8     # Douglas-Peucker tolerance below MAX_ZOOM, in tile units
+
+
+def _mercator(coords: np.ndarray) -> np.ndarray:
+    """[[lat, lon], ...] → Web Mercator [[x, y], ...] on the unit square."""
+    lat = np.clip(coords[:, 0], -85.05112878, 85.05112878)
+    x = (coords[:, 1] + 180.0) / 360.0
+    y = 0.5 - np.arcsinh(np.tan(np.radians(lat))) / (2 * np.pi)
+    return np.column_stack([x, y])
+
+
+class _Features:
+    """Lines of one layer in unit-square Mercator, with their properties."""
+
+    def __init__(self):
+        self.coords: list = []
+        self.properties: list = []
+        self.ids: list = []
+
+    def add(self, coords: list, properties: dict, feature_id: int | None):
+        if len(coords) < 2:
+            return
+        self.coords.append(_mercator(np.asarray(coords, dtype=np.float64)))
+        self.properties.append(properties)
+        self.ids.append(feature_id)
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def clip(self, z: int, simplify: bool) -> dict:
+        """{(x, y): [(feature index, encoded geometry), ...]} at zoom ``z``."""
+        if not self.coords:
+            return {}
+        scale = float(mvt.EXTENT << z)
+        counts = np.fromiter((len(c) for c in self.coords), dtype=np.int64, count=len(self))
+        lines = shapely.linestrings(np.concatenate(self.coords) * scale,
+                                    indices=np.repeat(np.arange(len(self)), counts))
+        if simplify:
+            lines = shapely.simplify(lines, SIMPLIFY_UNITS)
+
+        # Every (feature, tile) pair whose buffered tile the line's bbox touches
+        last = (1 << z) - 1
+        bounds = shapely.bounds(lines)
+        tx0 = np.clip(np.floor((bounds[:, 0] - BUFFER) / mvt.EXTENT), 0, last).astype(np.int64)
+        ty0 = np.clip(np.floor((bounds[:, 1] - BUFFER) / mvt.EXTENT), 0, last).astype(np.int64)
+        tx1 = np.clip(np.floor((bounds[:, 2] + BUFFER) / mvt.EXTENT), 0, last).astype(np.int64)
+        ty1 = np.clip(np.floor((bounds[:, 3] + BUFFER) / mvt.EXTENT), 0, last).astype(np.int64)
+        width = tx1 - tx0 + 1
+        n_tiles = width * (ty1 - ty0 + 1)
+        feature = np.repeat(np.arange(len(self)), n_tiles)
+        local = np.arange(int(n_tiles.sum())) - np.repeat(np.cumsum(n_tiles) - n_tiles, n_tiles)
+        tx = tx0[feature] + local % width[feature]
+        ty = ty0[feature] + local // width[feature]
+
+        boxes = shapely.box(tx * mvt.EXTENT - BUFFER, ty * mvt.EXTENT - BUFFER,
+                            (tx + 1) * mvt.EXTENT + BUFFER, (ty + 1) * mvt.EXTENT + BUFFER)
+        # A bbox is a loose bound for long diagonal roads: test before clipping
+        shapely.prepare(lines)
+        hit = shapely.intersects(lines[feature], boxes)
+        feature, tx, ty = feature[hit], tx[hit], ty[hit]
+        clipped = shapely.intersection(lines[feature], boxes[hit])
+        parts, pair = shapely.get_parts(clipped, return_index=True)
+        is_line = shapely.get_type_id(parts) == 1
+        parts, pair = parts[is_line], pair[is_line]
+        coords, part_idx = shapely.get_coordinates(parts, return_index=True)
+        origin = np.column_stack([tx, ty])[pair[part_idx]] * mvt.EXTENT
+        ints = np.rint(coords - origin).astype(np.int64)
+
+        # Drop vertices that round onto their predecessor, then parts left
+        # with fewer than two points
+        keep = np.ones(len(ints), dtype=bool)
+        keep[1:] = np.any(ints[1:] != ints[:-1], axis=1) | (part_idx[1:] != part_idx[:-1])
+        ints, part_idx = ints[keep], part_idx[keep]
+        sizes = np.bincount(part_idx, minlength=len(parts))
+        kept = sizes >= 2
+        ints = ints[kept[part_idx]]
+        sizes, pair = sizes[kept], pair[kept]
+
+        # A (feature, tile) pair's parts are adjacent: encode them as one feature
+        geometries = mvt.line_geometries(ints, sizes, pair)
+        tiles: dict = {}
+        for k, geometry in zip(np.unique(pair).tolist(), geometries):
+            tiles.setdefault((int(tx[k]), int(ty[k])), []).append((int(feature[k]), geometry))
+        return tiles
+
+
+class RoadTiler:
+    """Collects road records (as written to roads_optimized.jsonl) for tiling."""
+
+    def __init__(self, min_zoom: int = MIN_ZOOM, max_zoom: int = MAX_ZOOM):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._roads = _Features()
+        self._segments = _Features()
+        self._bounds = [180.0, 90.0, -180.0, -90.0]
+
+    def add(self, road: dict):
+        name = road["tags"].get("name", "")
+        geometry = road["geometry"]
+        self._roads.add(geometry, {"id": road["id"], "name": name}, road["id"])
+        for seg in road.get("segments") or ():
+            self._segments.add(seg["geometry"],
+                               {"id": seg["id"], "road_id": road["id"], "name": name}, None)
+        if geometry:
+            lats = [p[0] for p in geometry]
+            lons = [p[1] for p in geometry]
+            b = self._bounds
+            self._bounds = [min(b[0], min(lons)), min(b[1], min(lats)),
+                            max(b[2], max(lons)), max(b[3], max(lats))]
+
+    def metadata(self) -> dict:
+        return {
+            "name": "StormPath roads",
+            "format": "pbf",
+            "type": "overlay",
+            "generator": "StormPath rebuild_roads.py",
+            "vector_layers": [
+                {"id": "roads", "fields": {"id": "Number", "name": "String"},
+                 "minzoom": self.min_zoom, "maxzoom": self.max_zoom},
+                {"id": "segments",
+                 "fields": {"id": "String", "road_id": "Number", "name": "String"},
+                 "minzoom": max(self.min_zoom, SEGMENT_MIN_ZOOM), "maxzoom": self.max_zoom},
+            ],
+        }
+
+    def write(self, path: Path) -> dict:
+        """
+        Write the archive.  Returns {zoom: (road ids, segment ids)} placed at
+        each zoom, for verify().
+        """
+        writer = Writer(path, tile_compression=COMPRESSION_GZIP)
+        placed = {}
+        try:
+            for z in range(self.min_zoom, self.max_zoom + 1):
+                simplify = z < self.max_zoom
+                layers = [("roads", self._roads, self._roads.clip(z, simplify))]
+                if z >= SEGMENT_MIN_ZOOM:
+                    layers.append(("segments", self._segments,
+                                   self._segments.clip(z, simplify)))
+                road_ids, segment_ids = set(), set()
+                for tile in sorted(set().union(*(clipped for _n, _f, clipped in layers))):
+                    encoded = []
+                    for name, features, clipped in layers:
+                        layer = mvt.Layer(name)
+                        for f, geometry in clipped.get(tile, ()):
+                            props = features.properties[f]
+                            layer.add_geometry(geometry, props, features.ids[f])
+                            (road_ids if name == "roads" else segment_ids).add(props["id"])
+                        encoded.append(layer)
+                    writer.add(zxy_to_tileid(z, *tile), gzip.compress(mvt.encode(encoded), mtime=0))
+                placed[z] = (road_ids, segment_ids)
+            writer.finish(self.metadata(), tuple(self._bounds), center_zoom=self.min_zoom)
+        except BaseException:
+            writer.abort()
+            raise
+        return placed
+
+
+def verify(path: Path, placed: dict, road_ids: set | None = None) -> list:
+    """
+    Decode every tile of the archive at ``path`` and compare the features per
+    zoom with ``placed`` (from RoadTiler.write()); with ``road_ids``, also
+    require every one of those roads at the highest zoom.  Returns a list of
+    problems; empty when the archive is good.
+    """
+    problems = []
+    found = {z: (set(), set()) for z in placed}
+    with Reader(path) as reader:
+        layers = {layer["id"] for layer in reader.metadata().get("vector_layers", [])}
+        if layers != {"roads", "segments"}:
+            problems.append(f"unexpected vector_layers in metadata: {sorted(layers)}")
+        for (z, x, y), data in reader.tiles():
+            if z not in found:
+                problems.append(f"tile {z}/{x}/{y} outside the expected zooms")
+                continue
+            try:
+                tile = mvt.decode(decompress(data, reader.header["tile_compression"]))
+            except Exception as exc:
+                problems.append(f"tile {z}/{x}/{y} does not decode: {exc}")
+                continue
+            for name, ids in zip(("roads", "segments"), found[z]):
+                for feature in tile.get(name, {}).get("features", []):
+                    parts = feature["geometry"]
+                    if feature["type"] != 2 or not parts or any(len(p) < 2 for p in parts):
+                        problems.append(f"tile {z}/{x}/{y}: bad {name} geometry")
+                    ids.add(feature["properties"].get("id"))
+    for z, (roads, segments) in placed.items():
+        for name, want, got in (("roads", roads, found[z][0]),
+                                ("segments", segments, found[z][1])):
+            if want != got:
+                missing, extra = len(want - got), len(got - want)
+                problems.append(f"zoom {z}: {missing} {name} missing, {extra} unexpected")
+    if road_ids is not None and placed:
+        absent = road_ids - found[max(placed)][0]
+        if absent:
+            problems.append(f"{len(absent)} roads not in any tile at zoom {max(placed)} "
+                            f"(e.g. {sorted(absent)[:5]})")
+    return problems
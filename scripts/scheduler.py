@@ -0,0 +1,129 @@
+"""
+scheduler.py — Run build stages concurrently in dependency order.
+
+    sched = Scheduler(max_workers=4)
+    sched.add("fetch", fetch_roads, note="Overpass road query")
+    sched.add("boundary", fetch_boundary)
+    sched.add("process", lambda road_data: process(road_data), after=["fetch"])
+    print(sched.describe())          # the plan, without running anything
+    results = sched.run()            # {stage name: return value}
+
+A stage is called with the return values of its ``after`` stages as
+positional arguments, in the order they are listed.  It starts as soon as
+all of them have finished, on a thread pool: the stages this is meant for
+are network downloads, Docker runs and process() (which has its own worker
+processes), so the GIL is not the bottleneck.  Stages that share state must
+not run concurrently; give each its own StageStats and merge() them
+afterwards.
+
+If a stage raises (including the SystemExit of a log-and-exit error), no
+further stages are started, the running ones are waited for, and run()
+re-raises the first failure.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class _Task:
+    def __init__(self, name: str, fn, after: list, note: str):
+        self.name = name
+        self.fn = fn
+        self.after = after
+        self.note = note
+
+
+class Scheduler:
+    """Dependency graph of named stages; see the module docstring."""
+
+    def __init__(self, max_workers: int = 4, log=print):
+        self.max_workers = max_workers
+        self.log = log
+        self._tasks: dict = {}
+        self.timings: dict = {}          # stage name → (start, end) seconds since run()
+
+    def add(self, name: str, fn, after: list | tuple = (), note: str = ""):
+        """Add stage ``name``, run as fn(*results of ``after``)."""
+        if name in self._tasks:
+            raise ValueError(f"Stage {name} is defined twice")
+        self._tasks[name] = _Task(name, fn, list(after), note)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tasks
+
+    @property
+    def stages(self) -> list:
+        """Stage names, in the order they were added."""
+        return list(self._tasks)
+
+    def plan(self) -> list:
+        """
+        The stages in waves: each wave's stages depend only on earlier waves.
+        Raises ValueError on an unknown dependency or a cycle.
+        """
+        for task in self._tasks.values():
+            for dep in task.after:
+                if dep not in self._tasks:
+                    raise ValueError(f"Stage {task.name} depends on unknown stage {dep}")
+        done, waves = set(), []
+        while len(done) < len(self._tasks):
+            wave = [name for name, task in self._tasks.items()
+                    if name not in done and all(dep in done for dep in task.after)]
+            if not wave:
+                cycle = sorted(set(self._tasks) - done)
+                raise ValueError(f"Stages depend on each other in a cycle: {', '.join(cycle)}")
+            waves.append(wave)
+            done.update(wave)
+        return waves
+
+    def describe(self) -> str:
+        """Human-readable plan: one line per stage, grouped by wave."""
+        waves = self.plan()
+        width = max(len(name) for name in self._tasks)
+        lines = [f"Execution plan: {len(self._tasks)} stages in {len(waves)} waves, "
+                 f"up to {self.max_workers} at once"]
+        for i, wave in enumerate(waves, 1):
+            for j, name in enumerate(wave):
+                task = self._tasks[name]
+                deps = f"after {', '.join(task.after)}" if task.after else "no dependencies"
+                note = f" — {task.note}" if task.note else ""
+                prefix = f"  wave {i}" if j == 0 else " " * (7 + len(str(i)))
+                lines.append(f"{prefix}  {name:<{width}}  {deps}{note}")
+        lines.append("A stage starts as soon as its own dependencies finish, not a whole wave.")
+        return "\n".join(lines)
+
+    def run(self) -> dict:
+        """Run every stage; returns {stage name: return value}."""
+        self.plan()
+        results, running, failure = {}, {}, None
+        pending = dict(self._tasks)
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if failure is None:
+                    ready = [task for task in pending.values()
+                             if all(dep in results for dep in task.after)]
+                    for task in ready:
+                        del pending[task.name]
+                        self.log(f"Stage {task.name} started")
+                        start = time.perf_counter() - t0
+                        args = [results[dep] for dep in task.after]
+                        running[pool.submit(task.fn, *args)] = (task.name, start)
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, start = running.pop(future)
+                    end = time.perf_counter() - t0
+                    self.timings[name] = (start, end)
+                    try:
+                        results[name] = future.result()
+                    except BaseException as exc:
+                        self.log(f"Stage {name} failed after {end - start:.1f} s")
+                        if failure is None:
+                            failure = exc
+                        continue
+                    self.log(f"Stage {name} finished in {end - start:.1f} s")
+        if failure is not None:
+            raise failure
+        return results
@@ -0,0 +1,63 @@
+"""
+sharedarrays.py — Publish read-only NumPy arrays to worker processes.
+
+The parent packs a dict of arrays into a single multiprocessing shared-memory
+block and hands workers a small picklable handle (block name + layout).
+Workers attach to the block and get zero-copy array views, so large node and
+topology tables are never pickled per task.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_ALIGN = 64
+
+
+class SharedArrays:
+    """Owner side of a shared-memory block holding several named arrays."""
+
+    def __init__(self, arrays: dict):
+        layout = {}
+        offset = 0
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            layout[name] = (offset, arr.dtype.str, arr.shape)
+            offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.layout = layout
+        for name, arr in arrays.items():
+            view = _view(self._shm, *layout[name])
+            view[...] = arr
+
+    @property
+    def handle(self) -> tuple:
+        """Picklable (block name, layout) pair for attach()."""
+        return self._shm.name, self.layout
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+def attach(handle: tuple) -> tuple:
+    """
+    Attach to a block published by SharedArrays.
+    Returns (shm, {name: array}); keep ``shm`` referenced while the arrays are used.
+    """
+    name, layout = handle
+    # track=False: the owning process unlinks the block, not the workers.
+    # Older Pythons register it again with the (shared) resource tracker,
+    # which is harmless: the owner's unlink() clears that registration.
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        shm = shared_memory.SharedMemory(name=name)
+    arrays = {key: _view(shm, *spec) for key, spec in layout.items()}
+    for arr in arrays.values():
+        arr.flags.writeable = False
+    return shm, arrays
+
+
+def _view(shm, offset: int, dtype: str, shape: tuple) -> np.ndarray:
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
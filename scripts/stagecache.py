@@ -0,0 +1,156 @@
+"""
+stagecache.py — Content-addressed cache of build stage outputs.
+
+    cache = StageCache(Path("/tmp/stormpath-build-cache"))
+    key = cache.key("roads", source=digest, segments=cfg["segments"],
+                    code=code_version("rebuild_roads", "roadbin"))
+    entry = cache.lookup("roads", key)
+    if entry is not None:
+        entry.restore_all(output_dir)          # skip the stage
+    else:
+        ...                                    # run the stage
+        cache.store("roads", key, {"roads.sqlite": output_dir / "roads.sqlite", ...})
+
+A key is the SHA-256 of everything a stage's outputs depend on: a digest of
+its source data, the config sections it reads and the version (source
+digest) of the scripts that produce them.  Anything else in the config, such
+as app.subtitle, does not change the key, so editing it reuses the outputs.
+
+Layout, one directory per stage and key:
+
+    <root>/<stage>/<key>/entry.json   {"version", "created", "meta",
+                                       "files": {name: {"size", "sha256"}}}
+    <root>/<stage>/<key>/<name>       the cached artifacts
+
+An entry is written to a temporary directory and renamed into place, so a
+half-written entry is never found.  Restored files are checked against
+their recorded SHA-256; a damaged entry is dropped and treated as a miss.
+Only the ``keep`` most recently used entries of each stage are kept.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+VERSION = 1
+ENTRY_NAME = "entry.json"
+SCRIPTS_DIR = Path(__file__).resolve().parent
+_CHUNK = 1 << 20
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file's contents, hex."""
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        while chunk := f.read(_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def code_version(*modules: str) -> str:
+    """Digest of the named modules' source files in the scripts directory."""
+    h = hashlib.sha256()
+    for name in sorted(modules):
+        h.update(name.encode() + b"\0")
+        h.update((SCRIPTS_DIR / f"{name}.py").read_bytes())
+    return h.hexdigest()[:16]
+
+
+class CacheEntry:
+    """A stored stage result: ``files`` maps artifact name → cached path."""
+
+    def __init__(self, path: Path, info: dict):
+        self.path = path
+        self.meta = info.get("meta", {})
+        self._files = info["files"]
+        self.files = {name: path / name for name in self._files}
+
+    def restore(self, name: str, dest: Path):
+        """Copy artifact ``name`` to ``dest`` (atomically), checking its digest."""
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + ".part")
+        shutil.copyfile(self.files[name], part)
+        if file_digest(part) != self._files[name]["sha256"]:
+            part.unlink()
+            raise ValueError(f"cached {name} in {self.path} is damaged")
+        os.replace(part, dest)
+
+    def restore_all(self, dest_dir: Path, targets: dict | None = None):
+        """Copy every artifact into ``dest_dir``, or to ``targets[name]`` if given."""
+        targets = targets or {}
+        for name in self.files:
+            self.restore(name, targets.get(name, dest_dir / name))
+
+
+class StageCache:
+    """Directory of cached stage outputs; see the module docstring."""
+
+    def __init__(self, root: Path, keep: int = 2):
+        self.root = Path(root)
+        self.keep = keep
+
+    @staticmethod
+    def key(stage: str, **inputs) -> str:
+        """Cache key of ``stage`` for ``inputs`` (JSON-serialisable values)."""
+        doc = json.dumps({"stage": stage, "cache_version": VERSION, **inputs},
+                         sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(doc.encode()).hexdigest()
+
+    def lookup(self, stage: str, key: str) -> CacheEntry | None:
+        """The entry for ``key``, or None on a miss."""
+        path = self.root / stage / key
+        try:
+            info = json.loads((path / ENTRY_NAME).read_text())
+        except (OSError, ValueError):
+            return None
+        if info.get("version") != VERSION or not all((path / n).exists() for n in info["files"]):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        os.utime(path / ENTRY_NAME)           # most recently used, for pruning
+        return CacheEntry(path, info)
+
+    def drop(self, stage: str, key: str):
+        shutil.rmtree(self.root / stage / key, ignore_errors=True)
+
+    def store(self, stage: str, key: str, files: dict, meta: dict | None = None) -> int:
+        """
+        Cache ``files`` ({artifact name: path}) under ``key``; returns the
+        bytes stored.  Replaces an existing entry for the key.
+        """
+        stage_dir = self.root / stage
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key[:16]}-", dir=stage_dir))
+        try:
+            recorded, size = {}, 0
+            for name, src in files.items():
+                shutil.copyfile(src, tmp / name)
+                recorded[name] = {"size": (tmp / name).stat().st_size,
+                                  "sha256": file_digest(tmp / name)}
+                size += recorded[name]["size"]
+            info = {"version": VERSION, "created": time.time(), "meta": meta or {},
+                    "files": recorded}
+            (tmp / ENTRY_NAME).write_text(json.dumps(info, indent=2))
+            self.drop(stage, key)
+            tmp.rename(stage_dir / key)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.prune(stage)
+        return size
+
+    def prune(self, stage: str):
+        """Delete all but the ``keep`` most recently used entries of ``stage``."""
+        entries = []
+        for path in (self.root / stage).iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                entries.append(((path / ENTRY_NAME).stat().st_mtime, path))
+            except OSError:
+                shutil.rmtree(path, ignore_errors=True)
+        for _mtime, path in sorted(entries, reverse=True)[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,187 @@
+"""
+stagestats.py — Per-stage timing, memory and work counts for the build scripts.
+
+    stats = StageStats(trace_memory=True, profile_dir=Path("profile"))
+    with stats.stage("merge") as st:
+        ...
+        st.count(ways=len(ways))
+    stats.save(output_dir / "rebuild_metadata.json")
+
+For every stage name the report holds
+
+    wall_s          elapsed seconds
+    cpu_s           CPU seconds (user + system) of this process
+    peak_rss_mb     the process's peak resident set size when the stage
+                    last ended (a high-water mark, so it never decreases)
+    traced_peak_mb  peak memory traced by tracemalloc during the stage
+                    (only with trace_memory)
+    counts          work items: ways, vertices, segments, bytes, ...
+
+Times are exclusive: entering a stage inside another pauses the outer one,
+so e.g. the "write" stage does not include the merging that its input
+generator does.  A stage may be entered many times (once per road group);
+its figures add up.  Stages are reported in the order they first ended.
+Records from worker processes are folded in with merge(); their wall times
+are summed across workers, and they have no traced peak.
+
+With ``profile_dir``, each stage also runs under cProfile and save()
+writes ``<stage>.pstats`` (for pstats / snakeviz) and ``<stage>.txt`` (the
+top functions by cumulative time) there.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+_MB = 2**20
+# ru_maxrss is KiB on Linux, bytes on macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+_END = object()
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT / _MB
+
+
+class _Stage:
+    """Handle yielded by StageStats.stage(), for adding work counts."""
+
+    def __init__(self, record: dict):
+        self._record = record
+
+    def count(self, **counts):
+        totals = self._record["counts"]
+        for key, n in counts.items():
+            totals[key] = totals.get(key, 0) + n
+
+
+class StageStats:
+    """Collects per-stage figures; see the module docstring."""
+
+    def __init__(self, trace_memory: bool = False, profile_dir: Path | None = None):
+        self.records: dict = {}
+        self._order: dict = {}            # stage name → position in report()
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self._profiles: dict = {}
+        self._stack: list = []            # [name, wall start, cpu start]
+        self._trace = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _record(self, name: str, traced: bool | None = None) -> dict:
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0,
+                                           "counts": {}}
+            if self._trace if traced is None else traced:
+                record["traced_peak_mb"] = 0.0
+        return record
+
+    def _pause(self, frame: list):
+        """Charge the time since ``frame`` (re)started to its stage."""
+        name, wall, cpu = frame
+        record = self.records[name]
+        record["wall_s"] += time.perf_counter() - wall
+        record["cpu_s"] += time.process_time() - cpu
+        if self._trace:
+            peak = tracemalloc.get_traced_memory()[1] / _MB
+            record["traced_peak_mb"] = max(record.get("traced_peak_mb", 0.0), peak)
+        if name in self._profiles:
+            self._profiles[name].disable()
+
+    def _resume(self, frame: list):
+        name = frame[0]
+        if self._trace:
+            tracemalloc.reset_peak()
+        if self.profile_dir is not None:
+            self._profiles.setdefault(name, cProfile.Profile()).enable()
+        frame[1] = time.perf_counter()
+        frame[2] = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as (part of) stage ``name``."""
+        record = self._record(name)
+        if self._stack:
+            self._pause(self._stack[-1])
+        frame = [name, 0.0, 0.0]
+        self._stack.append(frame)
+        self._resume(frame)
+        try:
+            yield _Stage(record)
+        finally:
+            self._pause(frame)
+            record["peak_rss_mb"] = max(record["peak_rss_mb"], _peak_rss_mb())
+            self._order.setdefault(name, len(self._order))
+            self._stack.pop()
+            if self._stack:
+                self._resume(self._stack[-1])
+
+    def iterate(self, name: str, iterable, unit: str | None = None):
+        """
+        Yield from ``iterable``, timing each step of it as stage ``name``;
+        with ``unit``, count len(item) under that name (e.g. "bytes").
+        """
+        it = iter(iterable)
+        while True:
+            with self.stage(name) as st:
+                item = next(it, _END)
+                if unit and item is not _END:
+                    st.count(**{unit: len(item)})
+            if item is _END:
+                return
+            yield item
+
+    def count(self, name: str, **counts):
+        """Add work counts to stage ``name`` without timing anything."""
+        _Stage(self._record(name)).count(**counts)
+
+    def merge(self, records: dict):
+        """Fold in ``records`` from another StageStats (e.g. a worker's)."""
+        for name, other in records.items():
+            record = self._record(name, traced="traced_peak_mb" in other)
+            self._order.setdefault(name, len(self._order))
+            record["wall_s"] += other["wall_s"]
+            record["cpu_s"] += other["cpu_s"]
+            record["peak_rss_mb"] = max(record["peak_rss_mb"], other["peak_rss_mb"])
+            if "traced_peak_mb" in other:
+                record["traced_peak_mb"] = max(record.get("traced_peak_mb", 0.0),
+                                               other["traced_peak_mb"])
+            _Stage(record).count(**other["counts"])
+
+    def report(self) -> dict:
+        """{stage: figures}, rounded for the metadata file."""
+        names = sorted(self.records, key=lambda n: self._order.get(n, len(self._order)))
+        return {
+            name: {key: round(value, 3) if isinstance(value, float) else dict(value)
+                   for key, value in self.records[name].items()}
+            for name in names
+        }
+
+    def save(self, metadata_path: Path, key: str = "stages"):
+        """
+        Add report() to the JSON object in ``metadata_path`` under ``key``,
+        keeping stages another script recorded there, and write the
+        profiles if profiling is on.
+        """
+        metadata = json.loads(metadata_path.read_text()) if metadata_path.exists() else {}
+        metadata[key] = {**metadata.get(key, {}), **self.report()}
+        metadata_path.write_text(json.dumps(metadata, indent=2))
+        self.write_profiles()
+
+    def write_profiles(self):
+        if self.profile_dir is None or not self._profiles:
+            return
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        for name, profile in self._profiles.items():
+            profile.dump_stats(self.profile_dir / f"{name}.pstats")
+            text = io.StringIO()
+            pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(40)
+            (self.profile_dir / f"{name}.txt").write_text(text.getvalue())
@@ -5,16 +5,36 @@ using the Planetiler Docker image.
 
 Usage:
     python update_pmtiles.py <config.yaml> [--output <dir>] [--cache-dir <dir>]
+                             [--boundary <area_boundary_geojson.json> [--buffer-tiles N]]
+                             [--metadata <rebuild_metadata.json>] [--build-cache <dir>]
+                             [--profile [<dir>]]
 
 Output:
     <output>/<pmtiles_area_name>.pmtiles
 
+Planetiler renders the whole Geofabrik extract, usually a state.  With
+--boundary (the outline rebuild_roads.py writes), the archive is then cut
+down to the tiles that intersect the area at each zoom, plus --buffer-tiles
+tiles around them, and rewritten clustered with identical tiles (ocean,
+empty land) stored once — see prune_pmtiles().
+
+With --metadata, the download and Planetiler stages are added to the
+"stages" table of rebuild_roads.py's rebuild_metadata.json (see stagestats.py).
+
+With --build-cache, the PMTiles file is stored under a hash of the PBF's
+contents, pmtiles_area_name, the Planetiler image and this script; a later
+run with the same hash restores it instead of running Planetiler (see
+stagecache.py).  The cache directory can be shared with rebuild_roads.py.
+
 Dependencies:
     pip install requests pyyaml
+    pip install shapely    (for --boundary)
     Docker must be available (for planetiler)
 """
 
 import argparse
+import json
+import math
 import subprocess
 import sys
 import tempfile
@@ -30,11 +50,22 @@ except ImportError as e:
     print("Run: pip install requests pyyaml", file=sys.stderr)
     sys.exit(1)
 
+try:
+    import shapely
+    from shapely.geometry import shape
+except ImportError:
+    shapely = None
+
+from pmtiles import Reader, Writer, zxy_to_tileid
+from stagecache import StageCache, code_version, file_digest
+from stagestats import StageStats
+
 PLANETILER_IMAGE = "ghcr.io/onthegomap/planetiler:latest"
 
 
 def log(msg: str):
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+    # One write per line, so lines from concurrent stages (build_pipeline.py) never interleave
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}\n", end="", flush=True)
 
 
 def geofabrik_last_modified(url: str) -> str | None:
@@ -84,6 +115,17 @@ def download_pbf(url: str, dest: Path, cache_file: Path) -> Path:
     return cache_file
 
 
+def pmtiles_is_fresh(output_file: Path, max_age_hours: float) -> bool:
+    """True (and logged) if ``output_file`` is younger than ``max_age_hours``; 0 disables."""
+    if max_age_hours <= 0 or not output_file.exists():
+        return False
+    age_hours = (time.time() - output_file.stat().st_mtime) / 3600
+    if age_hours >= max_age_hours:
+        return False
+    log(f"PMTiles file is {age_hours:.1f}h old (< {max_age_hours:.0f}h) — skipping rebuild")
+    return True
+
+
 def run_planetiler(pbf_path: Path, area_name: str, output_file: Path):
     """Run the Planetiler Docker image to convert PBF → PMTiles."""
     pbf_dir    = pbf_path.parent.resolve()     # read-only PBF cache location
@@ -169,6 +211,146 @@ def run_planetiler(pbf_path: Path, area_name: str, output_file: Path):
     log(f"PMTiles written: {output_file} ({size_mb:.1f} MB)")
 
 
+def build_tiles(pbf_path: Path, area_name: str, output_file: Path,
+                cache: StageCache | None = None) -> bool:
+    """
+    run_planetiler(), or restore its output from ``cache`` when the PBF,
+    area name, Planetiler image and this script are unchanged.  Returns True
+    on a cache hit.  The cache keeps Planetiler's output before any pruning,
+    so a restored archive is pruned again for the current boundary.
+    """
+    if cache is None:
+        run_planetiler(pbf_path, area_name, output_file)
+        return False
+    key = StageCache.key("pmtiles", source=file_digest(pbf_path), area_name=area_name,
+                         image=PLANETILER_IMAGE, code=code_version("update_pmtiles"))
+    entry = cache.lookup("pmtiles", key)
+    if entry is not None:
+        try:
+            entry.restore("tiles.pmtiles", output_file)
+            log(f"Build cache hit ({key[:12]}): PBF and settings unchanged — "
+                f"restored {output_file.name} without running Planetiler")
+            return True
+        except (OSError, ValueError) as exc:
+            log(f"WARNING: Could not restore cached PMTiles ({exc}) — rebuilding")
+            cache.drop("pmtiles", key)
+    run_planetiler(pbf_path, area_name, output_file)
+    cache.store("pmtiles", key, {"tiles.pmtiles": output_file})
+    log(f"Stored {output_file.name} in the build cache ({key[:12]})")
+    return False
+
+
+# ── Pruning to the area ───────────────────────────────────────────────────────
+
+def load_boundary(path: Path):
+    """The union of the polygons in an area_boundary_geojson.json file."""
+    features = json.loads(path.read_text())["features"]
+    return shapely.union_all([shape(f["geometry"]) for f in features])
+
+
+def _tile_x(lon: float, n: int) -> int:
+    return min(n - 1, max(0, int((lon + 180) / 360 * n)))
+
+
+def _tile_y(lat: float, n: int) -> int:
+    lat = max(-85.0511, min(85.0511, lat))
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return min(n - 1, max(0, int(y)))
+
+
+def _tile_lon(x: int, n: int) -> float:
+    return x / n * 360 - 180
+
+
+def _tile_lat(y: int, n: int) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def tile_cover(boundary, zoom: int, buffer: int = 1) -> list:
+    """
+    Sorted ids of the tiles at ``zoom`` that intersect ``boundary`` (lon/lat),
+    plus every tile within ``buffer`` tiles of one of them.
+    """
+    n = 1 << zoom
+    min_lon, min_lat, max_lon, max_lat = boundary.bounds
+    x0, x1 = _tile_x(min_lon, n), _tile_x(max_lon, n)
+    y0, y1 = _tile_y(max_lat, n), _tile_y(min_lat, n)
+    xs = [x for x in range(x0, x1 + 1) for _y in range(y0, y1 + 1)]
+    ys = [y for _x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+    boxes = shapely.box([_tile_lon(x, n) for x in xs], [_tile_lat(y + 1, n) for y in ys],
+                        [_tile_lon(x + 1, n) for x in xs], [_tile_lat(y, n) for y in ys])
+    shapely.prepare(boundary)
+    hits = shapely.intersects(boundary, boxes).tolist()
+    keep = set()
+    for x, y, hit in zip(xs, ys, hits):
+        if hit:
+            keep.update((bx, by)
+                        for bx in range(max(0, x - buffer), min(n, x + buffer + 1))
+                        for by in range(max(0, y - buffer), min(n, y + buffer + 1)))
+    return sorted(zxy_to_tileid(zoom, x, y) for x, y in keep)
+
+
+def prune_pmtiles(src: Path, dest: Path, boundary, buffer: int = 1) -> dict:
+    """
+    Copy the tiles of ``src`` that tile_cover() keeps at each of its zooms
+    into a new clustered archive at ``dest`` (which may be ``src``); the
+    Writer stores identical tile payloads once.  Header fields, metadata and
+    tile format are carried over, with the bounds narrowed to the boundary.
+    Returns before/after figures.  Raises ValueError if no tile is kept.
+    """
+    with Reader(src) as reader:
+        header = reader.header
+        writer = Writer(dest, tile_compression=header["tile_compression"],
+                        tile_type=header["tile_type"])
+        try:
+            for zoom in range(header["min_zoom"], header["max_zoom"] + 1):
+                for tile_id in tile_cover(boundary, zoom, buffer):
+                    entry = reader.find(tile_id)
+                    if entry is not None:
+                        writer.add(tile_id, reader.tile_data(entry[1], entry[2]))
+            if not len(writer):
+                raise ValueError(f"no tile of {src.name} intersects the boundary")
+            min_lon, min_lat, max_lon, max_lat = boundary.bounds
+            bounds = (max(min_lon, header["min_lon_e7"] / 1e7),
+                      max(min_lat, header["min_lat_e7"] / 1e7),
+                      min(max_lon, header["max_lon_e7"] / 1e7),
+                      min(max_lat, header["max_lat_e7"] / 1e7))
+            src_size = src.stat().st_size
+            writer.finish(reader.metadata(), bounds, center_zoom=header["center_zoom"])
+        except BaseException:
+            writer.abort()
+            raise
+    with Reader(dest) as pruned:
+        after = pruned.header
+    return {"tiles_in": header["addressed_tiles"], "tiles_out": after["addressed_tiles"],
+            "contents_out": after["tile_contents"],
+            "bytes_in": src_size, "bytes_out": dest.stat().st_size}
+
+
+def prune_to_boundary(output_file: Path, boundary_file: Path, buffer: int) -> dict | None:
+    """
+    prune_pmtiles() ``output_file`` in place to the outline in
+    ``boundary_file``; logs and returns the figures, or None (with a warning)
+    if there is no outline to prune to.
+    """
+    if shapely is None:
+        log("ERROR: --boundary needs shapely — pip install shapely")
+        sys.exit(1)
+    if not boundary_file.exists():
+        log(f"WARNING: {boundary_file} not found — PMTiles left unpruned")
+        return None
+    try:
+        result = prune_pmtiles(output_file, output_file, load_boundary(boundary_file), buffer)
+    except ValueError as exc:
+        log(f"ERROR: Could not prune {output_file.name}: {exc}")
+        sys.exit(1)
+    log(f"Pruned {output_file.name} to the area (+{buffer} tile(s)): "
+        f"{result['tiles_in']:,} → {result['tiles_out']:,} tiles "
+        f"({result['contents_out']:,} distinct), "
+        f"{result['bytes_in'] / 1024 / 1024:.1f} → {result['bytes_out'] / 1024 / 1024:.1f} MB")
+    return result
+
+
 def main():
     parser = argparse.ArgumentParser(description="StormPath PMTiles update script")
     parser.add_argument("config", help="Path to area config.yaml")
@@ -179,6 +361,21 @@ def main():
     parser.add_argument("--max-age-hours", type=float, default=20,
                         help="Skip rebuild if the existing PMTiles file is younger than this "
                              "many hours (default: 20). Set to 0 to always rebuild.")
+    parser.add_argument("--metadata", default=None,
+                        help="rebuild_metadata.json to add this run's stage timings to")
+    parser.add_argument("--boundary", default=None,
+                        help="Keep only the tiles around this area_boundary_geojson.json "
+                             "(written by rebuild_roads.py)")
+    parser.add_argument("--buffer-tiles", type=int, default=1,
+                        help="With --boundary, also keep tiles within N tiles of the area "
+                             "at each zoom (default: 1)")
+    parser.add_argument("--build-cache", default=None, metavar="DIR",
+                        help="Content-addressed cache shared with rebuild_roads.py: restore "
+                             "the PMTiles instead of running Planetiler when the PBF and "
+                             "settings are unchanged (see stagecache.py)")
+    parser.add_argument("--profile", nargs="?", const="profile", default=None, metavar="DIR",
+                        help="Run each stage under cProfile and write <stage>.pstats and "
+                             "<stage>.txt to DIR (default: ./profile)")
     args = parser.parse_args()
 
     config_path = Path(args.config)
@@ -201,15 +398,32 @@ def main():
     # Skip the rebuild if the existing file is fresh enough.  This avoids
     # re-running Planetiler when a push to main (e.g. a code or config change)
     # triggers Actions shortly after the nightly build already ran.
-    if args.max_age_hours > 0 and output_file.exists():
-        age_hours = (time.time() - output_file.stat().st_mtime) / 3600
-        if age_hours < args.max_age_hours:
-            log(f"PMTiles file is {age_hours:.1f}h old (< {args.max_age_hours:.0f}h) — skipping rebuild")
-            sys.exit(0)
+    if pmtiles_is_fresh(output_file, args.max_age_hours):
+        sys.exit(0)
+    if args.boundary and shapely is None:
+        log("ERROR: --boundary needs shapely — pip install shapely")
+        sys.exit(1)
 
     log(f"PMTiles update for {area_name}")
-    pbf_path = download_pbf(geofabrik_url, cache_dir, cache_file)
-    run_planetiler(pbf_path, area_name, output_file)
+    stats = StageStats(profile_dir=args.profile)
+    with stats.stage("pmtiles_fetch") as st:
+        pbf_path = download_pbf(geofabrik_url, cache_dir, cache_file)
+        st.count(bytes=pbf_path.stat().st_size)
+    # Planetiler runs in a container, so only wall time here is meaningful
+    cache = StageCache(Path(args.build_cache)) if args.build_cache else None
+    with stats.stage("pmtiles_build") as st:
+        cached = build_tiles(pbf_path, area_name, output_file, cache=cache)
+        st.count(bytes=output_file.stat().st_size, cache_hits=int(cached))
+    if args.boundary:
+        with stats.stage("pmtiles_prune") as st:
+            pruned = prune_to_boundary(output_file, Path(args.boundary), args.buffer_tiles)
+            if pruned is not None:
+                st.count(tiles=pruned["tiles_out"], bytes=pruned["bytes_out"])
+    if args.metadata:
+        stats.save(Path(args.metadata))
+        log(f"Added stage timings to {args.metadata}")
+    else:
+        stats.write_profiles()
     log("PMTiles update complete")
 
 
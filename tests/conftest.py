@@ -0,0 +1,8 @@
+"""Make the flat modules in scripts/ and benchmarks/ importable from the tests."""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT / "scripts", ROOT / "benchmarks"):
+    sys.path.insert(0, str(path))
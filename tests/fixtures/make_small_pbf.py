@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+make_small_pbf.py — Regenerate small.osm.pbf and small.osm.json.
+
+Writes the same handful of elements twice: as an .osm.pbf through libosmium,
+so the tests read a file produced by an independent encoder, and as an
+Overpass-style JSON document the tests compare against.
+
+Requires the osmium package (pyosmium, `pip install osmium`).  Only this
+script needs it: the generated files are committed and the tests read them
+with osmpbf.py alone.
+
+Two square boundary relations share the lon -84.5 edge:
+
+    relation 100  "West County"  two open outer ways forming one ring
+    relation 101  "East County"  one closed outer way
+
+and these ways cross them (ids as in the file):
+
+    1  Main Street   residential  West
+    2  Main Street   residential  crosses into East
+    3  Oak Avenue    primary      East
+    4  Trail         footway      West (not a road type the tests ask for)
+    5  (no name)     residential  West
+    6  Far Road      residential  outside both
+    7  Ridge Road    secondary    West
+
+Usage:
+    python tests/fixtures/make_small_pbf.py
+"""
+
+import json
+import sys
+from pathlib import Path
+
+try:
+    import osmium
+except ImportError:
+    print("ERROR: make_small_pbf.py needs pyosmium — run: pip install osmium", file=sys.stderr)
+    sys.exit(1)
+
+HERE = Path(__file__).resolve().parent
+TIMESTAMP = "2026-10-01T00:00:00Z"
+BASE = 5_000_000_000                    # node ids beyond 32 bits
+
+NODES = {
+    # boundary corners: West -84.6..-84.5, East -84.5..-84.4, lat 36.0..36.1
+    1: (36.0, -84.6), 2: (36.0, -84.5), 3: (36.1, -84.5), 4: (36.1, -84.6),
+    5: (36.0, -84.4), 6: (36.1, -84.4),
+    # roads
+    10: (36.0500001, -84.5900000), 11: (36.0512345, -84.5612345), 12: (36.0499999, -84.5300000),
+    13: (36.0501234, -84.4700000), 14: (36.0300000, -84.4600000), 15: (36.0700000, -84.4300000),
+    16: (36.0200000, -84.5800000), 17: (36.0250000, -84.5700000),
+    18: (36.0800000, -84.5800000), 19: (36.0850000, -84.5750000),
+    20: (37.0000000, -85.0000000), 21: (37.0100000, -85.0000000),
+    22: (36.0900000, -84.5900000), 23: (36.0950000, -84.5550000),
+    # a tagged point of interest no way references
+    30: (36.0400000, -84.5400000),
+}
+
+WAYS = [
+    (1, [10, 11], {"highway": "residential", "name": "Main Street"}),
+    (2, [11, 12, 13], {"highway": "residential", "name": "Main Street"}),
+    (3, [14, 13, 15], {"highway": "primary", "name": "Oak Avenue"}),
+    (4, [16, 17], {"highway": "footway", "name": "Trail"}),
+    (5, [18, 19], {"highway": "residential"}),
+    (6, [20, 21], {"highway": "residential", "name": "Far Road"}),
+    (7, [22, 23], {"highway": "secondary", "name": "Ridge Road"}),
+    (900, [1, 2, 3], {"boundary": "administrative"}),
+    (901, [3, 4, 1], {"boundary": "administrative"}),
+    (902, [2, 5, 6, 3, 2], {"boundary": "administrative"}),
+]
+
+RELATIONS = [
+    (100, [(900, "outer"), (901, "outer")], {"type": "boundary", "name": "West County"}),
+    (101, [(902, "outer")], {"type": "boundary", "name": "East County"}),
+]
+
+
+def main():
+    pbf = HERE / "small.osm.pbf"
+    pbf.unlink(missing_ok=True)
+    header = osmium.io.Header()
+    header.set("osmosis_replication_timestamp", TIMESTAMP)
+    writer = osmium.SimpleWriter(str(pbf), 0, header)
+    try:
+        for nid, (lat, lon) in NODES.items():
+            tags = {"amenity": "school"} if nid == 30 else {}
+            writer.add_node(osmium.osm.mutable.Node(id=BASE + nid, location=(lon, lat),
+                                                    tags=tags))
+        for wid, refs, tags in WAYS:
+            writer.add_way(osmium.osm.mutable.Way(id=wid, nodes=[BASE + r for r in refs],
+                                                  tags=tags))
+        for rid, members, tags in RELATIONS:
+            writer.add_relation(osmium.osm.mutable.Relation(
+                id=rid, members=[("w", ref, role) for ref, role in members], tags=tags))
+    finally:
+        writer.close()
+
+    elements = [{"type": "node", "id": BASE + nid, "lat": lat, "lon": lon}
+                for nid, (lat, lon) in NODES.items()]
+    elements += [{"type": "way", "id": wid, "nodes": [BASE + r for r in refs], "tags": tags}
+                 for wid, refs, tags in WAYS]
+    (HERE / "small.osm.json").write_text(json.dumps(
+        {"osm3s": {"timestamp_osm_base": TIMESTAMP}, "elements": elements}, indent=1) + "\n")
+
+
+if __name__ == "__main__":
+    main()
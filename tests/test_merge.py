@@ -0,0 +1,245 @@
+"""
+merge_connected_ways() against the original all-pairs implementation, kept
+here as the reference, on large generated same-name groups.  The reference
+optionally stops after ``max_starts`` chain starts, as the real one does.
+"""
+
+import random
+
+import pytest
+
+from nodestore import NodeStore
+from rebuild_roads import MAX_CHAIN_STARTS, geodesic_distance_km, merge_connected_ways
+from roadgraph import RoadGraph
+
+
+# ── Reference: the all-pairs merge the endpoint index replaced ────────────────
+
+def reference_merge(ways_group: list, nodes: dict, merge_issues: list,
+                    max_starts: int | None = None) -> list:
+    if len(ways_group) == 1:
+        return ways_group
+
+    road_name = ways_group[0]["tags"].get("name", "Unknown")
+    conns = {}
+    for i, way in enumerate(ways_group):
+        ns = way.get("nodes", [])
+        if len(ns) < 2:
+            continue
+        conns[i] = {"way": way, "start": ns[0], "end": ns[-1], "adj": []}
+
+    for i in conns:
+        for j in conns:
+            if i >= j:
+                continue
+            s1, e1 = conns[i]["start"], conns[i]["end"]
+            s2, e2 = conns[j]["start"], conns[j]["end"]
+            if e1 == s2 or e1 == e2 or s1 == s2 or s1 == e2:
+                conns[i]["adj"].append(j)
+                conns[j]["adj"].append(i)
+
+    visited: set = set()
+    components = []
+    for start in conns:
+        if start in visited:
+            continue
+        comp, stack = [], [start]
+        while stack:
+            cur = stack.pop()
+            if cur in visited:
+                continue
+            visited.add(cur)
+            comp.append(cur)
+            stack.extend(nb for nb in conns[cur]["adj"] if nb not in visited)
+        components.append(comp)
+
+    merged_ways = []
+    for comp in components:
+        if len(comp) == 1:
+            merged_ways.append(conns[comp[0]]["way"])
+        else:
+            result = _reference_component(comp, conns, nodes, road_name, merge_issues, max_starts)
+            if result:
+                merged_ways.append(result)
+    return merged_ways
+
+
+def _reference_order(comp: list, conns: dict, max_starts: int | None) -> list:
+    adj = {i: list(conns[i]["adj"]) for i in comp}
+    endpoints = [i for i in comp if len(adj[i]) == 1]
+    candidates = endpoints if endpoints else comp
+
+    best = []
+    for start in candidates[:max_starts]:
+        order, vis, cur = [start], {start}, start
+        while len(order) < len(comp):
+            nxt = next((nb for nb in adj[cur] if nb not in vis), None)
+            if nxt is None:
+                break
+            order.append(nxt)
+            vis.add(nxt)
+            cur = nxt
+        if len(order) > len(best):
+            best = order
+    return best
+
+
+def _reference_component(comp, conns, nodes, road_name, merge_issues,
+                         max_starts) -> dict | None:
+    ordered = _reference_order(comp, conns, max_starts)
+    merged_nodes, merged_ids, first_way = [], [], None
+
+    for idx, way_idx in enumerate(ordered):
+        way = conns[way_idx]["way"]
+        if first_way is None:
+            first_way = way
+        merged_ids.append(way["id"])
+        way_nodes = list(way["nodes"])
+
+        if idx == 0 and len(ordered) > 1:
+            next_conn = conns[ordered[1]]
+            if way_nodes[0] in (next_conn["start"], next_conn["end"]) and \
+               way_nodes[-1] not in (next_conn["start"], next_conn["end"]):
+                way_nodes = list(reversed(way_nodes))
+
+        if merged_nodes:
+            last = merged_nodes[-1]
+            if way_nodes[-1] == last:
+                way_nodes = list(reversed(way_nodes))
+            if way_nodes[0] != last:
+                gap_km = 0.0
+                if last in nodes and way_nodes[0] in nodes:
+                    n1, n2 = nodes[last], nodes[way_nodes[0]]
+                    gap_km = geodesic_distance_km(n1["lat"], n1["lon"], n2["lat"], n2["lon"])
+                merge_issues.append({
+                    "road_name": road_name,
+                    "osm_way_id": way["id"],
+                    "way_position": f"{idx + 1} of {len(ordered)}",
+                    "gap_meters": round(gap_km * 1000),
+                    "osm_way_url": f"https://www.openstreetmap.org/way/{way['id']}",
+                })
+                continue
+            way_nodes = way_nodes[1:]
+
+        merged_nodes.extend(way_nodes)
+
+    if not merged_nodes or first_way is None:
+        return None
+    return {"id": first_way["id"], "type": "way", "tags": first_way["tags"],
+            "nodes": merged_nodes, "merged_from": merged_ids}
+
+
+# ── Generated same-name groups ────────────────────────────────────────────────
+
+def same_name_group(seed: int, n_ways: int) -> tuple:
+    """
+    ({node id: {"lat", "lon"}}, ways) for one road name: chains of ways
+    meeting end to end, spurs branching off shared endpoints, closed loops,
+    isolated pieces (gaps), degenerate one-node ways and duplicated ways,
+    with random way directions and a shuffled order.
+    """
+    rng = random.Random(seed)
+    coords, ways = {}, []
+    next_node = iter(range(1_000_000, 10_000_000, 7))
+
+    def node(lat=None, lon=None) -> int:
+        nid = next(next_node)
+        coords[nid] = {"lat": lat if lat is not None else 36 + rng.random() / 10,
+                       "lon": lon if lon is not None else -84 - rng.random() / 10}
+        return nid
+
+    def way(start: int, end: int | None = None) -> list:
+        inner = [node() for _ in range(rng.randint(0, 4))]
+        nodes = [start] + inner + [end if end is not None else node()]
+        return nodes[::-1] if rng.random() < 0.5 else nodes
+
+    ends = []
+    while len(ways) < n_ways:
+        r = rng.random()
+        if r < 0.55 and ends:                          # extend a chain
+            start = rng.choice(ends)
+            nodes = way(start)
+            ends.append(nodes[0] if nodes[-1] == start else nodes[-1])
+        elif r < 0.70 and ends:                        # spur off a shared endpoint
+            nodes = way(rng.choice(ends))
+        elif r < 0.78:                                 # closed loop of 2–4 ways
+            first = last = node()
+            for k in range(rng.randint(2, 4)):
+                closing = first if k == 3 or rng.random() < 0.4 else None
+                nodes = way(last, closing)
+                ways.append(nodes)
+                last = nodes[0] if nodes[-1] == last else nodes[-1]
+                if closing is not None:
+                    break
+            continue
+        elif r < 0.80:                                 # one-way ring
+            first = node()
+            nodes = [first, node(), node(), first]
+        elif r < 0.82:                                 # degenerate
+            nodes = [node()]
+        elif r < 0.84 and ways:                        # duplicated way
+            nodes = list(rng.choice(ways))
+        else:                                          # new piece (gap)
+            nodes = way(node())
+            ends.extend([nodes[0], nodes[-1]])
+        ways.append(nodes)
+
+    rng.shuffle(ways)
+    way_dicts = [{"id": 500 + 3 * i, "type": "way",
+                  "tags": {"name": "Long Road", "highway": "residential"}, "nodes": nodes}
+                 for i, nodes in enumerate(ways)]
+    return coords, way_dicts
+
+
+@pytest.mark.parametrize("seed,n_ways", [(1, 300), (2, 1500), (3, 4000)])
+def test_merge_matches_all_pairs_reference(seed, n_ways):
+    coords, ways = same_name_group(seed, n_ways)
+    ids = list(coords)
+    nodes = NodeStore(ids, [coords[i]["lat"] for i in ids], [coords[i]["lon"] for i in ids])
+    graph = RoadGraph(ways)
+    (_name, group), = graph.groups()
+
+    expected_issues, issues = [], []
+    expected = reference_merge(ways, coords, expected_issues, MAX_CHAIN_STARTS)
+    merged = merge_connected_ways(graph, group, nodes, issues)
+
+    assert len(merged) == len(expected)
+    for got, want in zip(merged, expected):
+        assert got["id"] == want["id"]
+        assert got["nodes"] == want["nodes"]
+        assert got.get("merged_from") == want.get("merged_from")
+    assert issues == expected_issues
+    # The generator must actually produce the awkward cases
+    assert any(len(w.get("merged_from", ())) > 5 for w in expected)
+    assert expected_issues
+
+
+def test_branched_component_tries_a_bounded_number_of_starts():
+    # A spine of 300 ways with a two-way spur off every junction: each
+    # spur's outer way meets only its inner way, so the component has far
+    # more endpoint ways than starts are tried
+    spine = [[i, i + 1] for i in range(300)]
+    spurs = [nodes for i in range(1, 300) for nodes in ([i, 10_000 + i], [10_000 + i, 20_000 + i])]
+    ways = [{"id": 1 + i, "type": "way", "tags": {"name": "Comb Road"}, "nodes": nodes}
+            for i, nodes in enumerate(spurs + spine)]
+    ends = [n for w in ways for n in (w["nodes"][0], w["nodes"][-1])]
+    assert sum(ends.count(n) == 1 for n in ends) > MAX_CHAIN_STARTS
+    ids = sorted(set(ends))
+    coords = {nid: {"lat": 36 + nid / 1e6, "lon": -84.0} for nid in ids}
+    nodes = NodeStore(ids, [coords[i]["lat"] for i in ids], [coords[i]["lon"] for i in ids])
+    graph = RoadGraph(ways)
+    (_name, group), = graph.groups()
+
+    expected_issues, issues = [], []
+    expected = reference_merge(ways, coords, expected_issues, MAX_CHAIN_STARTS)
+    merged = merge_connected_ways(graph, group, nodes, issues)
+    assert [(w["id"], w["nodes"], w.get("merged_from")) for w in merged] == \
+        [(w["id"], w["nodes"], w.get("merged_from")) for w in expected]
+    assert issues == expected_issues
+
+
+def test_single_way_group_is_returned_unchanged():
+    ways = [{"id": 1, "type": "way", "tags": {"name": "A"}, "nodes": [1, 2, 3]}]
+    nodes = NodeStore([1, 2, 3], [0.0, 0.1, 0.2], [0.0, 0.0, 0.0])
+    graph = RoadGraph(ways)
+    assert merge_connected_ways(graph, [0], nodes, []) == ways
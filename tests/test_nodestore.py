@@ -0,0 +1,33 @@
+"""NodeStore: in-memory and spilled stores hold the same sorted, unique table."""
+
+import numpy as np
+import pytest
+
+import nodestore
+from nodestore import NodeStore
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 1000])
+def test_spilled_store_matches_in_memory(tmp_path, monkeypatch, n):
+    monkeypatch.setattr(nodestore, "_CHUNK", 7)        # exercise chunk boundaries
+    rng = np.random.default_rng(n)
+    ids = rng.integers(0, n // 2 + 2, n)                # plenty of duplicates
+    lats, lons = rng.random(n), rng.random(n)
+
+    memory = NodeStore(ids, lats, lons)
+    spilled = NodeStore(ids, lats, lons, spill_dir=tmp_path)
+    assert list(tmp_path.iterdir())
+    for field in ("ids", "lats", "lons"):
+        assert np.array_equal(getattr(memory, field), np.asarray(getattr(spilled, field)))
+    assert np.all(np.diff(spilled.ids) > 0)
+    spilled.close()
+    assert not list(tmp_path.iterdir())
+
+
+def test_duplicate_ids_keep_the_last_occurrence(tmp_path):
+    for spill_dir in (None, tmp_path):
+        store = NodeStore([5, 3, 5, 3], [1.0, 2.0, 3.0, 4.0], [0.0] * 4, spill_dir=spill_dir)
+        assert store.latlon(3) == (4.0, 0.0)
+        assert store.latlon(5) == (3.0, 0.0)
+        assert store.latlon(4) is None
+        store.close()
@@ -0,0 +1,185 @@
+"""Applying osmChange diffs to an ElementStore seeded from a full fetch."""
+
+import pytest
+import requests
+import shapely
+
+from osmchange import ChangeSet, ElementStore, ReplicationSource, area_filter
+from overpass_stream import from_json
+from rebuild_roads import _road_filter
+
+
+def way(wid, name, nodes, highway="residential"):
+    return {"type": "way", "id": wid, "nodes": nodes, "tags": {"highway": highway, "name": name}}
+
+
+def node(nid, lat, lon):
+    return {"type": "node", "id": nid, "lat": lat, "lon": lon}
+
+
+SEED = {
+    "osm3s": {"timestamp_osm_base": "2026-10-01T00:00:00Z"},
+    "elements": [
+        way(10, "Main Street", [1, 2, 3]),
+        way(11, "Oak Avenue", [3, 4, 5]),
+        way(12, "Elm Lane", [6, 7]),
+        node(1, 36.00, -84.00), node(2, 36.01, -84.00), node(3, 36.02, -84.00),
+        node(4, 36.02, -84.01), node(5, 36.02, -84.02),
+        node(6, 36.05, -84.05), node(7, 36.06, -84.05),
+    ],
+}
+
+# Two diffs, deliberately applied newest first: the highest version wins
+OSC_NEWER = b"""<?xml version="1.0" encoding="UTF-8"?>
+<osmChange version="0.6">
+  <modify>
+    <node id="2" version="3" lat="36.0150000" lon="-84.0010000"/>
+  </modify>
+  <delete>
+    <way id="12" version="2"/>
+  </delete>
+</osmChange>
+"""
+
+OSC_OLDER = b"""<?xml version="1.0" encoding="UTF-8"?>
+<osmChange version="0.6">
+  <modify>
+    <node id="2" version="2" lat="36.0120000" lon="-84.0000000"/>
+  </modify>
+  <create>
+    <node id="8" version="1" lat="36.0700000" lon="-84.0500000"/>
+    <node id="9" version="1" lat="40.0000000" lon="-90.0000000"/>
+    <node id="90" version="1" lat="40.0100000" lon="-90.0000000"/>
+    <way id="20" version="1">
+      <nd ref="7"/><nd ref="8"/>
+      <tag k="highway" v="residential"/><tag k="name" v="Pine Road"/>
+    </way>
+    <way id="21" version="1">
+      <nd ref="5"/><nd ref="8"/>
+      <tag k="highway" v="footway"/><tag k="name" v="Park Path"/>
+    </way>
+    <way id="22" version="1">
+      <nd ref="9"/><nd ref="90"/>
+      <tag k="highway" v="residential"/><tag k="name" v="Far Away Road"/>
+    </way>
+    <relation id="5" version="1"><member type="way" ref="20" role=""/></relation>
+  </create>
+</osmChange>
+"""
+
+CFG = {"data": {"road_types": ["residential", "primary"]}}
+AREA = shapely.box(-84.2, 35.9, -83.9, 36.2)
+
+
+def seeded_store(tmp_path) -> ElementStore:
+    store = ElementStore(tmp_path / "elements.sqlite")
+    store.replace(from_json(SEED))
+    store.commit()
+    return store
+
+
+def test_apply_small_osc(tmp_path):
+    store = seeded_store(tmp_path)
+    changes = ChangeSet()
+    changes.add_osc(OSC_NEWER)
+    changes.add_osc(OSC_OLDER)
+    assert changes.nodes[2] == (3, 36.015, -84.001)
+
+    is_road = _road_filter(CFG)
+    assert store.missing_nodes(changes, is_road) == []
+    affected = store.apply_changes(changes, is_road, area_filter(AREA))
+    store.commit()
+
+    # Main Street (moved node), Elm Lane (deleted) and Pine Road (created);
+    # Oak Avenue, the footway and the out-of-area road are not affected
+    assert affected == {"Main Street", "Elm Lane", "Pine Road"}
+
+    data = store.road_data()
+    assert [(w["id"], w["tags"]["name"], w["nodes"]) for w in data.ways] == [
+        (10, "Main Street", [1, 2, 3]),
+        (11, "Oak Avenue", [3, 4, 5]),
+        (20, "Pine Road", [7, 8]),
+    ]
+    assert data.nodes.latlon(2) == (36.015, -84.001)
+    assert data.nodes.latlon(8) == (36.07, -84.05)
+    # Nodes only the deleted or rejected ways used are pruned
+    assert data.nodes.ids.tolist() == [1, 2, 3, 4, 5, 7, 8]
+    assert data.osm_timestamp == "2026-10-01T00:00:00Z"
+    store.close()
+
+
+def test_changes_are_discarded_without_commit(tmp_path):
+    store = seeded_store(tmp_path)
+    changes = ChangeSet()
+    changes.add_osc(OSC_NEWER)
+    store.apply_changes(changes, _road_filter(CFG), area_filter(AREA))
+    store.close()
+
+    store = ElementStore(tmp_path / "elements.sqlite")
+    assert [w["id"] for w in store.road_data().ways] == [10, 11, 12]
+    assert store.road_data().nodes.latlon(2) == (36.01, -84.0)
+    store.close()
+
+
+def test_missing_nodes_are_reported(tmp_path):
+    store = seeded_store(tmp_path)
+    changes = ChangeSet()
+    changes.add_osc(b"""<osmChange version="0.6"><create>
+        <way id="30" version="1"><nd ref="5"/><nd ref="77"/>
+        <tag k="highway" v="primary"/><tag k="name" v="New Road"/></way>
+        </create></osmChange>""")
+    assert store.missing_nodes(changes, _road_filter(CFG)) == [77]
+    affected = store.apply_changes(changes, _road_filter(CFG), area_filter(AREA),
+                                   extra_nodes={77: (36.03, -84.03)})
+    assert affected == {"New Road", "Oak Avenue"}
+    assert store.road_data().nodes.latlon(77) == (36.03, -84.03)
+    store.close()
+
+
+# ── Replication start ─────────────────────────────────────────────────────────
+
+
+def replication_dir(tmp_path, sequences) -> ReplicationSource:
+    """Directory source holding state files for ``sequences`` only, an hour apart."""
+    for seq in sequences:
+        path = tmp_path / ReplicationSource._path(seq, ".state.txt")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"sequenceNumber={seq}\ntimestamp=2026-10-01T{seq:02d}\\:00\\:00Z\n")
+    return ReplicationSource(str(tmp_path))
+
+
+def test_first_after_skips_pruned_sequences(tmp_path):
+    source = replication_dir(tmp_path, range(5, 10))
+    assert source.first_after("2026-10-01T06:30:00Z", 9) == 7
+    assert source.first_after("2026-10-01T00:00:00Z", 9) == 5
+    assert source.first_after("2026-10-01T09:00:00Z", 9) == 10
+
+
+def test_first_after_treats_http_404_as_pruned(tmp_path, monkeypatch):
+    source = replication_dir(tmp_path, range(5, 10))
+    read = source._read
+
+    def remote(rel_path):
+        try:
+            return read(rel_path)
+        except FileNotFoundError:
+            raise requests.HTTPError(response=type("Response", (), {"status_code": 404})())
+
+    monkeypatch.setattr(source, "_read", remote)
+    assert source.first_after("2026-10-01T06:30:00Z", 9) == 7
+
+
+@pytest.mark.parametrize("error", [
+    requests.HTTPError(response=type("Response", (), {"status_code": 503})()),
+    requests.Timeout("read timed out"),
+    PermissionError("state.txt"),
+])
+def test_first_after_raises_other_errors(tmp_path, monkeypatch, error):
+    source = replication_dir(tmp_path, range(5, 10))
+
+    def fail(rel_path):
+        raise error
+
+    monkeypatch.setattr(source, "_read", fail)
+    with pytest.raises(type(error)):
+        source.first_after("2026-10-01T06:30:00Z", 9)
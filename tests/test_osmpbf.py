@@ -0,0 +1,96 @@
+"""Reading roads from a small .osm.pbf written by libosmium (see fixtures/)."""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+import shapely
+
+from osmpbf import blob_index, extract_areas, extract_roads, header_timestamp
+from protowire import (decode_varints, encode_varint, encode_varints, fields, key, packed_field,
+                       read_packed, read_varint, to_int64, unzigzag, unzigzag_array, zigzag)
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+PBF = FIXTURES / "small.osm.pbf"
+WEST, EAST = 100, 101
+
+
+def source() -> tuple:
+    """({node id: (lat, lon)}, {way id: way}) of the fixture's JSON twin."""
+    elements = json.loads((FIXTURES / "small.osm.json").read_text())["elements"]
+    nodes = {e["id"]: (e["lat"], e["lon"]) for e in elements if e["type"] == "node"}
+    ways = {e["id"]: e for e in elements if e["type"] == "way"}
+    return nodes, ways
+
+
+def check_roads(road_data, expected_ids: list):
+    nodes, ways = source()
+    assert [w["id"] for w in road_data.ways] == expected_ids
+    for way in road_data.ways:
+        assert way["nodes"] == ways[way["id"]]["nodes"]
+        assert way["tags"] == {"highway": ways[way["id"]]["tags"]["highway"],
+                               "name": ways[way["id"]]["tags"]["name"]}
+    refs = sorted({r for w in road_data.ways for r in w["nodes"]})
+    assert road_data.nodes.ids.tolist() == refs
+    for ref in refs:
+        # Coordinates come back exactly as the 7-decimal values written
+        assert road_data.nodes.latlon(ref) == nodes[ref]
+
+
+def test_header_and_blocks():
+    index = blob_index(PBF)
+    assert index[0][0] == "OSMHeader"
+    assert all(kind == "OSMData" for kind, _off, _size in index[1:])
+    assert header_timestamp(PBF, index) == "2026-10-01T00:00:00Z"
+
+
+def test_extract_areas_reads_each_area_in_one_pass():
+    (west, west_polys), (east, east_polys) = extract_areas(
+        PBF, [(["residential", "secondary"], WEST, None),
+              (["residential", "primary"], EAST, None)], log=lambda *a: None)
+
+    check_roads(west, [1, 2, 7])          # no footway, unnamed or outside roads
+    check_roads(east, [2, 3])             # Main Street crosses the shared edge
+    assert west.osm_timestamp == "2026-10-01T00:00:00Z"
+    assert len(west_polys) == 1 and len(east_polys) == 1
+    assert west_polys[0].equals(shapely.box(-84.6, 36.0, -84.5, 36.1))
+    assert east_polys[0].equals(shapely.box(-84.5, 36.0, -84.4, 36.1))
+
+
+def test_missing_relation_falls_back_to_the_given_boundary():
+    road_data, polygons = extract_roads(PBF, ["residential"], 999,
+                                        boundary=shapely.box(-84.6, 36.0, -84.57, 36.1),
+                                        log=lambda *a: None)
+    assert polygons == []
+    check_roads(road_data, [1])
+    with pytest.raises(ValueError):
+        extract_roads(PBF, ["residential"], 999, log=lambda *a: None)
+
+
+# ── protowire ─────────────────────────────────────────────────────────────────
+
+def test_varints_round_trip():
+    values = [0, 1, 127, 128, 300, 2**32 + 5, 2**63 - 1, 2**64 - 1]
+    data = b"".join(encode_varint(v) for v in values)
+    assert read_packed(data) == values
+    assert decode_varints(data).tolist() == values
+    encoded, sizes = encode_varints(np.array(values, dtype=np.uint64))
+    assert encoded.tobytes() == data
+    assert sizes.tolist() == [len(encode_varint(v)) for v in values]
+    assert read_varint(b"\xac\x02", 0) == (300, 2)
+
+
+def test_signed_encodings():
+    for v in (0, -1, 1, -64, 2**40, -(2**63)):
+        assert unzigzag(zigzag(v)) == v
+        assert to_int64(v & (2**64 - 1)) == v
+    raw = np.array([zigzag(v) for v in (3, -4, 5)], dtype=np.uint64)
+    assert unzigzag_array(raw).tolist() == [3, -4, 5]
+
+
+def test_fields_of_a_message():
+    msg = key(1, 0) + encode_varint(150) + packed_field(4, [1, 2, 300])
+    decoded = list(fields(memoryview(msg)))
+    assert decoded[0] == (1, 150)
+    assert decoded[1][0] == 4 and read_packed(decoded[1][1]) == [1, 2, 300]
@@ -0,0 +1,74 @@
+"""Streaming Overpass parser against json.load() of the same canned response."""
+
+import json
+import random
+
+import numpy as np
+import pytest
+
+from overpass_stream import from_json, ingest, load_file
+
+
+def overpass_elements(n_ways: int, seed: int) -> list:
+    """Named ways over a shared pool of nodes, ways first as Overpass returns them."""
+    rng = random.Random(seed)
+    node_ids = rng.sample(range(1_000, 10_000_000), n_ways * 4)
+    ways = [{"type": "way", "id": 100_000 + i, "nodes": rng.sample(node_ids, rng.randint(2, 9)),
+             "tags": {"highway": rng.choice(["residential", "primary", "secondary"]),
+                      "name": f"Road {i // 3}"}}
+            for i in range(n_ways)]
+    nodes = [{"type": "node", "id": nid, "lat": round(36 + rng.random(), 7),
+              "lon": round(-84 - rng.random(), 7)} for nid in node_ids]
+    return ways + nodes
+
+
+def canned_response() -> bytes:
+    data = {"version": 0.6,
+            "osm3s": {"timestamp_osm_base": "2026-10-01T00:00:00Z",
+                      "copyright": "The data included in this document is from www.openstreetmap.org."},
+            "elements": overpass_elements(120, seed=3)}
+    # Non-ASCII names, so multi-byte characters straddle chunk boundaries
+    for i, element in enumerate(data["elements"]):
+        if element["type"] == "way" and i % 3 == 0:
+            element["tags"]["name"] += " Chemin de l’Église — Ñandú"
+    data["elements"].append({"type": "way", "id": 1, "nodes": [1, 2], "tags": {"highway": "path"}})
+    text = json.dumps(data, ensure_ascii=False, indent=1)
+    # Overpass puts "remark" after the elements on timeouts and similar
+    return (text[:-2] + ',\n"remark": "runtime error: Query timed out"\n}').encode()
+
+
+def assert_same_road_data(got, want):
+    for field in ("ids", "lats", "lons"):
+        assert np.array_equal(getattr(got.nodes, field), getattr(want.nodes, field))
+    assert got.ways == want.ways
+    assert got.osm_timestamp == want.osm_timestamp
+    assert got.element_count == want.element_count
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64, 1 << 20])
+def test_stream_matches_json_load(tmp_path, chunk_size):
+    body = canned_response()
+    want = from_json(json.loads(body))
+    chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    tee = tmp_path / "roads.json.part"
+
+    got = ingest(chunks, tee_path=tee)
+
+    assert_same_road_data(got, want)
+    assert got.remark == "runtime error: Query timed out"
+    assert all("name" in w["tags"] for w in got.ways)
+    assert tee.read_bytes() == body
+    assert_same_road_data(load_file(tee), want)
+
+
+def test_truncated_response_raises_and_removes_tee(tmp_path):
+    body = canned_response()
+    tee = tmp_path / "roads.json.part"
+    with pytest.raises(ValueError):
+        ingest([body[:len(body) // 2]], tee_path=tee)
+    assert not tee.exists()
+
+
+def test_response_without_elements_is_rejected():
+    with pytest.raises(ValueError):
+        ingest([b'{"version": 0.6, "remark": "error"}'])
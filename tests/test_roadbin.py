@@ -0,0 +1,87 @@
+"""roads_optimized.bin: segments share their road's vertices and decode back."""
+
+import json
+
+import datamanifest
+from overpass_stream import from_json
+from rebuild_roads import process, write_outputs
+from roadbin import _HEADER, DEFAULT_PRECISION, RoadBinWriter, decode
+from synthetic_osm import synthetic_overpass
+
+CFG = {
+    "data": {"road_types": ["residential", "primary", "secondary"]},
+    "segments": {"min_distance_km": 0.4, "max_distance_km": 3.2, "simplify_tolerance": 0.0001},
+}
+
+
+def built_roads(tmp_path) -> list:
+    return list(process(CFG, from_json(synthetic_overpass(300, seed=5)), tmp_path, []))
+
+
+def assert_decodes_to(data: bytes, roads: list, precision: int):
+    """decode() returns ``roads`` with every coordinate within half a stored unit."""
+    decoded = decode(data)
+    assert [(r["type"], r["id"], r["tags"]) for r in decoded] == \
+        [(r["type"], r["id"], r["tags"]) for r in roads]
+    half = 0.5 / 10 ** precision + 1e-12
+    for got, road in zip(decoded, roads):
+        assert [(s["id"], s["description"]) for s in got["segments"]] == \
+            [(s["id"], s["description"]) for s in road["segments"]]
+        pairs = [(got["geometry"], road["geometry"])]
+        pairs += [(g["geometry"], s["geometry"]) for g, s in zip(got["segments"], road["segments"])]
+        for got_geom, geom in pairs:
+            assert len(got_geom) == len(geom)
+            for (lat, lon), (want_lat, want_lon) in zip(got_geom, geom):
+                assert abs(lat - want_lat) <= half and abs(lon - want_lon) <= half
+
+
+def test_built_roads_round_trip(tmp_path):
+    roads = built_roads(tmp_path)
+    writer = RoadBinWriter()
+    for road in roads:
+        writer.add(road)
+    data = writer.tobytes()
+
+    n_vertices = _HEADER.unpack_from(data)[5]
+    # At worst every segment is copied, each after the first of a road
+    # starting on the junction vertex the previous one ended with
+    assert n_vertices <= sum(len(road["geometry"]) + 1
+                             + sum(len(s["geometry"]) - 1 for s in road["segments"])
+                             for road in roads)
+    assert_decodes_to(data, roads, writer.precision)
+
+
+def test_segments_share_road_and_junction_vertices():
+    road = {
+        "type": "way", "id": 7, "tags": {"name": "Ridge Road", "highway": "secondary"},
+        "geometry": [[36.0, -84.0], [36.1, -84.0], [36.2, -84.0], [36.3, -84.0]],
+        "segments": [
+            {"id": "7-1", "description": "West",      # own copy
+             "geometry": [[36.0, -84.0], [36.05, -84.01], [36.1, -84.0]]},
+            {"id": "7-2", "description": "Middle",    # starts where 7-1 ends
+             "geometry": [[36.1, -84.0], [36.15, -84.01], [36.2, -84.0]]},
+            {"id": "7-3", "description": "East",      # a run of the road
+             "geometry": [[36.2, -84.0], [36.3, -84.0]]},
+            {"id": "7-4", "description": "Spur",      # meets nothing before it
+             "geometry": [[36.1, -84.0], [36.1, -84.1]]},
+        ],
+    }
+    writer = RoadBinWriter()
+    writer.add(road)
+    data = writer.tobytes()
+
+    assert _HEADER.unpack_from(data)[5] == 4 + 3 + 2 + 0 + 2
+    assert_decodes_to(data, [road], writer.precision)
+
+
+def test_written_bin_matches_jsonl(tmp_path):
+    roads = built_roads(tmp_path)
+    roads[0]["tags"].pop("highway")
+    write_outputs(iter(roads), [], "2026-10-01T00:00:00Z", "test", tmp_path, CFG)
+    with datamanifest.resolve(tmp_path, "roads_optimized.jsonl").open() as f:
+        records = [json.loads(line) for line in f]
+    data = datamanifest.resolve(tmp_path, "roads_optimized.bin").read_bytes()
+
+    assert all("highway" in r["tags"] for r in records[1:])
+    assert "highway" not in records[0]["tags"]
+    assert_decodes_to(data, records, DEFAULT_PRECISION)
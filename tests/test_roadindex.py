@@ -0,0 +1,111 @@
+"""roads_optimized.idx written by write_outputs() finds every road and segment."""
+
+import json
+
+import pytest
+
+import datamanifest
+from overpass_stream import from_json
+from rebuild_roads import process, write_outputs
+from roadindex import RoadIndex
+
+CFG = {
+    "data": {"road_types": ["residential", "primary", "secondary"]},
+    "segments": {"min_distance_km": 0.4, "max_distance_km": 3.2, "simplify_tolerance": 0.0001},
+}
+
+
+def grid_area(size: int = 8) -> dict:
+    """
+    Overpass response for a grid of crossing streets, ``size`` each way, so
+    every road is cut into segments.  Each street is two ways meeting at its
+    middle, with an extra shape node between crossings.
+    """
+    elements, nodes = [], {}
+
+    def node(lat: float, lon: float) -> int:
+        nid = 1_000 + len(nodes)
+        nodes[nid] = (lat, lon)
+        return nid
+
+    crossing = {(r, c): node(36 + r * 0.01, -84 + c * 0.01) for r in range(size) for c in range(size)}
+    for kind, highway in (("Avenue", "primary"), ("Street", "residential")):
+        for i in range(size):
+            line = []
+            for j in range(size):
+                point = crossing[(i, j)] if kind == "Avenue" else crossing[(j, i)]
+                if line:
+                    lat, lon = nodes[line[-1]]
+                    end_lat, end_lon = nodes[point]
+                    line.append(node((lat + end_lat) / 2 + 0.001, (lon + end_lon) / 2 + 0.001))
+                line.append(point)
+            middle = len(line) // 2
+            for way_nodes in (line[:middle + 1], line[middle:]):
+                elements.append({"type": "way", "id": 10_000 + len(elements),
+                                 "nodes": way_nodes,
+                                 "tags": {"highway": highway, "name": f"{i + 1} {kind}"}})
+    elements += [{"type": "node", "id": nid, "lat": lat, "lon": lon}
+                 for nid, (lat, lon) in nodes.items()]
+    return {"osm3s": {"timestamp_osm_base": "2026-10-01T00:00:00Z"}, "elements": elements}
+
+
+@pytest.fixture
+def written(tmp_path):
+    """(road records, .idx path, .jsonl path) of a small grid build."""
+    roads = list(process(CFG, from_json(grid_area()), tmp_path, []))
+    assert any(len(road["segments"]) > 2 for road in roads)
+    write_outputs(iter(roads), [], "2026-10-01T00:00:00Z", "test", tmp_path, CFG)
+    return (roads, datamanifest.resolve(tmp_path, "roads_optimized.idx"),
+            datamanifest.resolve(tmp_path, "roads_optimized.jsonl"))
+
+
+def read_span(path, span: tuple) -> bytes:
+    with path.open("rb") as f:
+        f.seek(span[0])
+        return f.read(span[1])
+
+
+def test_every_road_and_segment_is_found(written):
+    roads, idx_path, jsonl_path = written
+    assert idx_path.name != "roads_optimized.idx"   # hashed names
+    with RoadIndex(idx_path, jsonl_path) as index:
+        assert len(index) == sum(1 + len(road["segments"]) for road in roads)
+        for road in roads:
+            span = index.locate(road["id"])
+            offset, length = span
+            assert read_span(jsonl_path, (offset + length, 1)) == b"\n"
+            assert json.loads(read_span(jsonl_path, span)) == road
+            assert index.road(road["id"]) == road
+            for seg in road["segments"]:
+                assert index.locate_segment(seg["id"]) == span
+                assert index.segment(seg["id"]) == seg
+
+
+def test_missing_ids(written):
+    roads, idx_path, jsonl_path = written
+    road_id = roads[0]["id"]
+    missing = max(road["id"] for road in roads) + 1
+    with RoadIndex(idx_path, jsonl_path) as index:
+        assert index.locate(missing) is None
+        assert index.road(missing) is None
+        assert index.segment(f"{missing}-1") is None
+        assert index.segment(f"{road_id}-{len(roads[0]['segments']) + 1}") is None
+        assert index.locate_segment("not-a-segment") is None
+
+
+def test_index_of_another_jsonl_is_rejected(written):
+    roads, idx_path, jsonl_path = written
+    with jsonl_path.open("ab") as f:
+        f.write(b"\n")
+    with RoadIndex(idx_path, jsonl_path) as index:
+        assert index.jsonl_size == jsonl_path.stat().st_size - 1
+        with pytest.raises(ValueError, match="does not match"):
+            index.road(roads[0]["id"])
+
+
+
+def test_jsonl_found_through_the_manifest(written):
+    roads, idx_path, jsonl_path = written
+    with RoadIndex(idx_path) as index:
+        assert index.jsonl_path == jsonl_path
+        assert index.road(roads[-1]["id"]) == roads[-1]
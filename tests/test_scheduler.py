@@ -0,0 +1,100 @@
+"""Scheduler: stage planning, argument passing and failure handling with stub stages."""
+
+import threading
+
+import pytest
+
+from scheduler import Scheduler
+
+
+def quiet(_msg):
+    pass
+
+
+# ── plan() ────────────────────────────────────────────────────────────────────
+
+def test_plan_groups_stages_into_waves():
+    sched = Scheduler(log=quiet)
+    sched.add("fetch", lambda: None)
+    sched.add("boundary", lambda: None)
+    sched.add("process", lambda _roads: None, after=["fetch"])
+    sched.add("tiles", lambda _roads, _outline: None, after=["process", "boundary"])
+    sched.add("metadata", lambda *_results: None, after=sched.stages)
+    assert sched.plan() == [["fetch", "boundary"], ["process"], ["tiles"], ["metadata"]]
+
+
+def test_plan_rejects_unknown_dependency():
+    sched = Scheduler(log=quiet)
+    sched.add("process", lambda _roads: None, after=["fetch"])
+    with pytest.raises(ValueError, match="unknown stage fetch"):
+        sched.plan()
+
+
+def test_plan_and_run_reject_cycles():
+    sched = Scheduler(log=quiet)
+    sched.add("fetch", lambda: None)
+    sched.add("a", lambda _c: None, after=["c"])
+    sched.add("b", lambda _a: None, after=["a"])
+    sched.add("c", lambda _b, _fetch: None, after=["b", "fetch"])
+    with pytest.raises(ValueError, match="cycle: a, b, c"):
+        sched.plan()
+    with pytest.raises(ValueError, match="cycle"):
+        sched.run()
+
+
+def test_stage_defined_twice():
+    sched = Scheduler(log=quiet)
+    sched.add("fetch", lambda: None)
+    with pytest.raises(ValueError, match="defined twice"):
+        sched.add("fetch", lambda: None)
+
+
+# ── run() ─────────────────────────────────────────────────────────────────────
+
+def test_run_passes_dependency_results_in_after_order():
+    calls = []
+    sched = Scheduler(max_workers=3, log=quiet)
+    sched.add("a", lambda: "A")
+    sched.add("b", lambda: "B")
+    sched.add("ab", lambda *args: calls.append(("ab", args)) or "AB", after=["a", "b"])
+    sched.add("ba", lambda *args: calls.append(("ba", args)) or "BA", after=["b", "a"])
+    sched.add("last", lambda *args: args, after=["ba", "a", "ab"])
+
+    results = sched.run()
+
+    assert sorted(calls) == [("ab", ("A", "B")), ("ba", ("B", "A"))]
+    assert results == {"a": "A", "b": "B", "ab": "AB", "ba": "BA", "last": ("BA", "A", "AB")}
+    assert set(sched.timings) == set(results)
+    for start, end in sched.timings.values():
+        assert 0 <= start <= end
+
+
+@pytest.mark.parametrize("error", [RuntimeError("download failed"), SystemExit(1)])
+def test_run_stops_after_a_failure_and_reraises_it(error):
+    failed = threading.Event()
+
+    def log(msg):
+        if msg.startswith("Stage broken failed"):
+            failed.set()
+
+    def broken():
+        raise error
+
+    def slow():
+        # Still running when "broken" fails: it is waited for, not abandoned
+        assert failed.wait(5)
+        return "slow"
+
+    started = []
+    sched = Scheduler(max_workers=2, log=log)
+    sched.add("broken", broken)
+    sched.add("slow", slow)
+    sched.add("after_broken", lambda _r: started.append("after_broken"), after=["broken"])
+    sched.add("after_slow", lambda _r: started.append("after_slow"), after=["slow"])
+
+    with pytest.raises(type(error)) as raised:
+        sched.run()
+
+    assert raised.value is error
+    assert started == []
+    assert set(sched.timings) == {"broken", "slow"}
@@ -0,0 +1,102 @@
+"""Tiled Overpass fetch against a local HTTP stand-in for the Overpass API."""
+
+import http.server
+import json
+import re
+import threading
+import urllib.parse
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from overpass_stream import load_file
+from rebuild_roads import fetch_overpass
+from synthetic_osm import synthetic_overpass
+
+BBOX_FILTER = re.compile(r"\)\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)\[")
+
+
+class FakeOverpass(http.server.ThreadingHTTPServer):
+    """
+    Answers the bounding-box query with the data's extent and a road query
+    with every way having a node inside its bbox filter (if any), followed
+    by the nodes of those ways — as Overpass does for ``out body; >;``.
+    """
+
+    def __init__(self, data: dict):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.nodes = {e["id"]: e for e in data["elements"] if e["type"] == "node"}
+        self.ways = sorted((e for e in data["elements"] if e["type"] == "way"),
+                           key=lambda w: w["id"])
+        self.served = Counter()          # way id → number of responses it was in
+        self.lock = threading.Lock()
+
+    def answer(self, query: str) -> dict:
+        if "out bb" in query:
+            lats = [n["lat"] for n in self.nodes.values()]
+            lons = [n["lon"] for n in self.nodes.values()]
+            return {"elements": [{"type": "relation", "id": 1, "bounds": {
+                "minlat": min(lats), "minlon": min(lons),
+                "maxlat": max(lats), "maxlon": max(lons)}}]}
+        ways = self.ways
+        m = BBOX_FILTER.search(query)
+        if m:
+            s, w, n, e = map(float, m.groups())
+            ways = [way for way in ways
+                    if any(s <= self.nodes[i]["lat"] <= n and w <= self.nodes[i]["lon"] <= e
+                           for i in way["nodes"])]
+        with self.lock:
+            self.served.update(way["id"] for way in ways)
+        node_ids = sorted({i for way in ways for i in way["nodes"]})
+        return {"version": 0.6, "generator": "fake",
+                "osm3s": {"timestamp_osm_base": "2026-10-01T00:00:00Z"},
+                "elements": ways + [self.nodes[i] for i in node_ids]}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        form = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        body = json.dumps(self.server.answer(urllib.parse.parse_qs(form)["data"][0])).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def overpass():
+    server = FakeOverpass(synthetic_overpass(400, seed=5))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_tiled_fetch_matches_single_query(overpass, tmp_path):
+    host, port = overpass.server_address
+    cfg = {"area": {"osm_relation_id": 1},
+           "data": {"overpass_url": f"http://{host}:{port}/api/interpreter",
+                    "road_types": ["residential", "tertiary", "secondary", "primary"]}}
+
+    whole = fetch_overpass(cfg, tmp_path / "whole" / "roads.json")
+    overpass.served.clear()
+    tiled = fetch_overpass(cfg, tmp_path / "tiled" / "roads.json", tile_grid=3,
+                           max_connections=4)
+
+    # Roads crossing tile borders were returned by several tiles...
+    assert max(overpass.served.values()) > 1
+    # ...but are kept once, in the order of a single query
+    assert [w["id"] for w in tiled.ways] == [w["id"] for w in whole.ways]
+    assert tiled.ways == whole.ways
+    for field in ("ids", "lats", "lons"):
+        assert np.array_equal(getattr(tiled.nodes, field), getattr(whole.nodes, field))
+    assert tiled.osm_timestamp == whole.osm_timestamp
+
+    cached = load_file(tmp_path / "tiled" / "roads.json")
+    assert cached.ways == whole.ways
+    assert np.array_equal(cached.nodes.ids, whole.nodes.ids)